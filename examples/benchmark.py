@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+import sys
+
+from wradvis import benchmark
+
+if __name__ == '__main__':
+    sys.exit(benchmark.main())
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Check that the wradvis core imports without any GUI library
+"""
+
+import sys
+
+import wradvis
+
+GUI_MODULES = ("PyQt4", "vispy", "matplotlib")
+
+if __name__ == '__main__':
+    loaded = [name for name in GUI_MODULES if name in sys.modules]
+    if loaded:
+        sys.exit("import wradvis loaded {0}".format(", ".join(loaded)))
+    print("wradvis core is GUI-free")
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+from wradvis import tileserver
+
+if __name__ == '__main__':
+    tileserver.serve()
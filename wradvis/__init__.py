@@ -5,4 +5,10 @@
 # -----------------------------------------------------------------------------
 #!/usr/bin/env python
 
-from . import gui
+"""
+wradvis core, without any GUI dependencies
+
+The viewer lives in wradvis.gui and needs PyQt4, vispy and matplotlib.
+"""
+
+from wradvis.dataset import Dataset, open_dataset
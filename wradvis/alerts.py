@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Threshold alerts for rainfall over regions
+
+Regions are rasterized once into pixel memberships, every new frame is
+reduced per region with a few vectorized calls. Accumulations over a
+time window are running sums over the region pixels: a new frame adds
+its depth, frames leaving the window are subtracted, history is never
+read again.
+
+Rules (sections [alert:<name>]) compare the maximum or mean of each
+region with a threshold, either of the rain rate (mm/h) or of the depth
+(mm) accumulated within `window` minutes. An alert is raised when a
+region crosses the threshold and cleared when it falls below again.
+"""
+
+import json
+import threading
+from collections import deque, namedtuple
+
+try:
+    from urllib.request import Request, urlopen
+except ImportError:
+    from urllib2 import Request, urlopen
+
+import numpy as np
+
+from wradvis import basemap
+from wradvis import decode
+from wradvis.config import conf
+
+
+Alert = namedtuple("Alert", "time rule region value threshold state")
+
+
+def rasterize(rings, shape=(900, 900)):
+    """ Flat indices of the pixels with their center inside `rings`
+
+    `rings` are (n, 2) arrays in grid coordinates, the even-odd rule
+    applies, so holes are rings as well.
+    """
+    h, w = shape
+    edges = [np.column_stack((ring, np.roll(ring, -1, axis=0)))
+             for ring in rings if len(ring) > 2]
+    if not edges:
+        return np.zeros(0, dtype=np.intp)
+    edges = np.vstack(edges)
+    x0, y0, x1, y1 = edges.T
+    top = int(np.clip(np.floor(min(y0.min(), y1.min())), 0, h))
+    bottom = int(np.clip(np.ceil(max(y0.max(), y1.max())), 0, h))
+    rows = np.arange(top, bottom)
+    yc = rows[:, None] + 0.5
+    # half-open crossing rule, every vertex counts once
+    cross = (y0 <= yc) != (y1 <= yc)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xs = x0 + (yc - y0) * (x1 - x0) / (y1 - y0)
+    xs = np.where(cross, xs, np.inf)
+    if xs.shape[1] % 2:
+        xs = np.column_stack((xs, np.full(len(xs), np.inf)))
+    xs.sort(axis=1)
+    # spans between crossing pairs, pixel centers c + 0.5 in [xa, xb)
+    xa, xb = xs[:, 0::2], xs[:, 1::2]
+    valid = np.isfinite(xa) & np.isfinite(xb)
+    start = np.clip(np.ceil(np.where(valid, xa, 0) - 0.5), 0, w)
+    stop = np.clip(np.ceil(np.where(valid, xb, 0) - 0.5), 0, w)
+    length = np.where(valid, stop - start, 0).astype(np.intp)
+    first = (rows[:, None] * w + start).astype(np.intp)
+    length, first = length.ravel(), first.ravel()
+    keep = length > 0
+    length, first = length[keep], first[keep]
+    if not len(length):
+        return np.zeros(0, dtype=np.intp)
+    # ranges first .. first + length, concatenated
+    offsets = np.cumsum(length) - length
+    return (np.repeat(first - offsets, length) +
+            np.arange(length.sum())).astype(np.intp)
+
+
+def read_regions(path, field="name"):
+    """ (name, rings) of every feature of a GeoJSON file or shapefile
+
+    Rings are lon/lat arrays, features without `field` are numbered.
+    """
+    regions = []
+    for i, feature in enumerate(basemap.read_features(path)):
+        lines = basemap.geometry_lines(feature["geometry"])
+        rings = [np.asarray(line, dtype=np.float64)[:, :2] for line in lines
+                 if len(line) > 2]
+        if rings:
+            name = feature["properties"].get(field, str(i))
+            regions.append((str(name), rings))
+    return regions
+
+
+class RegionMasks(object):
+    """
+    Pixel memberships of many (possibly overlapping) regions
+
+    `pixels` holds the flat indices of all regions, grouped by region,
+    region i owns pixels[starts[i]:starts[i] + counts[i]]. `local` maps
+    every membership to its position within `union`, the distinct pixels
+    of all regions.
+    """
+    def __init__(self, names, pixels, shape=(900, 900)):
+        self.names = list(names)
+        self.shape = shape
+        self.counts = np.array([len(p) for p in pixels], dtype=np.intp)
+        self.starts = np.cumsum(self.counts) - self.counts
+        self.pixels = (np.concatenate(pixels).astype(np.intp) if pixels
+                       else np.zeros(0, dtype=np.intp))
+        # union in order of first membership, local is the identity for
+        # regions that do not overlap and gathering them is skipped
+        union, first, inverse = np.unique(self.pixels, return_index=True,
+                                          return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        self.union = union[order]
+        self.local = rank[inverse.reshape(-1)]
+        if np.array_equal(self.local, np.arange(len(self.local))):
+            self.local = None
+        # reduceat takes the segments of the non-empty regions only, an
+        # empty one would reduce to the single value at its start
+        self._filled = np.flatnonzero(self.counts)
+        self._reduce_at = self.starts[self._filled]
+
+    @classmethod
+    def from_lonlat(cls, regions, shape=(900, 900)):
+        """ Masks of (name, lon/lat rings) regions on the RADOLAN grid
+        """
+        names, pixels = [], []
+        for name, rings in regions:
+            names.append(name)
+            pixels.append(rasterize(basemap.project_lines(rings), shape))
+        return cls(names, pixels, shape)
+
+    def __len__(self):
+        return len(self.names)
+
+    def gather(self, data, convert=None):
+        """ Values of `data` at the `union` pixels, NaN as 0
+
+        `convert` is applied to the gathered values only.
+        """
+        values = np.asarray(data).reshape(-1).take(self.union)
+        if convert is not None:
+            values = np.asarray(convert(values))
+        np.copyto(values, 0, where=np.isnan(values))
+        return values
+
+    def members(self, values):
+        """ Values at the `union` pixels, one per membership
+        """
+        if self.local is None:
+            return values
+        return values.take(self.local)
+
+    def reduce(self, values, how="max"):
+        """ Per region max or mean of `values`, one per membership
+
+        Empty regions are NaN.
+        """
+        out = np.full(len(self), np.nan)
+        if not len(values):
+            return out
+        # memberships are grouped by region, one segment each
+        if how == "max":
+            out[self._filled] = np.maximum.reduceat(values, self._reduce_at)
+        else:
+            out[self._filled] = (np.add.reduceat(values, self._reduce_at,
+                                                 dtype=np.float64) /
+                                 self.counts[self._filled])
+        return out
+
+
+class RollingSum(object):
+    """
+    Running sum over the last `window` of per pixel values
+
+    Contributions are kept until they leave the window, then subtracted.
+    """
+    def __init__(self, window, size):
+        self.window = window
+        self.total = np.zeros(size, dtype=np.float64)
+        self._parts = deque()
+
+    def add(self, time, values):
+        self.total += values
+        self._parts.append((time, values))
+        while self._parts and self._parts[0][0] <= time - self.window:
+            self.total -= self._parts.popleft()[1]
+        # no drift once the window is empty
+        if len(self._parts) == 1:
+            self.total[:] = values
+
+    def reset(self):
+        self.total[:] = 0
+        self._parts.clear()
+
+
+class Rule(object):
+    def __init__(self, name, threshold, measure="rate", reduce="max",
+                 window=60, regions=None):
+        if measure not in ("rate", "accumulation"):
+            raise ValueError("unknown measure {0!r}".format(measure))
+        if reduce not in ("max", "mean"):
+            raise ValueError("unknown reduction {0!r}".format(reduce))
+        self.name = name
+        self.threshold = float(threshold)
+        self.measure = measure
+        self.reduce = reduce
+        self.window = np.timedelta64(int(window), 'm')
+        self.regions = regions
+
+
+def to_rate(data, product, interval=3600, unit="native", a=200., b=1.6):
+    """ Rain rate in mm/h of a decoded frame
+    """
+    import wradlib as wrl
+    if unit == "rate":
+        return data
+    if product in decode.REFLECTIVITY:
+        return wrl.zr.z2r(wrl.trafo.idecibel(data), a=a, b=b)
+    return data * (3600. / interval)
+
+
+class AlertEngine(object):
+    """
+    Evaluates the rules on every new frame, in time order
+
+    `sinks` are called with the list of alerts of each frame.
+    """
+    def __init__(self, masks, rules, sinks=()):
+        self.masks = masks
+        self.rules = list(rules)
+        self.sinks = list(sinks)
+        # rules of equal windows share one running sum
+        self.sums = {}
+        for rule in self.rules:
+            if rule.measure == "accumulation" and rule.window not in self.sums:
+                self.sums[rule.window] = RollingSum(rule.window,
+                                                    len(masks.union))
+        self.selected = {}
+        for rule in self.rules:
+            regions = set(rule.regions or masks.names)
+            self.selected[rule.name] = np.array(
+                [name in regions for name in masks.names], dtype=bool)
+        self.reset()
+
+    @property
+    def window(self):
+        """ Longest accumulation window
+        """
+        return max(self.sums) if self.sums else np.timedelta64(0, 'm')
+
+    def reset(self):
+        self.last = None
+        self.state = dict((rule.name, np.zeros(len(self.masks), dtype=bool))
+                          for rule in self.rules)
+        self.values = {}
+        for rsum in self.sums.values():
+            rsum.reset()
+
+    def update(self, time, rate, interval=None, convert=None):
+        """ Evaluate frame `rate` (mm/h) valid at `time`
+
+        `interval` is the time in seconds the frame stands for, by
+        default the time since the previous frame. `convert` turns other
+        units into mm/h, applied to the region pixels only (see
+        `to_rate`). Frames not newer than the last one are ignored.
+        Returns the alerts.
+        """
+        time = np.datetime64(time, 's')
+        if self.last is not None and time <= self.last:
+            return []
+        if interval is None:
+            interval = (300. if self.last is None else
+                        (time - self.last) / np.timedelta64(1, 's'))
+        self.last = time
+        # every pixel is read once, at the union of all regions
+        rate = self.masks.gather(rate, convert)
+        if self.sums:
+            depth = rate * (min(interval, 86400.) / 3600.)
+            for rsum in self.sums.values():
+                rsum.add(time, depth)
+
+        # memberships and reductions shared by rules of equal measure
+        members, reduced = {}, {}
+        alerts = []
+        for rule in self.rules:
+            source = rule.window if rule.measure == "accumulation" else None
+            if source not in members:
+                values = rate if source is None else self.sums[source].total
+                members[source] = self.masks.members(values)
+            if (source, rule.reduce) not in reduced:
+                reduced[source, rule.reduce] = self.masks.reduce(
+                    members[source], rule.reduce)
+            values = reduced[source, rule.reduce]
+            self.values[rule.name] = values
+            above = (values >= rule.threshold) & self.selected[rule.name]
+            previous = self.state[rule.name]
+            for i in np.nonzero(above != previous)[0]:
+                alerts.append(Alert(time, rule.name, self.masks.names[i],
+                                    float(values[i]), rule.threshold,
+                                    "raised" if above[i] else "cleared"))
+            self.state[rule.name] = above
+        if alerts:
+            for sink in self.sinks:
+                sink(alerts)
+        return alerts
+
+    def active(self):
+        """ (rule, region) pairs currently above their threshold
+        """
+        return [(name, self.masks.names[i])
+                for name, above in self.state.items()
+                for i in np.nonzero(above)[0]]
+
+
+def alert_dict(alert):
+    return {"time": str(alert.time), "rule": alert.rule,
+            "region": alert.region, "value": alert.value,
+            "threshold": alert.threshold, "state": alert.state}
+
+
+class LogSink(object):
+    """ Appends alerts to `path`, one JSON object per line
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, alerts):
+        with open(self.path, "a") as f:
+            for alert in alerts:
+                f.write(json.dumps(alert_dict(alert)) + "\n")
+
+
+class WebhookSink(object):
+    """ POSTs alerts as JSON list to `url`, from a background thread
+    """
+    def __init__(self, url, timeout=5.):
+        self.url = url
+        self.timeout = timeout
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+
+    def __call__(self, alerts):
+        with self._lock:
+            self._pending.append([alert_dict(a) for a in alerts])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                body = self._pending.popleft()
+            request = Request(self.url, json.dumps(body).encode("utf-8"),
+                              {"Content-Type": "application/json"})
+            try:
+                urlopen(request, timeout=self.timeout).close()
+            except Exception as e:
+                print("Alert webhook {0} failed: {1}".format(self.url, e))
+
+
+def create_engine(shape=(900, 900)):
+    """ AlertEngine of the [alert:<name>] sections, None without rules
+
+    Rule options are `threshold`, `measure` (rate or accumulation),
+    `reduce` (max or mean), `window` in minutes and `regions`, comma
+    separated names (all by default).
+    """
+    opts = conf["alerts"]
+    path = opts.get("regions", "")
+    rules = []
+    for section in conf.sections():
+        if not section.startswith("alert:"):
+            continue
+        ropts = conf[section]
+        regions = [r.strip() for r in ropts.get("regions", "").split(",")
+                   if r.strip()]
+        rules.append(Rule(section[len("alert:"):],
+                          ropts.getfloat("threshold"),
+                          ropts.get("measure", "rate"),
+                          ropts.get("reduce", "max"),
+                          ropts.getint("window", 60), regions or None))
+    if not rules or not path:
+        return None
+    masks = RegionMasks.from_lonlat(read_regions(path, opts.get("field")),
+                                    shape)
+    sinks = []
+    if opts.get("log", ""):
+        sinks.append(LogSink(opts.get("log")))
+    if opts.get("webhook", ""):
+        sinks.append(WebhookSink(opts.get("webhook")))
+    return AlertEngine(masks, rules, sinks)
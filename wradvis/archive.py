@@ -0,0 +1,642 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Time indexed access to RADOLAN/DX files on disk
+
+Files within tar archives (.tar, .tar.gz, .tar.bz2) are read without
+extracting, they are named <archive>::<member>.
+"""
+
+import os
+import io
+import re
+import bz2
+import glob
+import json
+import zlib
+import fnmatch
+import tarfile
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from datetime import datetime as dt, date
+
+import numpy as np
+
+from wradvis.cache import LRUCache
+
+
+# DWD file names carry the nominal time as YYMMDDHHMM,
+# eg. raa01-rw_10000-1605290050-dwd---bin.gz
+TIME_PATTERN = re.compile(r"-(\d{10})-")
+
+
+def file_time(fname):
+    match = TIME_PATTERN.search(os.path.basename(fname))
+    if match is None:
+        return np.datetime64('NaT', 's')
+    return np.datetime64(dt.strptime(match.group(1), "%y%m%d%H%M"), 's')
+
+
+def file_times(filelist):
+    return np.array([file_time(f) for f in filelist], dtype='datetime64[s]')
+
+
+def _subdirs(path, digits):
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return []
+    return sorted(n for n in names
+                  if n.isdigit() and len(n) == digits and
+                  os.path.isdir(os.path.join(path, n)))
+
+
+def _window(files, times, start, end):
+    mask = np.ones(len(times), dtype=bool)
+    if start is not None:
+        mask &= times >= np.datetime64(start, 's')
+    if end is not None:
+        mask &= times < np.datetime64(end, 's')
+    return [f for f, m in zip(files, mask) if m], times[mask]
+
+
+class DirectorySource(object):
+    """
+    Files of one flat directory, eg. data/rw/20160529
+    """
+    def __init__(self, path, pattern="raa0*"):
+        self.path = path
+        self.pattern = pattern
+
+    def select(self, start=None, end=None):
+        """ Return files and times within [start, end)
+        """
+        files = sorted(glob.glob(os.path.join(self.path, self.pattern)))
+        return _window(files, file_times(files), start, end)
+
+
+class ArchiveSource(object):
+    """
+    Files of a product/YYYY/MM/DD archive hierarchy
+
+    Day directories are only listed when a requested time window
+    intersects them, and each listing is kept for later requests.
+    """
+    def __init__(self, root, pattern="raa0*"):
+        self.root = root
+        self.pattern = pattern
+        self._days = {}
+
+    def years(self):
+        return [int(y) for y in _subdirs(self.root, 4)]
+
+    def days(self, year):
+        """ Return available days of `year`, only this year is listed
+        """
+        ydir = os.path.join(self.root, "{0:04d}".format(year))
+        days = []
+        for month in _subdirs(ydir, 2):
+            for day in _subdirs(os.path.join(ydir, month), 2):
+                try:
+                    days.append(date(year, int(month), int(day)))
+                except ValueError:
+                    continue
+        return days
+
+    def day_dir(self, day):
+        return os.path.join(self.root, day.strftime("%Y"),
+                            day.strftime("%m"), day.strftime("%d"))
+
+    def index_day(self, day):
+        if day not in self._days:
+            files = sorted(glob.glob(os.path.join(self.day_dir(day),
+                                                  self.pattern)))
+            self._days[day] = (files, file_times(files))
+        return self._days[day]
+
+    def select(self, start, end):
+        """ Return files and times within [start, end)
+        """
+        start = np.datetime64(start, 's')
+        end = np.datetime64(end, 's')
+        day = start.astype('datetime64[D]')
+        files = []
+        times = [np.array([], dtype='datetime64[s]')]
+        while day < end:
+            f, t = self.index_day(day.astype(date))
+            files.extend(f)
+            times.append(t)
+            day += 1
+        return _window(files, np.concatenate(times), start, end)
+
+    def last_day(self):
+        for year in reversed(self.years()):
+            days = self.days(year)
+            if days:
+                return days[-1]
+        return None
+
+
+JOINS = ("previous", "nearest", "exact")
+
+
+def align(times, target, join="previous", tolerance=None):
+    """ Index into sorted `times` of the match of every `target` time
+
+    "previous" matches the latest time not later than the target,
+    "nearest" the closest time (the earlier one on ties) and "exact" equal
+    times only. Targets without a match, or with a match further than
+    `tolerance` (timedelta64) away, get -1.
+    """
+    if join not in JOINS:
+        raise ValueError("unknown join {0!r}".format(join))
+    t = np.asarray(times, dtype='datetime64[s]').astype(np.int64)
+    g = np.atleast_1d(np.asarray(target, dtype='datetime64[s]'))
+    g = g.astype(np.int64)
+    n = len(t)
+    if not n:
+        return np.full(len(g), -1, dtype=np.intp)
+    if join == "previous":
+        index = np.searchsorted(t, g, side='right') - 1
+    else:
+        right = np.searchsorted(t, g, side='left')
+        left = right - 1
+        tr = t[np.minimum(right, n - 1)]
+        tl = t[np.maximum(left, 0)]
+        if join == "exact":
+            index = np.where((right < n) & (tr == g), right, -1)
+        else:
+            far = np.iinfo(np.int64).max
+            dl = np.where(left >= 0, g - tl, far)
+            dr = np.where(right < n, tr - g, far)
+            index = np.where(dl <= dr, left, right)
+    if tolerance is not None:
+        tolerance = np.timedelta64(tolerance, 's').astype(np.int64)
+        dist = np.abs(t[np.maximum(index, 0)] - g)
+        index = np.where(dist > tolerance, -1, index)
+    return index
+
+
+class PanelSource(object):
+    """
+    Frames of a source following the time cursor of the main view
+
+    A panel shows the frame of `source` matching the cursor time shifted
+    by `offset` minutes, `join` is one of JOINS and `tolerance` the
+    largest accepted distance in minutes (None: any).
+    """
+    def __init__(self, name, source, product, offset=0, join="previous",
+                 tolerance=None):
+        self.name = name
+        self.source = source
+        self.product = product
+        self.offset = np.timedelta64(int(offset), 'm')
+        self.join = join
+        self.tolerance = (None if tolerance is None else
+                          np.timedelta64(int(tolerance), 'm'))
+        self.files = []
+        self.times = np.array([], dtype='datetime64[s]')
+
+    def index(self, start=None, end=None):
+        # matches may lie up to the tolerance outside of the window
+        before = after = np.timedelta64(0, 's')
+        if self.tolerance is not None and self.join != "exact":
+            before = self.tolerance
+            if self.join == "nearest":
+                after = self.tolerance
+        if start is not None:
+            start = np.datetime64(start, 's') + self.offset - before
+        if end is not None:
+            end = np.datetime64(end, 's') + self.offset + after
+        self.files, self.times = self.source.select(start, end)
+
+    def align(self, times):
+        """ Index of the frame shown at every cursor time, -1 for none
+        """
+        times = np.asarray(times, dtype='datetime64[s]') + self.offset
+        return align(self.times, times, self.join, self.tolerance)
+
+    def file_at(self, time):
+        """ Return (index, file name) shown at cursor `time` or None
+        """
+        i = self.align([time])[0]
+        if i < 0:
+            return None
+        return int(i), self.files[i]
+
+
+class ProductStack(object):
+    """
+    Several products on the time axis of one of them, the reference
+
+    Members are PanelSources, every member is indexed once per time
+    window and aligned to the reference by a vectorized lookup. Changing
+    the reference only aligns again. Bundles name frames by file, views
+    showing the same file share its decoded frame.
+    """
+    def __init__(self, members=()):
+        self.members = OrderedDict((m.name, m) for m in members)
+        self.reference = None
+        self.files = []
+        self.times = np.array([], dtype='datetime64[s]')
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def add(self, member):
+        self.members[member.name] = member
+
+    def index(self, start=None, end=None):
+        for member in self.members.values():
+            member.index(start, end)
+        if self.reference is not None:
+            self.set_reference(self.reference)
+
+    def set_reference(self, name):
+        """ Use the times of member `name` as common time axis
+        """
+        ref = self.members[name]
+        self.reference = name
+        self.files = ref.files
+        # cursor times, the reference offset shifts it onto its files
+        self.times = ref.times - ref.offset
+        self.rows = dict((n, np.arange(len(self.files)) if n == name
+                          else m.align(self.times))
+                         for n, m in self.members.items())
+
+    def bundle(self, pos):
+        """ The frames of all members at cursor step `pos`
+
+        Returns an OrderedDict name -> (index, file name, product), None
+        for members without a match.
+        """
+        out = OrderedDict()
+        for name, member in self.members.items():
+            i = self.rows[name][pos]
+            out[name] = (None if i < 0 else
+                         (int(i), member.files[i], member.product))
+        return out
+
+
+MEMBER_SEP = "::"
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2")
+
+
+def is_tar(path):
+    return path.endswith(TAR_SUFFIXES) and os.path.isfile(path)
+
+
+def tar_files(path):
+    """ The archive `path` or all archives in directory `path`
+    """
+    if is_tar(path):
+        return [path]
+    if not os.path.isdir(path):
+        return []
+    return sorted(os.path.join(path, n) for n in os.listdir(path)
+                  if is_tar(os.path.join(path, n)))
+
+
+def split_member(fname):
+    """ Return (archive, member) of a member name, (fname, None) else
+    """
+    if MEMBER_SEP in fname:
+        return tuple(fname.split(MEMBER_SEP, 1))
+    return fname, None
+
+
+class _Inflater(object):
+    """
+    Random access to the decompressed stream of a .gz/.bz2 file
+
+    The stream is handled in blocks of `block` bytes, the most recent
+    `maxblocks` are kept. For gzip the decompressor state is saved at
+    every `every`th block boundary passed, the most recent
+    `maxcheckpoints` of them are kept, so a block is reached from the
+    nearest saved state. bzip2 states can't be copied, reading backwards
+    starts over from the beginning of the file.
+    """
+    CHUNK = 2 ** 16
+    # approximate size of a copied zlib state, 32 kB window plus tables
+    STATE = 48 * 2 ** 10
+
+    def __init__(self, path, block=4 * 2 ** 20, maxblocks=8, every=4,
+                 maxcheckpoints=64):
+        self.path = path
+        self.block = block
+        self.every = every
+        self.gzip = not path.endswith((".bz2", ".tbz2"))
+        self._file = open(path, "rb")
+        self._blocks = LRUCache(maxblocks)
+        self._checkpoints = LRUCache(maxcheckpoints)
+        self.pos = 0
+        self._restart()
+
+    def _decompressor(self):
+        if self.gzip:
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return bz2.BZ2Decompressor()
+
+    def _restart(self):
+        self._file.seek(0)
+        self._dec = self._decompressor()
+        self._pending = b""
+        self._next = 0
+        self._eof = False
+
+    def _restore(self, i):
+        offset, dec, pending = self._checkpoints.get(i)
+        self._file.seek(offset)
+        # keep the saved state reusable
+        self._dec = dec.copy()
+        self._pending = pending
+        self._next = i
+        self._eof = False
+
+    def _produce(self):
+        """ Decompress the next block of the live stream
+        """
+        if (self.gzip and not self._next % self.every and
+                self._next not in self._checkpoints):
+            self._checkpoints.put(self._next, (self._file.tell(),
+                                               self._dec.copy(),
+                                               self._pending))
+        out = []
+        need = self.block
+        while need and not self._eof:
+            data = b""
+            if self.gzip or self._dec.needs_input:
+                data = self._pending or self._file.read(self.CHUNK)
+                if not data:
+                    self._eof = True
+                    break
+            chunk = self._dec.decompress(data, need)
+            self._pending = self._dec.unconsumed_tail if self.gzip else b""
+            if self._dec.eof:
+                # concatenated streams, eg. from parallel compressors
+                self._pending = self._dec.unused_data + self._pending
+                self._dec = self._decompressor()
+            out.append(chunk)
+            need -= len(chunk)
+        self._next += 1
+        return b"".join(out)
+
+    def _get_block(self, i):
+        data = self._blocks.get(i)
+        if data is not None:
+            return data
+        saved = [j for j in self._checkpoints.keys() if j <= i]
+        best = max(saved) if saved else None
+        if best is not None and (i < self._next or best > self._next):
+            self._restore(best)
+        elif i < self._next:
+            self._restart()
+        while self._next <= i:
+            data = self._produce()
+            self._blocks.put(self._next - 1, data)
+            if self._eof and self._next <= i:
+                return b""
+        return data
+
+    def seek(self, pos):
+        self.pos = pos
+
+    def tell(self):
+        return self.pos
+
+    def read(self, size=-1):
+        out = []
+        while size:
+            i, offset = divmod(self.pos, self.block)
+            data = self._get_block(i)[offset:]
+            if not data:
+                break
+            if size > 0:
+                data = data[:size]
+                size -= len(data)
+            out.append(data)
+            self.pos += len(data)
+        return b"".join(out)
+
+    def close(self):
+        self._file.close()
+
+    def count(self):
+        """ Number of resident blocks and saved states
+        """
+        # not __len__, an empty inflater must not be false as a file
+        return len(self._blocks) + len(self._checkpoints)
+
+    def nbytes(self):
+        return (self._blocks.nbytes() + self._checkpoints.nbytes() +
+                len(self._checkpoints) * self.STATE)
+
+    def lru(self):
+        """ (key, nbytes, tick) of the least recently used block or state
+        """
+        entries = []
+        for name, cache in (("block", self._blocks),
+                            ("state", self._checkpoints)):
+            entry = cache.lru()
+            if entry is not None:
+                key, nbytes, last = entry
+                if name == "state":
+                    nbytes += self.STATE
+                entries.append(((name, key), nbytes, last))
+        if not entries:
+            return None
+        return min(entries, key=lambda e: e[2])
+
+    def evict(self, key):
+        name, i = key
+        if name == "block":
+            self._blocks.evict(i)
+        else:
+            self._checkpoints.evict(i)
+
+
+class TarArchive(object):
+    """
+    Members of a tar archive, read on demand without extracting
+
+    Member offsets within the (decompressed) archive are indexed on first
+    use and stored next to the archive as <archive>.index, if possible.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if path.endswith(".tar"):
+            self._stream = open(path, "rb")
+        else:
+            self._stream = _Inflater(path)
+        self.members = self._load() or self._index()
+
+    def _identity(self):
+        st = os.stat(self.path)
+        return [st.st_size, int(st.st_mtime)]
+
+    def _load(self):
+        try:
+            with open(self.path + ".index") as f:
+                catalog = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if catalog.get("identity") != self._identity():
+            return None
+        return OrderedDict((name, (offset, size))
+                           for name, offset, size in catalog["members"])
+
+    def _index(self):
+        self._stream.seek(0)
+        members = OrderedDict()
+        with tarfile.open(fileobj=self._stream, mode="r|") as tar:
+            for info in tar:
+                if info.isfile():
+                    members[info.name] = (info.offset_data, info.size)
+        catalog = {"identity": self._identity(),
+                   "members": [[name, offset, size] for name, (offset, size)
+                               in members.items()]}
+        try:
+            with open(self.path + ".index", "w") as f:
+                json.dump(catalog, f)
+        except (IOError, OSError):
+            # read-only archive location, index again next time
+            pass
+        return members
+
+    def read(self, name):
+        """ Contents of member `name`, gzipped members are decompressed
+        """
+        offset, size = self.members[name]
+        with self._lock:
+            self._stream.seek(offset)
+            data = self._stream.read(size)
+        if data[:2] == b"\x1f\x8b":
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        return data
+
+
+_archives = {}
+_archives_pid = [os.getpid()]
+
+
+def _open_archives():
+    # forked children, eg. of a multiprocessing.Pool, inherit the open
+    # files and share their offsets with the parent, they open their own
+    if _archives_pid[0] != os.getpid():
+        _archives.clear()
+        _archives_pid[0] = os.getpid()
+    return _archives
+
+
+def get_archive(path):
+    """ Return the (cached) TarArchive of `path`, one per process
+    """
+    path = os.path.abspath(path)
+    archives = _open_archives()
+    if path not in archives:
+        archives[path] = TarArchive(path)
+    return archives[path]
+
+
+class ArchiveBuffers(object):
+    """
+    Accounts the decompressed blocks and saved states of all open
+    archives of this process for a MemoryBudget, evictable
+    """
+    def _streams(self):
+        return [(path, archive)
+                for path, archive in list(_open_archives().items())
+                if isinstance(archive._stream, _Inflater)]
+
+    def __len__(self):
+        return sum(archive._stream.count()
+                   for _, archive in self._streams())
+
+    def nbytes(self):
+        return sum(archive._stream.nbytes()
+                   for _, archive in self._streams())
+
+    def lru(self):
+        oldest = None
+        for path, archive in self._streams():
+            with archive._lock:
+                entry = archive._stream.lru()
+            if entry is not None and (oldest is None or
+                                      entry[2] < oldest[2]):
+                oldest = ((path,) + entry[0], entry[1], entry[2])
+        return oldest
+
+    def evict(self, key):
+        archive = _archives[key[0]]
+        with archive._lock:
+            archive._stream.evict(key[1:])
+
+
+def open_member(fname):
+    """ File object of the contents of member name `fname`
+    """
+    path, member = split_member(fname)
+    return io.BytesIO(get_archive(path).read(member))
+
+
+@contextmanager
+def member_file(fname):
+    """ Name of a real file with the contents of `fname`
+
+    For readers that only take file names, members are copied to a
+    temporary file for the duration of the block, other files are
+    passed as is.
+    """
+    path, member = split_member(fname)
+    if member is None:
+        yield fname
+        return
+    fd, tmp = tempfile.mkstemp(prefix="wradvis-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(get_archive(path).read(member))
+        yield tmp
+    finally:
+        os.remove(tmp)
+
+
+class TarSource(object):
+    """
+    Files within one tar archive or a directory of tar archives
+    """
+    def __init__(self, path, pattern="raa0*"):
+        self.path = path
+        self.pattern = pattern
+        self._index = {}
+
+    def index_archive(self, path):
+        if path not in self._index:
+            names = [n for n in get_archive(path).members
+                     if fnmatch.fnmatch(os.path.basename(n), self.pattern)]
+            names.sort(key=os.path.basename)
+            files = [path + MEMBER_SEP + n for n in names]
+            self._index[path] = (files, file_times(files))
+        return self._index[path]
+
+    def select(self, start=None, end=None):
+        """ Return files and times within [start, end)
+        """
+        files = []
+        times = [np.array([], dtype='datetime64[s]')]
+        for path in tar_files(self.path):
+            f, t = self.index_archive(path)
+            files.extend(f)
+            times.append(t)
+        times = np.concatenate(times)
+        order = np.argsort(times, kind='mergesort')
+        files = [files[i] for i in order]
+        return _window(files, times[order], start, end)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Vector basemap (borders, coastlines, rivers, ...) over the RADOLAN grid
+
+Layers are read from GeoJSON or shapefiles, projected once to the grid
+and simplified to several tolerances (in grid pixels, ie. km). Every
+layer file keeps its projected levels in a binary cache next to it, or
+in conf["basemap"]["cache"]. All layers of one tolerance form one batch,
+(pos, connect, layer), as drawn by a single line visual.
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from wradvis import utils
+from wradvis.contour import simplify
+from wradvis.config import conf
+
+try:
+    from osgeo import ogr, osr
+except ImportError:
+    ogr = None
+
+
+def geometry_lines(geometry):
+    """ Coordinate lists of the lines and rings of a GeoJSON geometry
+    """
+    kind = geometry.get("type")
+    coords = geometry.get("coordinates")
+    if kind == "LineString":
+        return [coords]
+    if kind in ("MultiLineString", "Polygon"):
+        return list(coords)
+    if kind == "MultiPolygon":
+        return [ring for polygon in coords for ring in polygon]
+    if kind == "GeometryCollection":
+        return [line for part in geometry.get("geometries", [])
+                for line in geometry_lines(part)]
+    return []
+
+
+def read_geojson(path):
+    """ Features of a GeoJSON file, {"geometry": ..., "properties": ...}
+    """
+    with open(path) as f:
+        doc = json.load(f)
+    if doc.get("type") == "FeatureCollection":
+        features = doc.get("features", [])
+    elif doc.get("type") == "Feature":
+        features = [doc]
+    else:
+        features = [{"geometry": doc}]
+    return [{"geometry": feature.get("geometry") or {},
+             "properties": feature.get("properties") or {}}
+            for feature in features]
+
+
+def read_shapefile(path):
+    """ Features of a shapefile as in read_geojson, geometries in lon/lat
+    """
+    if ogr is None:
+        raise IOError("{0}: reading shapefiles needs GDAL/OGR".format(path))
+    source = ogr.Open(path)
+    if source is None:
+        raise IOError("{0}: cannot open shapefile".format(path))
+    layer = source.GetLayer()
+    wgs84 = osr.SpatialReference()
+    wgs84.ImportFromEPSG(4326)
+    if hasattr(osr, "OAMS_TRADITIONAL_GIS_ORDER"):
+        # GDAL >= 3 follows the EPSG lat/lon axis order otherwise
+        wgs84.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    srs = layer.GetSpatialRef()
+    # without a spatial reference coordinates are taken as lon/lat
+    transform = (None if srs is None else
+                 osr.CoordinateTransformation(srs, wgs84))
+    features = []
+    for feature in layer:
+        geometry = feature.GetGeometryRef()
+        if geometry is None:
+            continue
+        if transform is not None:
+            geometry.Transform(transform)
+        features.append({"geometry": json.loads(geometry.ExportToJson()),
+                         "properties": feature.items()})
+    return features
+
+
+def read_features(path):
+    """ Features of a GeoJSON file or shapefile, see read_geojson
+    """
+    if path.lower().endswith(".shp"):
+        return read_shapefile(path)
+    return read_geojson(path)
+
+
+def read_lines(path):
+    """ lon/lat polylines of all features of `path`, (n, 2) arrays
+    """
+    lines = []
+    for feature in read_features(path):
+        lines.extend(geometry_lines(feature["geometry"]))
+    return [np.asarray(line, dtype=np.float64)[:, :2] for line in lines
+            if len(line) > 1]
+
+
+def project_lines(lines):
+    """ Scene coordinates of lon/lat `lines`, projected in a single call
+    """
+    if not lines:
+        return []
+    lengths = [len(line) for line in lines]
+    xy = utils.wgs84_to_radolan(np.vstack(lines))
+    xy = xy - utils.get_radolan_origin()
+    return np.split(xy, np.cumsum(lengths)[:-1])
+
+
+def pack_lines(lines, tolerance):
+    """ Simplify `lines` and pack them as (pos, connect)
+    """
+    pos, connect = [], []
+    count = 0
+    for line in lines:
+        verts = line[simplify(line, tolerance)]
+        n = len(verts)
+        if n < 2:
+            continue
+        pos.append(verts)
+        idx = np.arange(count, count + n - 1, dtype=np.uint32)
+        connect.append(np.column_stack((idx, idx + 1)))
+        count += n
+    if not pos:
+        return (np.zeros((0, 2), dtype=np.float32),
+                np.zeros((0, 2), dtype=np.uint32))
+    return np.vstack(pos).astype(np.float32), np.vstack(connect)
+
+
+class Layer(object):
+    """
+    Projected lines of one file at every tolerance
+
+    `levels` holds (pos, connect) per tolerance, finest first.
+    """
+    def __init__(self, name, path, tolerances, color="white", cachedir=""):
+        self.name = name
+        self.path = path
+        self.color = color
+        self.tolerances = tuple(sorted(float(t) for t in tolerances))
+        if cachedir:
+            base = os.path.basename(path)
+            self.cachefile = os.path.join(cachedir, base + ".basemap.npz")
+        else:
+            self.cachefile = path + ".basemap.npz"
+        self.levels = self._load()
+        if self.levels is None:
+            lines = project_lines(read_lines(path))
+            self.levels = [pack_lines(lines, t) for t in self.tolerances]
+            self._store()
+
+    def _identity(self):
+        st = os.stat(self.path)
+        origin = utils.get_radolan_origin()
+        text = "{0}|{1}|{2}|{3!r}|{4!r}".format(
+            os.path.abspath(self.path), st.st_size, int(st.st_mtime),
+            self.tolerances, tuple(float(v) for v in origin))
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        try:
+            with np.load(self.cachefile) as cache:
+                if str(cache["identity"]) != self._identity():
+                    return None
+                return [(cache["pos{0}".format(i)],
+                         cache["connect{0}".format(i)])
+                        for i in range(len(self.tolerances))]
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+
+    def _store(self):
+        arrays = {"identity": np.array(self._identity())}
+        for i, (pos, connect) in enumerate(self.levels):
+            arrays["pos{0}".format(i)] = pos
+            arrays["connect{0}".format(i)] = connect
+        tmp = "{0}.{1}.tmp".format(self.cachefile, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, **arrays)
+            os.rename(tmp, self.cachefile)
+        except (IOError, OSError):
+            # read-only location, project again next time
+            pass
+
+
+class Basemap(object):
+    """
+    All layers merged into one (pos, connect, layer) batch per tolerance
+    """
+    def __init__(self, layers, tolerances):
+        self.layers = list(layers)
+        self.tolerances = tuple(sorted(float(t) for t in tolerances))
+        self.colors = [layer.color for layer in self.layers]
+        self.levels = [self._merge(i) for i in range(len(self.tolerances))]
+
+    def _merge(self, i):
+        pos, connect, layer = [], [], []
+        count = 0
+        for li, lyr in enumerate(self.layers):
+            p, c = lyr.levels[i]
+            pos.append(p)
+            connect.append(c + count)
+            layer.append(np.full(len(p), li, dtype=np.uint8))
+            count += len(p)
+        if not pos:
+            return (np.zeros((0, 2), dtype=np.float32),
+                    np.zeros((0, 2), dtype=np.uint32),
+                    np.zeros(0, dtype=np.uint8))
+        return (np.vstack(pos), np.vstack(connect).astype(np.uint32),
+                np.concatenate(layer))
+
+    def level_for(self, scale, pixels=1.):
+        """ Coarsest level that deviates less than `pixels` on screen
+
+        `scale` are screen pixels per grid pixel.
+        """
+        level = 0
+        for i, tolerance in enumerate(self.tolerances):
+            if tolerance * scale <= pixels:
+                level = i
+        return level
+
+
+def create_basemap():
+    """ Basemap of the [layer:<name>] sections, None without layers
+
+    Layer options are `path` and `color`.
+    """
+    opts = conf["basemap"]
+    tolerances = [float(t) for t in opts.get("tolerances").split(",")]
+    layers = []
+    for section in conf.sections():
+        if not section.startswith("layer:"):
+            continue
+        lopts = conf[section]
+        try:
+            layers.append(Layer(section[len("layer:"):], lopts.get("path"),
+                                tolerances, lopts.get("color", "white"),
+                                opts.get("cache", "")))
+        except (IOError, OSError, ValueError) as e:
+            print("Basemap layer {0} failed: {1}".format(section, e))
+    if not layers:
+        return None
+    return Basemap(layers, tolerances)
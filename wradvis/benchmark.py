@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Render loop benchmark, replays scripted sessions on an offscreen MainWindow
+
+A session is a list of steps (JSON), eg.
+
+    [{"action": "play", "start": 0, "end": 24, "interval": 50},
+     {"action": "scrub", "start": 0, "end": 100, "steps": 20},
+     {"action": "zoom", "factor": 0.5, "repeat": 10},
+     {"action": "pan", "dx": 20, "dy": 0, "repeat": 10},
+     {"action": "key", "key": "c"},
+     {"action": "frames", "start": 0, "end": 10}]
+
+Every step records the latency of each frame (request to finished draw),
+the achieved fps and the memory in use. Results are JSON and carry the
+commit, `compare` reports steps slower than a baseline.
+
+Qt runs on the offscreen platform with software GL (Mesa llvmpipe). Qt 4
+builds without platform plugins need a virtual display, eg. xvfb-run.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+# no display and software GL, set before Qt and GL are loaded
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("LIBGL_ALWAYS_SOFTWARE", "1")
+os.environ.setdefault("GALLIUM_DRIVER", "llvmpipe")
+
+import numpy as np
+from PyQt4 import QtGui, QtCore
+
+from wradvis.gui import MainWindow
+
+
+DEFAULT_SESSION = [
+    {"action": "frames", "start": 0, "end": 12},
+    {"action": "play", "start": 0, "end": 24, "interval": 50},
+    {"action": "scrub", "start": 0, "end": 24, "steps": 24},
+    {"action": "zoom", "factor": 0.8, "repeat": 10},
+    {"action": "pan", "dx": 10, "dy": 5, "repeat": 10},
+    {"action": "zoom", "factor": 1.25, "repeat": 10},
+    {"action": "key", "key": "c"},
+    {"action": "frames", "start": 0, "end": 12},
+    {"action": "key", "key": "c"},
+]
+
+
+def rss():
+    """ Resident memory of this process in bytes
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        import resource
+        # peak instead of current, kB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def commit():
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                      cwd=os.path.dirname(__file__),
+                                      stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.decode("ascii").strip()
+
+
+def summary(latencies):
+    ms = np.asarray(latencies, dtype=np.float64) * 1000.
+    if not len(ms):
+        return None
+    return {"mean": float(ms.mean()), "p50": float(np.percentile(ms, 50)),
+            "p95": float(np.percentile(ms, 95)), "max": float(ms.max())}
+
+
+class Harness(object):
+    """
+    Drives a MainWindow step by step and records the draws of its canvases
+
+    `timeout` bounds the wait for a single draw in seconds.
+    """
+    def __init__(self, app, window, timeout=5.):
+        self.app = app
+        self.win = window
+        self.timeout = timeout
+        self.draws = []
+        for canvas in (window.rwidget.rcanvas, window.rwidget.pcanvas):
+            canvas.events.draw.connect(self.drawn)
+
+    def drawn(self, event):
+        self.draws.append(time.time())
+
+    @property
+    def vispy_active(self):
+        # the matplotlib canvas draws synchronously, without draw events
+        return self.win.iwidget is self.win.rwidget
+
+    def wait_draw(self):
+        """ Process events until the next draw, return its time
+        """
+        count = len(self.draws)
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            self.app.processEvents()
+            if len(self.draws) > count:
+                return self.draws[-1]
+        return None
+
+    def measure(self, action, draw=True):
+        """ Latency of `action()` up to its finished draw
+
+        Without `draw` only up to the processed events.
+        """
+        start = time.time()
+        action()
+        if draw and self.vispy_active:
+            end = self.wait_draw()
+            if end is None:
+                return None
+        else:
+            self.app.processEvents()
+            end = time.time()
+        return end - start
+
+    def run(self, step):
+        """ Run one step, return its record
+        """
+        step = dict(step)
+        action = step.pop("action")
+        before = rss()
+        handler = getattr(self, "step_" + action)
+        started = time.time()
+        latencies = handler(**step)
+        elapsed = time.time() - started
+        latencies = [l for l in latencies if l is not None]
+        record = {"action": action, "params": step,
+                  "frames": len(latencies),
+                  "latency_ms": summary(latencies),
+                  "fps": len(latencies) / elapsed if elapsed else None,
+                  "rss_mb": rss() / 2. ** 20,
+                  "rss_delta_mb": (rss() - before) / 2. ** 20,
+                  "cache_mb": self.win.memory.nbytes() / 2. ** 20}
+        return record
+
+    def _positions(self, start, end, steps=None):
+        last = self.win.mediabox.time_slider.maximum()
+        end = min(end, last)
+        if steps is None:
+            return list(range(start, end + 1))
+        return [int(round(p)) for p in np.linspace(start, end, steps)]
+
+    def show(self, pos):
+        slider = self.win.mediabox.time_slider
+        if slider.value() == pos:
+            # no change, no signal
+            self.win.show_frame(pos)
+        else:
+            slider.setValue(pos)
+
+    # steps, each returns per frame latencies in seconds
+
+    def step_frames(self, start=0, end=10):
+        """ Show frames one after the other, waiting for each draw
+        """
+        return [self.measure(lambda pos=pos: self.show(pos))
+                for pos in self._positions(start, end)]
+
+    def step_play(self, start=0, end=24, interval=50):
+        """ Timer driven playback of [start, end] at `interval` ms
+        """
+        media = self.win.mediabox
+        media.range.setLow(start)
+        media.range.setHigh(min(end, media.time_slider.maximum()))
+        self.measure(lambda: self.show(start))
+        media.speed.setValue(interval)
+        self.win.speed()
+        first = len(self.draws)
+        if not self.win.timer.isActive():
+            self.win.start_stop()
+        deadline = time.time() + self.timeout * (end - start + 1)
+        # played through once when the slider wraps around or stops
+        while time.time() < deadline:
+            self.app.processEvents()
+            if media.time_slider.value() >= media.range.high():
+                self.wait_draw()
+                break
+        self.win.start_stop()
+        draws = self.draws[first:]
+        return list(np.diff(draws))
+
+    def step_scrub(self, start=0, end=24, steps=24):
+        """ Drag the time slider, previews while held, full frame at the end
+
+        Previews are only drawn once thumbnails exist, while held the
+        latency is the time to handle the move.
+        """
+        slider = self.win.mediabox.time_slider
+        slider.setSliderDown(True)
+        latencies = [self.measure(lambda pos=pos: slider.setValue(pos),
+                                  draw=False)
+                     for pos in self._positions(start, end, steps)]
+        slider.setSliderDown(False)
+        latencies.append(self.measure(slider.sliderReleased.emit))
+        return latencies
+
+    def step_zoom(self, factor=0.8, repeat=10):
+        canvas = self.win.rwidget.rcanvas
+        return [self.measure(lambda: canvas.cam.zoom(factor))
+                for _ in range(repeat)]
+
+    def step_pan(self, dx=10, dy=0, repeat=10):
+        canvas = self.win.rwidget.rcanvas
+        return [self.measure(lambda: canvas.cam.pan((dx, dy)))
+                for _ in range(repeat)]
+
+    def step_key(self, key="c"):
+        """ Key press on the main window, eg. c swaps canvases
+        """
+        event = QtGui.QKeyEvent(QtCore.QEvent.KeyPress, 0,
+                                QtCore.Qt.NoModifier, key)
+
+        def press():
+            self.win.keyPressEvent(event)
+            # the swapped in canvas shows the current frame
+            self.win.show_frame(self.win.mediabox.time_slider.value())
+
+        return [self.measure(press)]
+
+    def step_wait(self, ms=500):
+        deadline = time.time() + ms / 1000.
+        while time.time() < deadline:
+            self.app.processEvents()
+        return []
+
+
+def run_session(session, size=(1200, 800), name="session"):
+    """ Replay `session` on a fresh MainWindow, return the results
+    """
+    app = QtGui.QApplication.instance() or QtGui.QApplication(sys.argv)
+    win = MainWindow()
+    win.resize(*size)
+    win.show()
+    harness = Harness(app, win)
+    harness.wait_draw()
+    steps = [harness.run(step) for step in session]
+    win.close()
+    return {"session": name, "commit": commit(), "time": time.time(),
+            "python": platform.python_version(),
+            "platform": os.environ.get("QT_QPA_PLATFORM"),
+            "size": list(size), "steps": steps}
+
+
+def compare(baseline, result, threshold=0.1):
+    """ Steps of `result` more than `threshold` slower than `baseline`
+
+    Steps are matched by position and action, returns (index, action,
+    measure, old, new) tuples.
+    """
+    regressions = []
+    pairs = zip(baseline["steps"], result["steps"])
+    for i, (old, new) in enumerate(pairs):
+        if old["action"] != new["action"]:
+            continue
+        if old["latency_ms"] and new["latency_ms"]:
+            a, b = old["latency_ms"]["p95"], new["latency_ms"]["p95"]
+            if b > a * (1 + threshold):
+                regressions.append((i, new["action"], "p95 ms", a, b))
+        if old["fps"] and new["fps"] and new["fps"] < old["fps"] / (1 +
+                                                                   threshold):
+            regressions.append((i, new["action"], "fps", old["fps"],
+                                new["fps"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="wradvis render benchmark")
+    parser.add_argument("session", nargs="?",
+                        help="JSON list of steps, a default session if not "
+                             "given")
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument("-b", "--baseline",
+                        help="results to compare with, regressions exit 1")
+    parser.add_argument("-t", "--threshold", type=float, default=0.1,
+                        help="tolerated slowdown, fraction (0.1)")
+    args = parser.parse_args(argv)
+
+    session, name = DEFAULT_SESSION, "default"
+    if args.session:
+        with open(args.session) as f:
+            session = json.load(f)
+        name = os.path.basename(args.session)
+    result = run_session(session, name=name)
+
+    for i, step in enumerate(result["steps"]):
+        latency = step["latency_ms"] or {}
+        print("{0:2d} {1:8s} frames {2:4d}  fps {3:7.1f}  p50 {4:7.1f} ms  "
+              "p95 {5:7.1f} ms  rss {6:7.1f} MB".format(
+                  i, step["action"], step["frames"], step["fps"] or 0,
+                  latency.get("p50", 0), latency.get("p95", 0),
+                  step["rss_mb"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, result, args.threshold)
+        for i, action, measure, old, new in regressions:
+            print("regression in step {0} ({1}): {2} {3:.1f} -> {4:.1f}"
+                  .format(i, action, measure, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Caches shared by the wradvis views
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from wradvis.memory import tick, sizeof
+
+
+class FrameCache(object):
+    """
+    Decoded frames shared by all views
+
+    Frames are reference counted, a frame held by any view is never
+    dropped. Frames nobody holds stay available in LRU order, at most
+    `maxsize` of them. `on_evict(key, data)` is called for every dropped
+    frame. Background threads may share the cache, frames are loaded
+    outside of its lock.
+    """
+    def __init__(self, maxsize=32, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._lock = threading.RLock()
+        self._frames = {}
+        self._refs = {}
+        # unused frames in LRU order, with the tick of their last use
+        self._unused = OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._frames
+
+    def __len__(self):
+        return len(self._frames)
+
+    def acquire(self, key, load):
+        """ Return frame `key` and hold a reference to it
+
+        `load` is called without arguments to decode a missing frame.
+        """
+        with self._lock:
+            if key in self._frames:
+                return self._hold(key)
+        data = load()
+        with self._lock:
+            # another thread may have loaded it meanwhile, keep one copy
+            if key not in self._frames:
+                self.misses += 1
+                self._frames[key] = data
+                self._nbytes += sizeof(data)
+                self._refs[key] = 1
+                return data
+            return self._hold(key)
+
+    def _hold(self, key):
+        self.hits += 1
+        self._unused.pop(key, None)
+        self._refs[key] = self._refs.get(key, 0) + 1
+        return self._frames[key]
+
+    def release(self, key):
+        with self._lock:
+            refs = self._refs.get(key, 0) - 1
+            if refs > 0:
+                self._refs[key] = refs
+                return
+            self._refs.pop(key, None)
+            if key in self._frames:
+                self._unused[key] = tick()
+                self._trim()
+
+    def get(self, key, load):
+        """ Return frame `key` without holding a reference
+        """
+        data = self.acquire(key, load)
+        self.release(key)
+        return data
+
+    def peek(self, key, default=None):
+        """ Return frame `key` if resident, without loading or reordering
+        """
+        with self._lock:
+            return self._frames.get(key, default)
+
+    def clear(self):
+        # held frames survive, their holders release them later
+        with self._lock:
+            for key in list(self._unused):
+                self._evict(key)
+
+    def nbytes(self):
+        return self._nbytes
+
+    def lru(self):
+        with self._lock:
+            for key, last in self._unused.items():
+                return key, sizeof(self._frames[key]), last
+        return None
+
+    def evict(self, key):
+        with self._lock:
+            if key in self._unused:
+                self._evict(key)
+
+    def _trim(self):
+        while len(self._unused) > self.maxsize:
+            self._evict(next(iter(self._unused)))
+
+    def _evict(self, key):
+        del self._unused[key]
+        data = self._frames.pop(key)
+        self._nbytes -= sizeof(data)
+        if self.on_evict is not None:
+            self.on_evict(key, data)
+
+
+class LRUCache(object):
+    """
+    Plain least recently used cache of at most `maxsize` items
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._ticks = {}
+        self._nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def keys(self):
+        return list(self._items)
+
+    def get(self, key, default=None):
+        if key not in self._items:
+            return default
+        self._items[key] = self._items.pop(key)
+        self._ticks[key] = tick()
+        return self._items[key]
+
+    def put(self, key, value):
+        if key in self._items:
+            self.evict(key)
+        self._items[key] = value
+        self._ticks[key] = tick()
+        self._nbytes += sizeof(value)
+        while len(self._items) > self.maxsize:
+            self.evict(next(iter(self._items)))
+
+    def clear(self):
+        self._items.clear()
+        self._ticks.clear()
+        self._nbytes = 0
+
+    def nbytes(self):
+        return self._nbytes
+
+    def lru(self):
+        for key, value in self._items.items():
+            return key, sizeof(value), self._ticks[key]
+        return None
+
+    def evict(self, key):
+        del self._ticks[key]
+        self._nbytes -= sizeof(self._items.pop(key))
+
+
+class DerivedCache(object):
+    """
+    Size bounded cache of derived arrays under content hash keys
+
+    Arrays are kept in memory up to `memory` bytes and, if `cachedir` is
+    given, as .npy files up to `disk` bytes. Both levels evict least
+    recently used entries first, a disk hit is promoted to memory.
+    """
+    def __init__(self, memory=256 * 2 ** 20, cachedir="", disk=2 * 2 ** 30):
+        self.memory = memory
+        self.cachedir = cachedir
+        self.disk = disk
+        self._items = OrderedDict()
+        self._ticks = {}
+        self._nbytes = 0
+        self._files = OrderedDict()
+        self._disk_nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        if cachedir:
+            self._scan()
+
+    def __contains__(self, key):
+        return key in self._items or key in self._files
+
+    def _scan(self):
+        # files from earlier sessions, oldest first
+        if not os.path.isdir(self.cachedir):
+            return
+        entries = []
+        for name in os.listdir(self.cachedir):
+            if name.endswith(".npy"):
+                st = os.stat(os.path.join(self.cachedir, name))
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._files[key] = size
+            self._disk_nbytes += size
+        self._trim_disk()
+
+    def _path(self, key):
+        return os.path.join(self.cachedir, key + ".npy")
+
+    def get(self, key, default=None):
+        if key in self._items:
+            self.hits += 1
+            self._items[key] = self._items.pop(key)
+            self._ticks[key] = tick()
+            return self._items[key]
+        if key in self._files:
+            try:
+                data = np.load(self._path(key))
+            except (IOError, OSError, ValueError):
+                # removed or truncated behind our back
+                self._drop_file(key)
+            else:
+                self.hits += 1
+                self._files[key] = self._files.pop(key)
+                self._put_memory(key, data)
+                return data
+        self.misses += 1
+        return default
+
+    def put(self, key, data):
+        data = np.asarray(data)
+        # views, eg. of shared memory slots, may change under us
+        if not data.flags.owndata:
+            data = data.copy()
+        self._put_memory(key, data)
+        if self.cachedir and key not in self._files:
+            self._put_disk(key, data)
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        self._items.clear()
+        self._ticks.clear()
+        self._nbytes = 0
+
+    def nbytes(self):
+        """ Bytes held in memory, files on disk are not counted
+        """
+        return self._nbytes
+
+    def lru(self):
+        for key, data in self._items.items():
+            return key, data.nbytes, self._ticks[key]
+        return None
+
+    def evict(self, key):
+        """ Drop `key` from memory, a file on disk is kept
+        """
+        del self._ticks[key]
+        self._nbytes -= self._items.pop(key).nbytes
+
+    def _put_memory(self, key, data):
+        if key in self._items:
+            self.evict(key)
+        if data.nbytes > self.memory:
+            return
+        self._items[key] = data
+        self._ticks[key] = tick()
+        self._nbytes += data.nbytes
+        while self._nbytes > self.memory:
+            self.evict(next(iter(self._items)))
+
+    def _put_disk(self, key, data):
+        if not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir)
+        path = self._path(key)
+        # write to a temporary name, readers never see partial files
+        tmp = "{0}.{1}".format(path, threading.current_thread().ident)
+        with open(tmp, "wb") as f:
+            np.save(f, data)
+        os.rename(tmp, path)
+        size = os.path.getsize(path)
+        self._files[key] = size
+        self._disk_nbytes += size
+        self._trim_disk()
+
+    def _trim_disk(self):
+        # the newest file stays, even if alone above the limit
+        while self._disk_nbytes > self.disk and len(self._files) > 1:
+            self._drop_file(next(iter(self._files)))
+
+    def _drop_file(self, key):
+        self._disk_nbytes -= self._files.pop(key)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Convective cells and their tracks
+
+Cells are the connected pixels at or above a threshold. Frames are
+labeled as horizontal runs: runs of neighbouring rows that touch are
+linked and the runs graph is reduced to components by vectorized label
+propagation. Centroid, area and peak of all cells follow from a few
+bincount/reduceat calls.
+
+Cells of consecutive frames are linked by pixel overlap first, cells
+left over by distance to the predicted position, found through a grid
+index. Both keep mutual best matches only. Positions are in grid
+coordinates (column, row) of pixel centers, as the contours.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from wradvis.cache import LRUCache
+
+
+# centroid (n, 2), area and peak per cell; pixels holds the flat indices
+# of all cell pixels in ascending order, label the cell of each
+Cells = namedtuple("Cells", "centroid area peak pixels label")
+
+# ids and velocity (pixels per frame) per cell; trail holds the recent
+# positions of the tracks alive, trail_id their track and trail_age the
+# frames since; next_id is the first unused track id
+Tracks = namedtuple("Tracks", "cells ids velocity trail trail_id trail_age "
+                              "next_id")
+
+
+def _ranges(first, length):
+    # first .. first + length of all ranges, concatenated
+    length = np.asarray(length, dtype=np.intp)
+    offsets = np.cumsum(length) - length
+    return (np.repeat(np.asarray(first, dtype=np.intp) - offsets, length) +
+            np.arange(length.sum()))
+
+
+def runs(mask):
+    """ (row, start, end) of the horizontal runs of `mask`, end exclusive
+
+    Runs are ordered by row, then column.
+    """
+    h, w = mask.shape
+    padded = np.zeros((h, w + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    # row major, every start is followed by its end
+    edges = np.flatnonzero(np.diff(padded, axis=1))
+    row, start = np.divmod(edges[0::2], w + 1)
+    return row, start, edges[1::2] % (w + 1)
+
+
+def _links(row, start, end, shape, connectivity=8, wrap=False):
+    """ Pairs of runs touching in consecutive rows
+
+    With `wrap` the last row touches the first (azimuths of polar data).
+    """
+    h, w = shape
+    # one key space for all rows, rows never overlap
+    k = w + 2
+    c = 1 if connectivity == 8 else 0
+    target = row + 1
+    if wrap:
+        target = target % h
+    lo = np.searchsorted(row * k + end, target * k + start - c, side='right')
+    hi = np.searchsorted(row * k + start, target * k + end + c, side='left')
+    count = np.maximum(hi - lo, 0)
+    a = np.repeat(np.arange(len(row)), count)
+    return a, _ranges(lo, count)
+
+
+def _components(n, a, b):
+    """ Component of each of `n` nodes linked by edges (a, b), 0 based
+    """
+    parent = np.arange(n)
+    while len(a):
+        pa, pb = parent[a], parent[b]
+        low = np.minimum(pa, pb)
+        hooked = parent.copy()
+        np.minimum.at(hooked, pa, low)
+        np.minimum.at(hooked, pb, low)
+        # pointer jumping to the roots
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, parent):
+            break
+        parent = hooked
+    roots, labels = np.unique(parent, return_inverse=True)
+    return labels.reshape(-1), len(roots)
+
+
+def detect(data, threshold, minarea=1, connectivity=8, wrap=False):
+    """ Cells of `data` at or above `threshold`, at least `minarea` pixels
+
+    With `wrap` rows are azimuths of polar data, cells may cross the
+    first ray and their centroid row is a circular mean.
+    """
+    data = np.asarray(data)
+    h, w = data.shape
+    with np.errstate(invalid='ignore'):
+        mask = data >= threshold
+    row, start, end = runs(mask)
+    a, b = _links(row, start, end, (h, w), connectivity, wrap)
+    label, n = _components(len(row), a, b)
+    length = end - start
+
+    area = np.bincount(label, weights=length, minlength=n)
+    x = np.bincount(label, weights=length * (start + end) / 2.,
+                    minlength=n)
+    if wrap:
+        angle = (row + 0.5) * (2 * np.pi / h)
+        ys = np.bincount(label, weights=length * np.sin(angle), minlength=n)
+        yc = np.bincount(label, weights=length * np.cos(angle), minlength=n)
+        y = np.mod(np.arctan2(ys, yc), 2 * np.pi) * (h / (2 * np.pi))
+    else:
+        y = np.bincount(label, weights=length * (row + 0.5),
+                        minlength=n) / np.maximum(area, 1)
+    centroid = np.column_stack((x / np.maximum(area, 1), y))
+
+    keep = area >= minarea
+    number = np.cumsum(keep) - 1
+    selected = keep[label]
+    label = number[label[selected]]
+    row, start, length = row[selected], start[selected], length[selected]
+    area = area[keep].astype(np.int32)
+
+    # runs are in row major order, so are their pixels
+    pixels = _ranges(row * w + start, length)
+    peak = np.zeros(len(area), dtype=np.float32)
+    if len(pixels):
+        # maximum per run, then per cell over its runs
+        values = data.reshape(-1).take(pixels)
+        peak_run = np.maximum.reduceat(values, np.cumsum(length) - length)
+        order = np.argsort(label, kind='mergesort')
+        nruns = np.bincount(label, minlength=len(area))
+        peak[:] = np.maximum.reduceat(peak_run[order],
+                                      np.cumsum(nruns) - nruns)
+    return Cells(centroid[keep].astype(np.float32), area, peak,
+                 pixels.astype(np.int32),
+                 np.repeat(label, length).astype(np.int32))
+
+
+def overlaps(previous, cells):
+    """ (cell, previous cell, shared pixels) of all overlapping pairs
+    """
+    if not len(previous.pixels) or not len(cells.pixels):
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, empty
+    idx = np.searchsorted(previous.pixels, cells.pixels)
+    idx = np.minimum(idx, len(previous.pixels) - 1)
+    hit = previous.pixels[idx] == cells.pixels
+    n = len(previous.area)
+    key = (cells.label[hit].astype(np.intp) * n +
+           previous.label[idx[hit]])
+    key, count = np.unique(key, return_counts=True)
+    return key // n, key % n, count
+
+
+def _mutual_best(a, b, score):
+    """ Pairs (a, b) that are the best of both a and b, highest `score`
+    """
+    if not len(a):
+        return a, b
+    order = np.lexsort((-score, a))
+    first_a = np.ones(len(a), dtype=bool)
+    first_a[1:] = a[order][1:] != a[order][:-1]
+    best_a = np.zeros(len(a), dtype=bool)
+    best_a[order[first_a]] = True
+    order = np.lexsort((-score, b))
+    first_b = np.ones(len(b), dtype=bool)
+    first_b[1:] = b[order][1:] != b[order][:-1]
+    best_b = np.zeros(len(b), dtype=bool)
+    best_b[order[first_b]] = True
+    both = best_a & best_b
+    return a[both], b[both]
+
+
+class GridIndex(object):
+    """
+    Points bucketed on a regular grid of `size`, for radius queries
+
+    Queries with radius up to `size` look at the 3 x 3 buckets around.
+    """
+    _shift = 2 ** 20
+
+    def __init__(self, points, size):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.size = float(size)
+        keys = self._keys(self.points)
+        self.order = np.argsort(keys, kind='mergesort')
+        self.keys = keys[self.order]
+
+    def _keys(self, points, dx=0, dy=0):
+        cell = np.floor(points / self.size).astype(np.int64)
+        return ((cell[:, 0] + dx + self._shift // 2) * self._shift +
+                cell[:, 1] + dy + self._shift // 2)
+
+    def query(self, points, radius):
+        """ (query, point) index pairs closer than `radius`
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        qs, ps = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = self._keys(points, dx, dy)
+                lo = np.searchsorted(self.keys, keys, side='left')
+                hi = np.searchsorted(self.keys, keys, side='right')
+                qs.append(np.repeat(np.arange(len(points)), hi - lo))
+                ps.append(self.order[_ranges(lo, hi - lo)])
+        q, p = np.concatenate(qs), np.concatenate(ps)
+        near = np.hypot(*(points[q] - self.points[p]).T) < radius
+        return q[near], p[near]
+
+
+def link(previous, cells, distance=10., history=12):
+    """ Tracks of `cells` continuing the Tracks `previous` (or None)
+
+    Overlapping cells are linked first, the others by distance to the
+    predicted position, up to `distance` pixels.
+    """
+    n = len(cells.area)
+    ids = np.full(n, -1, dtype=np.int64)
+    velocity = np.zeros((n, 2), dtype=np.float32)
+    next_id = 0
+    if previous is not None:
+        next_id = previous.next_id
+        prev = previous.cells
+        c, p, count = overlaps(prev, cells)
+        c, p = _mutual_best(c, p, count)
+        cfree = np.ones(n, dtype=bool)
+        pfree = np.ones(len(prev.area), dtype=bool)
+        cfree[c], pfree[p] = False, False
+        if cfree.any() and pfree.any():
+            rest_p = np.flatnonzero(pfree)
+            predicted = prev.centroid[rest_p] + previous.velocity[rest_p]
+            index = GridIndex(predicted, distance)
+            rest_c = np.flatnonzero(cfree)
+            qc, qp = index.query(cells.centroid[rest_c], distance)
+            dist = np.hypot(*(cells.centroid[rest_c[qc]] -
+                              predicted[qp]).T)
+            qc, qp = _mutual_best(qc, qp, -dist)
+            c = np.concatenate((c, rest_c[qc]))
+            p = np.concatenate((p, rest_p[qp]))
+        ids[c] = previous.ids[p]
+        velocity[c] = cells.centroid[c] - prev.centroid[p]
+
+    new = ids < 0
+    ids[new] = next_id + np.arange(new.sum())
+    next_id += int(new.sum())
+
+    trail, trail_id, trail_age = cells.centroid, ids, np.zeros(n, np.int16)
+    if previous is not None and len(previous.trail) and n:
+        # earlier positions of the continued tracks
+        alive = np.sort(ids)
+        idx = np.minimum(np.searchsorted(alive, previous.trail_id), n - 1)
+        age = previous.trail_age + 1
+        keep = (alive[idx] == previous.trail_id) & (age < history)
+        trail = np.vstack((previous.trail[keep], trail))
+        trail_id = np.concatenate((previous.trail_id[keep], trail_id))
+        trail_age = np.concatenate((age[keep].astype(np.int16), trail_age))
+    return Tracks(cells, ids, velocity, trail, trail_id, trail_age, next_id)
+
+
+def track_lines(tracks):
+    """ (pos, connect) of the trails of `tracks`, for one line visual
+    """
+    order = np.lexsort((-tracks.trail_age.astype(np.intp), tracks.trail_id))
+    pos = tracks.trail[order].astype(np.float32)
+    track = tracks.trail_id[order]
+    idx = np.flatnonzero(track[1:] == track[:-1]).astype(np.uint32)
+    return pos, np.column_stack((idx, idx + 1))
+
+
+class CellTracker(object):
+    """
+    Tracks per frame, computed forward and cached
+
+    Results are cached by frame and predecessor, a frame without a cached
+    predecessor is tracked from at most `history` frames before.
+    """
+    def __init__(self, threshold=40., minarea=4, distance=10., history=12,
+                 maxsize=512, wrap=False):
+        self.threshold = float(threshold)
+        self.minarea = int(minarea)
+        self.distance = float(distance)
+        self.history = int(history)
+        self.wrap = wrap
+        self.cache = LRUCache(maxsize)
+
+    def key(self, frames, pos):
+        previous = frames[pos - 1] if pos > 0 else None
+        return frames[pos], previous, self.threshold, self.minarea
+
+    def peek(self, frames, pos):
+        """ Cached tracks of frames[pos], None if not computed yet
+        """
+        return self.cache.get(self.key(frames, pos))
+
+    def get(self, frames, pos, load):
+        """ Tracks of frames[pos], `load(i)` returns the data of frame i
+        """
+        return self.advance(frames, pos, load)
+
+    def advance(self, frames, pos, load, count=None):
+        """ Track at most `count` more frames on the way to frames[pos]
+
+        Returns the tracks of frames[pos] once reached, else None.
+        """
+        first = max(pos - self.history, 0)
+        start, tracks = first, None
+        for i in range(pos, first - 1, -1):
+            cached = self.cache.get(self.key(frames, i))
+            if cached is not None:
+                start, tracks = i + 1, cached
+                break
+        stop = pos + 1 if count is None else min(start + count, pos + 1)
+        for i in range(start, stop):
+            cells = detect(load(i), self.threshold, self.minarea,
+                           wrap=self.wrap)
+            tracks = link(tracks, cells, self.distance, self.history)
+            self.cache.put(self.key(frames, i), tracks)
+        return tracks if stop == pos + 1 else None
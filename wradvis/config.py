@@ -19,9 +19,134 @@ def init_conf():
 
     conf = ConfigParser()
 
-    conf["dirs"] = {"data": os.path.join(os.getcwd(), "data/rw/20160529") }
+    # tables computed once per installation are kept in the user cache
+    cache = os.path.join(os.environ.get("XDG_CACHE_HOME") or
+                         os.path.join(os.path.expanduser("~"), ".cache"),
+                         "wradvis")
+
+    # data: a directory of files, a .tar/.tar.gz/.tar.bz2 archive or a
+    # directory of such archives
+    conf["dirs"] = {"data": os.path.join(os.getcwd(), "data/rw/20160529"),
+                    # root of a product/YYYY/MM/DD archive, overrides "data"
+                    "archive": ""}
     conf["source"] = {"product": "RW", "loc": ""}
-    conf["vis"] = {"cmax": 50, "cmin": 0}
+    # decoding of composites, unit: "native" (dBZ or depth) or "rate"
+    # (mm/h), reflectivity to rain rate by Z = a R^b
+    conf["decode"] = {"unit": "native", "a": 200., "b": 1.6}
+
+    # substeps: frames shown per time step during playback,
+    # intermediate frames are advected along the estimated motion
+    # dxmode: "polar" (shader) or "cartesian" (lookup table) rendering of
+    # DX data, dxres: cartesian pixel size in range bins
+    # settle: ms without slider movement before the full frame is read,
+    # thumbnails: number of scrubbing previews kept, each downsampled by
+    # the block maximum of thumbfactor x thumbfactor pixels
+    conf["vis"] = {"cmax": 50, "cmin": 0, "cmap": "cubehelix", "substeps": 1,
+                   "dxmode": "polar", "dxres": 0.5,
+                   "settle": 150, "thumbnails": 2048, "thumbfactor": 6,
+                   "probe": 16, "sparkline": 24}
+
+    # per-frame histograms, autoclim: off, frame, range or global,
+    # limits are the qlo/qhi percentiles of all pixels with signal
+    conf["hist"] = {"bins": 512, "autoclim": "off", "qlo": 1., "qhi": 99.}
+
+    # range statistics: histogram bins between lo and hi for percentiles,
+    # empty lo/hi use the value range of the product,
+    # memory budget in MB, workers = 0 uses all cores
+    conf["stats"] = {"bins": 256, "lo": "", "hi": "", "threshold": 1.,
+                     "memory": 256, "workers": 0}
+
+    # decoding in worker processes into shared memory (Python >= 3.8),
+    # workers = 0 decodes in the GUI process
+    conf["transport"] = {"workers": 0, "slots": 48, "readahead": 4}
+
+    # headless tile server, cache: directory for rendered tiles,
+    # memtiles: number of tiles kept in memory, refresh: seconds after
+    # which file listings are read again
+    conf["server"] = {"host": "127.0.0.1", "port": 8080, "cache": "",
+                      "memtiles": 1024, "refresh": 60}
+
+    # isolines over the RADOLAN view, levels: comma separated values,
+    # tolerance: simplification in pixels, cache: number of frames kept
+    conf["contour"] = {"levels": "1, 5, 10, 20", "tolerance": 0.5,
+                       "cmap": "autumn", "cache": 256}
+
+    # convective cells, threshold: in the unit of the decoded frames (dBZ
+    # for RX), minarea: smallest cell in pixels (km2), distance: largest
+    # displacement in pixels (km) between frames of cells not overlapping,
+    # history: frames of the track lines, cache: number of frames kept,
+    # batch: frames tracked per idle step of the GUI
+    conf["cells"] = {"threshold": 40., "minarea": 4, "distance": 10.,
+                     "history": 12, "cache": 512, "batch": 2}
+
+    # cross sections, spacing: sample distance in pixels (km),
+    # batch: frames sampled per idle step of the GUI, rows: number of
+    # sampled frames kept
+    conf["section"] = {"spacing": 1., "batch": 32, "rows": 8192}
+
+    # reprojection onto WGS84/Web-Mercator rasters, method: nearest or
+    # bilinear, cache: directory of the stored gather tables, "" keeps
+    # them in memory only
+    conf["reproject"] = {"method": "bilinear",
+                         "cache": os.path.join(cache, "reproject")}
+
+    # vector basemap, tolerances: simplification levels in pixels (km),
+    # the level is chosen by zoom; cache: directory of the projected
+    # levels, "" stores them next to the layer files
+    conf["basemap"] = {"tolerances": "0.25, 1, 4", "cache": ""}
+
+    # basemap layers (GeoJSON or shapefiles) are added as sections, eg.
+    # [layer:borders]
+    # path = /data/basemap/borders.geojson
+    # color = white
+
+    # rainfall alerts over the regions of a GeoJSON file or shapefile,
+    # field: feature property naming the regions; alerts are appended to
+    # log (JSON lines) and posted to webhook, "" disables either; batch:
+    # frames evaluated per idle step of the GUI
+    conf["alerts"] = {"regions": "", "field": "name", "log": "",
+                      "webhook": "", "batch": 16}
+
+    # alert rules are added as sections, eg.
+    # [alert:heavy]
+    # threshold = 25
+    # [alert:flood]
+    # measure = accumulation
+    # window = 60
+    # threshold = 40
+    # reduce = mean
+    # regions = Berlin, Potsdam
+    # measure: rate (mm/h, default) or accumulation (mm within window
+    # minutes), reduce: max (default) or mean over the region
+
+    # processing stages applied before display, in the order clutter,
+    # attenuation, zr; stages: comma separated names of enabled stages,
+    # stage outputs are cached in memory (MB) and in cache (disk MB)
+    conf["pipeline"] = {"stages": "", "memory": 256, "cache": "",
+                        "disk": 2048}
+
+    # stage parameters are set in sections, eg.
+    # [stage:zr]
+    # a = 256
+    # b = 1.42
+
+    # memory budget in MB shared by all caches, the other options weigh
+    # the cost of recreating a cached byte, cheap entries are evicted first
+    conf["memory"] = {"budget": 1024, "frames": 4., "derived": 8.,
+                      "contours": 2., "cells": 2., "thumbnails": 1.,
+                      "archives": 4., "intermediates": 1.,
+                      "sections": 2.}
+
+    # additional linked views are added as sections, eg.
+    # [panel:previous]
+    # offset = -60
+    # [panel:rx]
+    # product = RX
+    # dir = /data/rx/20160529
+    # join = nearest
+    # tolerance = 5
+    # all views form one stack on the time axis of the main view, join is
+    # previous (default), nearest or exact, tolerance in minutes
 
     return(conf)
 
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Isolines of radar frames
+
+Vectorized marching squares on the whole grid, the segments are chained
+into polylines and simplified (Douglas-Peucker). All levels of a frame
+end up in one vertex and one connection array, ready for a single line
+visual. Vertices are in grid coordinates (column, row) of pixel centers.
+"""
+
+import threading
+from collections import deque
+
+import numpy as np
+
+from wradvis.cache import LRUCache
+
+
+# cell corners: 1 = (r, c), 2 = (r, c + 1), 4 = (r + 1, c + 1), 8 = (r + 1, c)
+# cell edges: 0 = bottom, 1 = right, 2 = top, 3 = left
+# crossed edge pairs per case, saddles (5, 10) have two variants
+_SEGMENTS = {1: (0, 3), 2: (0, 1), 3: (1, 3), 4: (1, 2), 6: (0, 2),
+             7: (2, 3), 8: (2, 3), 9: (0, 2), 11: (1, 2), 12: (1, 3),
+             13: (0, 1), 14: (0, 3)}
+_SADDLE_CORNERS = ((0, 1), (2, 3))
+_SADDLE_SIDES = ((0, 3), (1, 2))
+
+
+def _table():
+    first = np.full((16, 2), -1, dtype=np.intp)
+    for case, pair in _SEGMENTS.items():
+        first[case] = pair
+    return first
+
+_FIRST = _table()
+
+
+def _edge_points(data, r, c, edge, level):
+    """ Interpolated crossing of `level` on `edge` of cells r, c
+    """
+    # end points of every edge, as (row, col) offsets within the cell
+    a = np.array([(0, 0), (0, 1), (1, 0), (0, 0)])[edge]
+    b = np.array([(0, 1), (1, 1), (1, 1), (1, 0)])[edge]
+    va = data[r + a[:, 0], c + a[:, 1]]
+    vb = data[r + b[:, 0], c + b[:, 1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip((level - va) / (vb - va), 0, 1)
+    t = np.nan_to_num(t)
+    x = c + a[:, 1] + t * (b[:, 1] - a[:, 1]) + 0.5
+    y = r + a[:, 0] + t * (b[:, 0] - a[:, 0]) + 0.5
+    return np.column_stack((x, y))
+
+
+def _edge_ids(r, c, edge, shape):
+    """ Grid wide id of `edge` of cells r, c, shared by both neighbours
+    """
+    h, w = shape
+    horizontal = (r + (edge == 2)) * (w - 1) + c
+    vertical = h * (w - 1) + r * w + c + (edge == 1)
+    return np.where((edge == 0) | (edge == 2), horizontal, vertical)
+
+
+def marching_squares(data, level):
+    """ Isoline segments of `data` at `level`
+
+    Returns (points, ids), points (n, 2, 2) holds the segment end points,
+    ids (n, 2) the grid edge each end lies on. Cells touching NaN are
+    skipped.
+    """
+    data = np.asarray(data, dtype=np.float32)
+    above = data > level
+    case = (above[:-1, :-1] * 1 + above[:-1, 1:] * 2 +
+            above[1:, 1:] * 4 + above[1:, :-1] * 8)
+    finite = np.isfinite(data)
+    valid = (finite[:-1, :-1] & finite[:-1, 1:] &
+             finite[1:, 1:] & finite[1:, :-1])
+    r, c = np.nonzero(valid & (case != 0) & (case != 15))
+    case = case[r, c]
+
+    edges = _FIRST[case]
+    saddle = (case == 5) | (case == 10)
+    if saddle.any():
+        sr, sc, scase = r[saddle], c[saddle], case[saddle]
+        center = (data[sr, sc] + data[sr, sc + 1] +
+                  data[sr + 1, sc] + data[sr + 1, sc + 1]) / 4.
+        # the above corners connect through the center in case 5 if the
+        # center is above, then the isolines cut off the other corners
+        cut_corners = (center > level) == (scase == 5)
+        first = np.where(cut_corners[:, None], _SADDLE_CORNERS[0],
+                         _SADDLE_SIDES[0])
+        second = np.where(cut_corners[:, None], _SADDLE_CORNERS[1],
+                          _SADDLE_SIDES[1])
+        edges[saddle] = first
+        r = np.concatenate((r, sr))
+        c = np.concatenate((c, sc))
+        edges = np.concatenate((edges, second))
+
+    points = np.stack((_edge_points(data, r, c, edges[:, 0], level),
+                       _edge_points(data, r, c, edges[:, 1], level)), axis=1)
+    ids = np.column_stack((_edge_ids(r, c, edges[:, 0], data.shape),
+                           _edge_ids(r, c, edges[:, 1], data.shape)))
+    return points, ids
+
+
+def chain(ids):
+    """ Chain segments sharing an edge id into polylines
+
+    Returns a list of segment index/orientation lists, one per polyline,
+    as (segment, flipped) pairs. Closed rings start and end on the same
+    edge.
+    """
+    ids = ids.tolist()
+    ends = {}
+    for seg, (a, b) in enumerate(ids):
+        ends.setdefault(a, []).append(seg)
+        ends.setdefault(b, []).append(seg)
+    used = np.zeros(len(ids), dtype=bool)
+    lines = []
+
+    def walk(edge, line):
+        # follow segments from `edge` onwards
+        while True:
+            others = [s for s in ends[edge] if not used[s]]
+            if not others:
+                return
+            seg = others[0]
+            used[seg] = True
+            a, b = ids[seg]
+            flipped = a != edge
+            line.append((seg, flipped))
+            edge = a if flipped else b
+
+    # open lines start at an edge with a single segment
+    starts = [segs[0] for segs in ends.values() if len(segs) == 1]
+    for seg in starts + list(range(len(ids))):
+        if used[seg]:
+            continue
+        used[seg] = True
+        a, b = ids[seg]
+        flipped = len(ends[b]) == 1
+        line = [(seg, flipped)]
+        walk(a if flipped else b, line)
+        lines.append(line)
+    return lines
+
+
+def simplify(points, tolerance):
+    """ Douglas-Peucker, return the indices of the kept points
+    """
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        p, q = points[i], points[j]
+        d = q - p
+        rest = points[i + 1:j] - p
+        norm = np.hypot(*d)
+        if norm:
+            dist = np.abs(rest[:, 0] * d[1] - rest[:, 1] * d[0]) / norm
+        else:
+            # closed ring, distance to the start point
+            dist = np.hypot(rest[:, 0], rest[:, 1])
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return np.nonzero(keep)[0]
+
+
+def contour_lines(data, levels, tolerance=0.5):
+    """ Simplified isolines of `data` at all `levels`
+
+    Returns (pos, connect, level), pos (n, 2) float32 vertices,
+    connect (m, 2) uint32 vertex pairs of the line segments and
+    level (n,) the index of the level of every vertex.
+    """
+    pos, connect, level = [], [], []
+    count = 0
+    for li, value in enumerate(levels):
+        points, ids = marching_squares(data, value)
+        for line in chain(ids):
+            seg = np.array([s for s, _ in line])
+            flipped = np.array([f for _, f in line])
+            start = np.where(flipped, 1, 0)
+            verts = points[seg, start]
+            last = points[seg[-1], 0 if flipped[-1] else 1]
+            verts = np.vstack((verts, last[None]))
+            verts = verts[simplify(verts, tolerance)]
+            n = len(verts)
+            pos.append(verts)
+            idx = np.arange(count, count + n - 1, dtype=np.uint32)
+            connect.append(np.column_stack((idx, idx + 1)))
+            level.append(np.full(n, li, dtype=np.uint8))
+            count += n
+    if not pos:
+        return (np.zeros((0, 2), dtype=np.float32),
+                np.zeros((0, 2), dtype=np.uint32),
+                np.zeros(0, dtype=np.uint8))
+    return (np.vstack(pos).astype(np.float32), np.vstack(connect),
+            np.concatenate(level))
+
+
+class ContourCache(object):
+    """
+    Isoline geometries per (frame, levels)
+
+    `get` computes missing geometries right away, `schedule` replaces the
+    queue of a background thread which fills the cache ahead of playback.
+    """
+    def __init__(self, levels, tolerance=0.5, maxsize=256):
+        self.levels = tuple(levels)
+        self.tolerance = tolerance
+        self._cache = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+
+    def key(self, frame):
+        return frame, self.levels
+
+    def __len__(self):
+        return len(self._cache)
+
+    # memory accounting, the background thread shares the cache
+
+    def nbytes(self):
+        with self._lock:
+            return self._cache.nbytes()
+
+    def lru(self):
+        with self._lock:
+            return self._cache.lru()
+
+    def evict(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.evict(key)
+
+    def get(self, frame, data):
+        key = self.key(frame)
+        with self._lock:
+            geometry = self._cache.get(key)
+        if geometry is None:
+            geometry = contour_lines(data, self.levels, self.tolerance)
+            with self._lock:
+                self._cache.put(key, geometry)
+        return geometry
+
+    def schedule(self, jobs):
+        """ Compute (frame, load) jobs in the background, in order
+
+        Jobs still waiting from an earlier call are dropped.
+        """
+        with self._lock:
+            self._pending.clear()
+            for frame, load in jobs:
+                key = self.key(frame)
+                if key not in self._cache:
+                    self._pending.append((key, load))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                key, load = self._pending.popleft()
+                if key in self._cache:
+                    continue
+            try:
+                geometry = contour_lines(load(), key[1], self.tolerance)
+            except Exception as e:
+                print("Contours of {0} failed: {1}".format(key[0], e))
+                continue
+            with self._lock:
+                self._cache.put(key, geometry)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Time indexed datasets of radar frames, without any GUI
+
+    ds = open_dataset("data/rw/20160529", "RW")
+    for time, frame in ds.iter_frames(prefetch=4):
+        ...
+    for times, stack in ds.iter_frames(batch=12):
+        ...
+
+Frames are decoded lazily and shared through a FrameCache. Neither this
+module nor anything it imports depends on Qt, vispy or matplotlib, the
+GUI builds on top of it.
+"""
+
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from wradvis import utils
+from wradvis import archive
+from wradvis.cache import FrameCache
+from wradvis.config import conf
+
+
+def create_source(path, pattern="raa0*", root="", previous=None):
+    """ Source of the files in `path` or of the archive hierarchy `root`
+
+    `path` is a directory of files, a tar archive or a directory of tar
+    archives. An ArchiveSource `previous` of the same root and pattern
+    is returned as is, keeping its day index.
+    """
+    if not root:
+        # tar archives are read in place
+        if archive.tar_files(path):
+            return archive.TarSource(path, pattern)
+        return archive.DirectorySource(path, pattern)
+    if (isinstance(previous, archive.ArchiveSource) and
+            previous.root == root and previous.pattern == pattern):
+        return previous
+    return archive.ArchiveSource(root, pattern)
+
+
+def default_window(source):
+    """ (start, end) of the most recent day of archive sources
+
+    Other sources are listed as a whole, (None, None).
+    """
+    if isinstance(source, archive.ArchiveSource):
+        day = source.last_day()
+        if day is not None:
+            day = np.datetime64(day, 'D')
+            return day, day + 1
+    return None, None
+
+
+class Dataset(object):
+    """
+    Time index, metadata and lazy frames of one product
+
+    Parameters
+    ----------
+    files, times : file names and their nominal times, in time order
+    product : product name, eg. 'RW'
+    frames : FrameCache shared with other users, keyed (file, product)
+    pipeline : optional processing Pipeline applied by `frame`
+    read : `read(fname, product)` decodes a frame, utils.read_frame by
+        default
+    """
+    def __init__(self, files, times, product, frames=None, pipeline=None,
+                 read=None):
+        self.files = list(files)
+        self.times = np.asarray(times, dtype='datetime64[s]')
+        self.product = product
+        self.frames = frames if frames is not None else FrameCache()
+        self.pipeline = pipeline
+        self.read = read or utils.read_frame
+        self._meta = {}
+
+    @classmethod
+    def from_source(cls, source, product, start=None, end=None, **kwargs):
+        files, times = source.select(start, end)
+        return cls(files, times, product, **kwargs)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._subset(self.files[i], self.times[i])
+        return self.frame(i)
+
+    def __iter__(self):
+        return self.iter_frames()
+
+    def _subset(self, files, times):
+        # subsets share frames and metadata
+        sub = Dataset(files, times, self.product, self.frames, self.pipeline,
+                      self.read)
+        sub._meta = self._meta
+        return sub
+
+    def window(self, start=None, end=None):
+        """ Dataset of the frames within [start, end)
+        """
+        return self[slice(*self.positions(start, end))]
+
+    def positions(self, start=None, end=None):
+        """ (first, stop) positions of the frames within [start, end)
+        """
+        first = 0 if start is None else int(np.searchsorted(
+            self.times, np.datetime64(start, 's')))
+        stop = len(self) if end is None else int(np.searchsorted(
+            self.times, np.datetime64(end, 's')))
+        return first, stop
+
+    def index_of(self, time, join="previous", tolerance=None):
+        """ Position of the frame matching `time`, -1 for none
+        """
+        return int(archive.align(self.times, [time], join, tolerance)[0])
+
+    def key(self, i):
+        """ Key of frame `i` in the frame cache
+        """
+        return self.files[i], self.product
+
+    def load(self, i):
+        """ Decoded frame `i`, before any processing
+        """
+        fname = self.files[i]
+        return self.frames.get(self.key(i),
+                               lambda: self.read(fname, self.product))
+
+    def frame(self, i, load=None):
+        """ Frame `i` after the processing pipeline
+
+        `load` returns the decoded frame instead of `load(i)`, eg. to
+        keep it in the cache while shown.
+        """
+        return self._process(i, load or (lambda: self.load(i)))
+
+    def _process(self, i, load):
+        if self.pipeline is None:
+            return load()
+        return self.pipeline.run(self.files[i], self.product, load)
+
+    def metadata(self, i):
+        """ Header attributes of frame `i`
+        """
+        fname = self.files[i]
+        if fname not in self._meta:
+            self._meta[fname] = utils.read_product(fname, self.product)[1]
+        return self._meta[fname]
+
+    def cube(self, callback=None):
+        """ Metadata of all frames, read in a single pass
+
+        The frames are decoded anyway, `callback(i, data)` sees every one
+        of them.
+        """
+        cube = []
+        for i, fname in enumerate(self.files):
+            data, meta = utils.read_product(fname, self.product)
+            self._meta[fname] = meta
+            cube.append(meta)
+            if callback is not None:
+                callback(i, data)
+        return cube
+
+    def iter_frames(self, start=None, end=None, step=1, prefetch=0,
+                    batch=None):
+        """ Frames within [start, end) in time order
+
+        Yields (time, frame), or (times, frames) stacked along a first
+        axis of `batch` frames, the last batch may be shorter. With
+        `prefetch` the next frames are decoded by background threads
+        while the current one is processed.
+        """
+        first, stop = self.positions(start, end)
+        positions = range(first, stop, step)
+        frames = ((i, self._process(i, lambda data=data: data))
+                  for i, data in self._decoded(positions, prefetch))
+        if not batch:
+            for i, data in frames:
+                yield self.times[i], data
+            return
+        times, stack = [], []
+        for i, data in frames:
+            times.append(self.times[i])
+            stack.append(data)
+            if len(stack) == batch:
+                yield np.array(times), np.stack(stack)
+                times, stack = [], []
+        if stack:
+            yield np.array(times), np.stack(stack)
+
+    def _decoded(self, positions, prefetch):
+        # (position, decoded frame) in order, up to `prefetch` frames
+        # decoded ahead; the cache is only touched from this thread
+        if not prefetch:
+            for i in positions:
+                yield i, self.load(i)
+            return
+        pool = ThreadPool(min(prefetch, 4))
+        pending = deque()
+        try:
+            for i in positions:
+                fname = self.files[i]
+                job = None
+                if (fname, self.product) not in self.frames:
+                    job = pool.apply_async(self.read, (fname, self.product))
+                pending.append((i, job))
+                if len(pending) > prefetch:
+                    yield self._collect(*pending.popleft())
+            while pending:
+                yield self._collect(*pending.popleft())
+        finally:
+            pool.terminate()
+
+    def _collect(self, i, job):
+        if job is None:
+            return i, self.load(i)
+        data = job.get()
+        return i, self.frames.get((self.files[i], self.product),
+                                  lambda: data)
+
+
+def open_dataset(path=None, product=None, start=None, end=None,
+                 pattern=None, **kwargs):
+    """ Dataset of `product` in `path`, defaults from conf
+
+    Without a time window archive hierarchies are opened at their most
+    recent day. Keyword arguments go to Dataset.
+    """
+    root = "" if path else conf["dirs"].get("archive", "")
+    path = path or conf["dirs"]["data"]
+    product = product or conf["source"]["product"]
+    if pattern is None:
+        pattern = "raa0*-{0}_*".format(product.lower())
+    source = create_source(path, pattern, root)
+    if start is None and end is None:
+        start, end = default_window(source)
+    return Dataset.from_source(source, product, start, end, **kwargs)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Lookup table decoding of raw RADOLAN composite codes
+
+Every possible code of a product maps to its physical value, decoding a
+frame is a single np.take into a (preallocated) float32 buffer. Flags
+(nodata, clutter) have their own table. Products that are not a plain
+array of codes, eg. the run-length encoded PG/PC, are decoded by wradlib.
+
+Units: "native" are dBZ for reflectivity products (RVP units) and
+precipitation depth for accumulations, "rate" is mm/h, for reflectivity
+products via the Z-R relation Z = a R^b.
+"""
+
+import numpy as np
+
+from wradvis import archive
+
+
+NODATA = 1
+CLUTTER = 2
+
+# one byte RVP products
+REFLECTIVITY = ('RX', 'EX', 'WX')
+# run-length encoded products
+RUNLENGTH = ('PG', 'PC')
+
+_luts = {}
+
+
+def read_raw(f):
+    """ Return the raw codes (rows, cols) and the header attributes of `f`
+
+    The codes are None for products without a fixed size code array.
+    """
+    import wradlib as wrl
+    if archive.split_member(f)[1] is not None:
+        fid = archive.open_member(f)
+    else:
+        fid = wrl.io.get_radolan_filehandle(f)
+    try:
+        header = wrl.io.read_radolan_header(fid)
+        attrs = wrl.io.parse_DWD_quant_composite_header(header)
+        if attrs['producttype'] in RUNLENGTH:
+            return None, attrs
+        shape = (attrs['nrow'], attrs['ncol'])
+        if attrs['producttype'] in REFLECTIVITY:
+            dtype = np.dtype(np.uint8)
+        else:
+            dtype = np.dtype('<u2')
+        size = shape[0] * shape[1] * dtype.itemsize
+        raw = wrl.io.read_radolan_binary_array(fid, size)
+    finally:
+        fid.close()
+    if len(raw) != size:
+        return None, attrs
+    return np.frombuffer(raw, dtype=dtype).reshape(shape), attrs
+
+
+class ProductLUT(object):
+    """
+    Physical values and flags of all raw codes of one product
+
+    Nodata codes decode to `missing`, clutter codes keep their value,
+    both are marked in `flags`.
+    """
+    def __init__(self, product, precision=0.1, interval=3600, unit="native",
+                 a=200., b=1.6, missing=None):
+        import wradlib as wrl
+        self.product = product
+        self.unit = unit
+        if product in REFLECTIVITY:
+            codes = np.arange(256)
+            values = codes / 2. - 32.5
+            flags = np.where(codes == 250, NODATA,
+                             np.where(codes == 249, CLUTTER, 0))
+            if missing is None:
+                missing = -32.5
+            if unit == "rate":
+                values = wrl.zr.z2r(wrl.trafo.idecibel(values), a=a, b=b)
+                missing = 0.
+        else:
+            codes = np.arange(2 ** 16)
+            values = (codes & 0x0FFF) * precision
+            if product == 'RD':
+                # the only product with a sign bit, masked off elsewhere
+                values = np.where(codes & 0x4000, -values, values)
+            flags = (np.where(codes & 0x2000, NODATA, 0) |
+                     np.where(codes & 0x8000, CLUTTER, 0))
+            if unit == "rate":
+                values = values * (3600. / interval)
+            if missing is None:
+                missing = 0.
+        values = np.where(flags & NODATA, missing, values)
+        self.values = values.astype(np.float32)
+        self.flags = flags.astype(np.uint8)
+
+    def decode(self, codes, out=None):
+        """ Physical values of `codes`, written into `out` if given
+        """
+        if out is None:
+            out = np.empty(codes.shape, dtype=np.float32)
+        # codes cover the table, clipping never happens but avoids the
+        # buffered copy np.take makes in "raise" mode
+        return np.take(self.values, codes, out=out, mode='clip')
+
+    def flags_of(self, codes, out=None):
+        """ NODATA | CLUTTER flags of `codes`
+        """
+        if out is None:
+            out = np.empty(codes.shape, dtype=np.uint8)
+        return np.take(self.flags, codes, out=out, mode='clip')
+
+    def texture(self, width=256):
+        """ The value table as (rows, width) array for a 2D texture
+
+        Code c is found at row c // width, column c % width.
+        """
+        return self.values.reshape(-1, width)
+
+
+def get_lut(product, attrs=None, unit="native", a=200., b=1.6):
+    """ Return the (cached) ProductLUT of `product`
+    """
+    attrs = attrs or {}
+    precision = attrs.get('precision') or 0.1
+    interval = attrs.get('intervalseconds') or 3600
+    key = (product, precision, interval, unit, a, b)
+    if key not in _luts:
+        _luts[key] = ProductLUT(product, precision, interval, unit, a, b)
+    return _luts[key]
+
+
+def read_composite(f, missing=0.):
+    """ Return the frame and the attributes of `f` decoded by wradlib
+
+    For products the lookup tables can't handle, values are in the
+    units of the product.
+    """
+    import wradlib as wrl
+    with archive.member_file(f) as fname:
+        data, attrs = wrl.io.read_RADOLAN_composite(fname, missing=missing)
+    return np.asarray(data, dtype=np.float32), attrs
+
+
+def read_decoded(f, product, unit="native", a=200., b=1.6, out=None):
+    """ Return the decoded frame and the attributes of `f`
+
+    `out` is a float32 buffer or a function returning one for a shape.
+    """
+    codes, attrs = read_raw(f)
+    if codes is None:
+        data, attrs = read_composite(f)
+        if out is None:
+            return data, attrs
+        if callable(out):
+            out = out(data.shape)
+        out[...] = data
+        return out, attrs
+    lut = get_lut(product, attrs, unit, a, b)
+    if callable(out):
+        out = out(codes.shape)
+    return lut.decode(codes, out), attrs
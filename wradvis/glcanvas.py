@@ -5,18 +5,27 @@
 # -----------------------------------------------------------------------------
 #!/usr/bin/env python
 
+import weakref
+
 import numpy as np
 
 from PyQt4 import QtGui, QtCore
 
+from vispy import gloo
+from vispy.color import get_colormap, ColorArray
 from vispy.scene import SceneCanvas
 from vispy.util.event import EventEmitter
+from vispy.visuals import Visual
+from vispy.visuals.shaders import Function
 from vispy.visuals.transforms import STTransform, MatrixTransform, PolarTransform
 from vispy.scene.cameras import PanZoomCamera
-from vispy.scene.visuals import Image, ColorBar, Markers, Text
+from vispy.scene.visuals import Image, ColorBar, Markers, Text, Line, \
+    create_visual_node
 from vispy.geometry import Rect
 
 from wradvis import utils
+from wradvis.resample import get_polar_lookup
+from wradvis.cells import track_lines
 from wradvis.config import conf
 
 
@@ -65,6 +74,284 @@ class ColorbarCanvas(SceneCanvas):
         self.freeze()
 
 
+FRAME_STACK_VERT = """
+attribute vec2 a_position;
+attribute vec2 a_texcoord;
+varying vec2 v_texcoord;
+
+void main() {
+    v_texcoord = a_texcoord;
+    gl_Position = $transform(vec4(a_position, 0., 1.));
+}
+"""
+
+FRAME_STACK_FRAG = """
+varying vec2 v_texcoord;
+uniform int u_mode;
+uniform int u_current;
+uniform int u_previous;
+uniform vec2 u_clim;
+uniform float u_threshold;
+%(uniforms)s
+%(decode)s
+
+float frame(int i) {
+%(lookup)s
+    return 0.;
+}
+
+float window_max() {
+    float m = -1e30;
+%(maximum)s
+    return m;
+}
+
+void main() {
+    float value;
+    vec2 clim = u_clim;
+    if (u_mode == 1) {
+        // difference to previous frame, symmetric limits
+        value = frame(u_current) - frame(u_previous);
+        clim = vec2(u_clim.x - u_clim.y, u_clim.y - u_clim.x);
+    } else if (u_mode == 2) {
+        value = window_max();
+    } else if (u_mode == 3) {
+        value = step(u_threshold, frame(u_current));
+        clim = vec2(0., 1.);
+    } else {
+        value = frame(u_current);
+    }
+    float norm = clamp((value - clim.x) / (clim.y - clim.x), 0., 1.);
+    gl_FragColor = $color_transform(norm);
+}
+"""
+
+# frames are physical values
+FRAME_STACK_VALUES = """
+float decode(float value) {
+    return value;
+}
+"""
+
+# frames are raw codes, decoded through a (rows, width) value table
+FRAME_STACK_CODES = """
+uniform sampler2D u_lut;
+uniform vec2 u_lut_shape;
+
+float decode(float code) {
+    // raw code c sits at row c / width, column c % width of the table
+    float row = floor(code / u_lut_shape.x);
+    float col = code - row * u_lut_shape.x;
+    return texture2D(u_lut, vec2((col + 0.5) / u_lut_shape.x,
+                                 (row + 0.5) / u_lut_shape.y)).r;
+}
+"""
+
+
+class FrameStackVisual(Visual):
+    """
+    Image visual keeping the last `slots` - 1 frames resident as textures
+
+    Raw and derived views (difference to the previous frame, maximum over
+    the resident frames, exceedance of a threshold) are computed in the
+    fragment shader, switching views only changes uniforms. The last slot
+    is scratch space for transient frames, eg. playback intermediates,
+    which neither evict resident frames nor take part in the maximum.
+
+    With a value table (`lut`) frames are raw codes, decoded in the
+    shader. The table takes the texture unit of the last slot, as GLES2
+    guarantees only eight, one frame less is kept resident.
+    """
+    MODES = ['raw', 'difference', 'maximum', 'exceedance']
+
+    def __init__(self, shape=(900, 900), slots=8, cmap='cubehelix',
+                 clim=(0, 50), threshold=1.):
+        Visual.__init__(self, vcode=FRAME_STACK_VERT,
+                        fcode=self._fragment(slots, codes=False))
+
+        self.shape = shape
+        h, w = shape
+        pos = np.array([[0, 0], [w, 0], [0, h], [w, h]], dtype=np.float32)
+        tex = np.array([[0, 0], [1, 0], [0, 1], [1, 1]], dtype=np.float32)
+        self.shared_program['a_position'] = gloo.VertexBuffer(pos)
+        self.shared_program['a_texcoord'] = gloo.VertexBuffer(tex)
+
+        self._textures = [
+            gloo.Texture2D(shape=shape + (1,), format='luminance',
+                           internalformat='r32f', interpolation='nearest')
+            for i in range(slots)]
+        self._tick = 0
+        self._current = 0
+        self._lut = None
+
+        self.cmap = get_colormap(cmap)
+        self.shared_program.frag['color_transform'] = \
+            Function(self.cmap.glsl_map)
+        self.clim = clim
+        self.threshold = threshold
+        self.mode = 'raw'
+        self._set_frames(slots)
+
+        self._draw_mode = 'triangle_strip'
+        self.set_gl_state('translucent', cull_face=False)
+
+    @property
+    def nbytes(self):
+        """ Texture memory of all slots
+        """
+        return len(self._textures) * self.shape[0] * self.shape[1] * 4
+
+    @staticmethod
+    def _fragment(frames, codes):
+        lines = lambda tmpl: "\n".join(tmpl.format(i) for i in range(frames))
+        return FRAME_STACK_FRAG % dict(
+            uniforms=lines("uniform sampler2D u_frame{0};\n"
+                           "uniform float u_valid{0};"),
+            decode=FRAME_STACK_CODES if codes else FRAME_STACK_VALUES,
+            lookup=lines("    if (i == {0}) return "
+                         "decode(texture2D(u_frame{0}, v_texcoord).r);"),
+            maximum=lines("    if (u_valid{0} > 0.5) m = max(m, "
+                          "decode(texture2D(u_frame{0}, v_texcoord).r));"))
+
+    def _set_frames(self, frames):
+        # the first `frames` textures are slots, none resident
+        self._keys = [None] * frames
+        # weak references to the uploaded arrays, new data under a
+        # resident key is uploaded again
+        self._sources = [None] * frames
+        self._used = [0] * frames
+        self._scratch = frames - 1
+        for i in range(frames):
+            self.shared_program['u_frame{0}'.format(i)] = self._textures[i]
+            self.shared_program['u_valid{0}'.format(i)] = 0.
+        self._set_slots(0, 0)
+
+    @property
+    def lut(self):
+        return self._lut
+
+    @lut.setter
+    def lut(self, table):
+        """ (rows, width) value table, frames are then raw codes
+
+        Switching between codes and values drops the resident frames.
+        """
+        codes = table is not None
+        if codes != (self._lut is not None):
+            slots = len(self._textures)
+            frames = slots - 1 if codes else slots
+            self.shared_program.frag = self._fragment(frames, codes)
+            self.shared_program.frag['color_transform'] = \
+                Function(self.cmap.glsl_map)
+            self._set_frames(frames)
+        self._lut = table
+        if codes:
+            self.shared_program['u_lut'] = gloo.Texture2D(
+                np.asarray(table, dtype=np.float32)[..., np.newaxis],
+                format='luminance', internalformat='r32f',
+                interpolation='nearest')
+            self.shared_program['u_lut_shape'] = (float(table.shape[1]),
+                                                  float(table.shape[0]))
+        self.update()
+
+    @property
+    def clim(self):
+        return self._clim
+
+    @clim.setter
+    def clim(self, clim):
+        self._clim = (float(clim[0]), float(clim[1]))
+        self.shared_program['u_clim'] = self._clim
+        self.update()
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        self._threshold = float(value)
+        self.shared_program['u_threshold'] = self._threshold
+        self.update()
+
+    @property
+    def mode(self):
+        return self.MODES[self._mode]
+
+    @mode.setter
+    def mode(self, mode):
+        self._mode = self.MODES.index(mode)
+        self.shared_program['u_mode'] = self._mode
+        self.update()
+
+    def clear(self):
+        """ Forget all resident frames, eg. after the source changed
+        """
+        self._set_frames(len(self._keys))
+
+    def set_data(self, data, key=None):
+        """ Show frame `key`, uploading `data` unless it is resident
+
+        Consecutive frames are expected to have consecutive numeric keys,
+        frames without key are numbered on arrival.
+        """
+        self._tick += 1
+        if key is None:
+            key = ('tick', self._tick)
+        if key in self._keys:
+            slot = self._keys.index(key)
+            source = self._sources[slot]
+            if source is None or source() is not data:
+                self._upload(slot, data)
+        else:
+            used = self._used[:self._scratch]
+            slot = used.index(min(used))
+            self._upload(slot, data)
+            self._keys[slot] = key
+            self.shared_program['u_valid{0}'.format(slot)] = 1.
+        self._used[slot] = self._tick
+        prev = key - 1 if isinstance(key, (int, float)) else None
+        self._set_slots(slot,
+                        self._keys.index(prev) if prev in self._keys else slot)
+        self.update()
+
+    def set_scratch(self, data, base=None):
+        """ Show a transient frame, difference views relate it to `base`
+        """
+        self._upload(self._scratch, data)
+        self._set_slots(self._scratch,
+                        self._keys.index(base) if base in self._keys
+                        else self._scratch)
+        self.update()
+
+    def _upload(self, slot, data):
+        self._textures[slot].set_data(
+            np.asarray(data, dtype=np.float32)[..., np.newaxis])
+        try:
+            self._sources[slot] = weakref.ref(data)
+        except TypeError:
+            self._sources[slot] = None
+
+    def _set_slots(self, current, previous):
+        self._current = current
+        self.shared_program['u_current'] = current
+        self.shared_program['u_previous'] = previous
+
+    def _prepare_transforms(self, view):
+        view.view_program.vert['transform'] = view.get_transform()
+
+    def _prepare_draw(self, view):
+        pass
+
+    def _compute_bounds(self, axis, view):
+        if axis > 1:
+            return (0, 0)
+        return (0, self.shape[1 - axis])
+
+
+FrameStack = create_visual_node(FrameStackVisual)
+
+
 class RadolanCanvas(SceneCanvas):
 
     def __init__(self, **kwargs):
@@ -98,14 +385,12 @@ class RadolanCanvas(SceneCanvas):
         cmap = 'cubehelix'
 
         self.images = []
-        # initialize Image Visual with img_data
-        # add to view
-        self.image = Image(img_data,
-                           method='subdivide',
-                           #interpolation='bicubic',
-                           cmap=cmap,
-                           clim=(0,50),
-                           parent=self.view.scene)
+        # initialize FrameStack Visual, raw and derived views of the
+        # resident frames, add to view
+        self.image = FrameStack(shape=img_data.shape,
+                                cmap=cmap,
+                                clim=(0, 50),
+                                parent=self.view.scene)
 
         self.images.append(self.image)
 
@@ -113,6 +398,43 @@ class RadolanCanvas(SceneCanvas):
         # (mostly positioning within canvas)
         self.image.transform = STTransform(translate=(0, 0, 0))
 
+        # low resolution preview while scrubbing, drawn above the frames
+        self.preview = Image(np.zeros((1, 1)),
+                             cmap=cmap,
+                             clim=(0, 50),
+                             parent=self.view.scene)
+        self.preview.transform = STTransform(translate=(0, 0, -1))
+        self.preview.visible = False
+
+        # isolines of all levels in one line visual, above the preview
+        self.contours = Line(method='gl', parent=self.view.scene)
+        self.contours.transform = STTransform(translate=(0, 0, -2))
+        self.contours.visible = False
+
+        # convective cells as markers and their tracks in one line visual
+        self.cells = Markers(parent=self.view.scene)
+        self.cells.transform = STTransform(translate=(0, 0, -2.5))
+        self.cells.visible = False
+        self.tracks = Line(color='yellow', width=2, method='gl',
+                           parent=self.view.scene)
+        self.tracks.transform = STTransform(translate=(0, 0, -2.5))
+        self.tracks.visible = False
+
+        # polyline drawn for cross sections, clicks add vertices and a
+        # right click finishes it
+        self.drawing = False
+        self.vertices = []
+        self.line_drawn = EventEmitter(source=self, type="line_drawn")
+        self.polyline = Line(color='white', width=2, method='gl',
+                             parent=self.view.scene)
+        self.polyline.transform = STTransform(translate=(0, 0, -3))
+        self.polyline.visible = False
+
+        # basemap, one line visual per simplification level, only the
+        # level matching the zoom is shown
+        self.basemap = None
+        self.basemap_lines = []
+
         # get radolan ll point coodinate into self.r0
         self.r0 = utils.get_radolan_origin()
 
@@ -126,6 +448,7 @@ class RadolanCanvas(SceneCanvas):
                                  parent=self.view.scene)
 
         self.view.camera = self.cam
+        self.view.scene.events.transform_change.connect(self.update_basemap)
 
         self._mouse_position = None
         self.freeze()
@@ -183,6 +506,37 @@ class RadolanCanvas(SceneCanvas):
             self.text.append(t)
             i += 1
 
+    def set_basemap(self, basemap):
+        """ Show the levels of `basemap`, None removes it
+        """
+        for line in self.basemap_lines:
+            if line is not None:
+                line.parent = None
+        self.basemap = basemap
+        self.basemap_lines = []
+        if basemap is not None:
+            colors = ColorArray(basemap.colors).rgba
+            for pos, connect, layer in basemap.levels:
+                if not len(connect):
+                    self.basemap_lines.append(None)
+                    continue
+                line = Line(pos=pos, connect=connect, color=colors[layer],
+                            method='gl', parent=self.view.scene)
+                line.transform = STTransform(translate=(0, 0, -1.5))
+                line.visible = False
+                self.basemap_lines.append(line)
+        self.update_basemap()
+
+    def update_basemap(self, event=None):
+        if self.basemap is None:
+            return
+        # screen pixels per grid pixel
+        scale = self.view.size[0] / float(self.cam.rect.width)
+        level = self.basemap.level_for(scale)
+        for i, line in enumerate(self.basemap_lines):
+            if line is not None and line.visible != (i == level):
+                line.visible = i == level
+
     def on_mouse_move(self, event):
         point = self.scene.node_transform(self.image).map(event.pos)[:2]
         self._mouse_position = point
@@ -193,7 +547,7 @@ class RadolanCanvas(SceneCanvas):
         self.view.interactive = False
 
         for v in self.visuals_at(event.pos, radius=30):
-            if isinstance(v, Markers):
+            if isinstance(v, Markers) and v is not self.cells:
                 if self.selected is None:
                     self.selected = v
                     self.selected.symbol = 'star'
@@ -207,6 +561,30 @@ class RadolanCanvas(SceneCanvas):
 
         self.view.interactive = True
 
+    def set_drawing(self, on):
+        self.drawing = on
+        self.vertices = []
+        self.polyline.visible = False
+        self.update()
+
+    def on_mouse_release(self, event):
+        if not self.drawing or event.press_event is None:
+            return
+        # only clicks count, dragging still pans
+        if np.hypot(*(event.pos - event.press_event.pos)[:2]) > 3:
+            return
+        if event.button == 1:
+            point = self.scene.node_transform(self.image).map(event.pos)[:2]
+            self.vertices.append(point)
+            if len(self.vertices) > 1:
+                self.polyline.set_data(
+                    pos=np.array(self.vertices, dtype=np.float32))
+                self.polyline.visible = True
+            self.update()
+        elif event.button == 2 and len(self.vertices) > 1:
+            self.drawing = False
+            self.line_drawn(vertices=np.array(self.vertices))
+
     def on_key_press(self, event):
         self.key_pressed(event)
 
@@ -290,6 +668,20 @@ class DXCanvas(SceneCanvas):
 
         self.images.append(self.image)
 
+        # alternative cartesian render path, the polar array is gathered
+        # onto a raster by a cached lookup table and shown as plain Image
+        res = conf.getfloat("vis", "dxres")
+        self.lookup = get_polar_lookup(self.img_data.shape[0],
+                                       self.img_data.shape[1], res)
+        self.cimage = Image(self.lookup.resample(self.img_data),
+                            method='subdivide',
+                            cmap=cmap,
+                            clim=(-32.5, 95),
+                            parent=self.view.scene)
+        self.cimage.transform = STTransform(scale=(res, res, 1))
+        self.mode = None
+        self.set_mode(conf.get("vis", "dxmode"))
+
         # add signal emitters
         self.mouse_moved = EventEmitter(source=self, type="mouse_moved")
         self.key_pressed = EventEmitter(source=self, type="key_pressed")
@@ -311,12 +703,50 @@ class DXCanvas(SceneCanvas):
         self.freeze()
         self.measure_fps()
 
+    def set_mode(self, mode):
+        """ Switch between 'polar' (impostor) and 'cartesian' rendering
+        """
+        self.mode = mode
+        cartesian = mode == 'cartesian'
+        self.cimage.visible = cartesian
+        for im in self.images:
+            im.visible = not cartesian
+        self.update()
+
+    def set_data(self, data):
+        self.img_data = data
+        if self.mode == 'cartesian':
+            self.cimage.set_data(self.lookup.resample(data))
+        else:
+            # now this sets same data to all images
+            # we would need to do the data loading
+            # via objects (maybe radar-object from above)
+            # and use
+            for im in self.images:
+                im.set_data(data)
+        self.update()
+
+    def set_clim(self, clim):
+        self.cimage.clim = clim
+        for im in self.images:
+            im.clim = clim
+
     def on_mouse_move(self, event):
-        tr = self.scene.node_transform(self.image)
-        point = tr.map(event.pos)[:2]
-        # todo: we should actually move this into PTransform in the future
-        point[0] += np.pi
-        point[0] = np.rad2deg(point[0])
+        if self.mode == 'cartesian':
+            tr = self.scene.node_transform(self.cimage)
+            col, row = tr.map(event.pos)[:2]
+            # exact data cell, center of ray and bin
+            cell = self.lookup.pick(col, row)
+            if cell is None:
+                return
+            step = 360. / self.lookup.nrays
+            point = np.array([(cell[0] + 0.5) * step, cell[1] + 0.5])
+        else:
+            tr = self.scene.node_transform(self.image)
+            point = tr.map(event.pos)[:2]
+            # todo: we should actually move this into PTransform in the future
+            point[0] += np.pi
+            point[0] = np.rad2deg(point[0])
         self._mouse_position = point
         # emit signal
         self.mouse_moved(event)
@@ -352,6 +782,11 @@ class RadolanWidget(QtGui.QWidget):
 
         self.canvas = self.rcanvas
 
+        # additional linked RadolanCanvas panels
+        self.panels = []
+        self.panel_names = []
+        self.basemap = None
+
         # canvas swapper
         self.swapper = {}
         self.swapper['R'] = self.rcanvas.native
@@ -371,7 +806,16 @@ class RadolanWidget(QtGui.QWidget):
         self.hbl.addWidget(self.splitter)
         self.setLayout(self.hbl)
 
+    def clear_frames(self):
+        """ Drop the resident frames of all canvases, eg. as stale
+        """
+        for canvas in [self.rcanvas] + self.panels:
+            canvas.image.clear()
+            canvas.update()
+
     def set_canvas(self, type):
+        # (possibly) new source, resident frames are stale
+        self.clear_frames()
         if type == 'DX':
             self.canvas = self.pcanvas
             self.swapper['P'].show()
@@ -381,15 +825,144 @@ class RadolanWidget(QtGui.QWidget):
             self.swapper['R'].show()
             self.swapper['P'].hide()
 
-    def set_data(self, data):
-        # now this sets same data to all images
-        # we would need to do the data loading
-        # via objects (maybe radar-object from above)
-        # and use
-        for im in self.canvas.images:
-            im.set_data(data)
+    def set_data(self, data, key=None):
+        if self.canvas is self.rcanvas:
+            # key identifies the frame within the resident frames
+            self.rcanvas.preview.visible = False
+            self.rcanvas.image.set_data(data, key=key)
+        else:
+            self.pcanvas.set_data(data)
         self.canvas.update()
 
+    def set_intermediate(self, data, base=None):
+        """ Show a synthesised frame between `base` and its successor
+        """
+        if self.canvas is self.rcanvas:
+            self.rcanvas.preview.visible = False
+            self.rcanvas.image.set_scratch(data, base=base)
+        else:
+            self.pcanvas.set_data(data)
+        self.canvas.update()
+
+    def set_lut(self, lut=None):
+        """ Decode raw codes on the GPU through a decode.ProductLUT
+
+        Frames passed to set_data are then raw codes, None switches back
+        to physical values.
+        """
+        self.rcanvas.image.lut = None if lut is None else lut.texture()
+        self.rcanvas.update()
+
+    def set_preview(self, data):
+        """ Show a downsampled frame stretched over the full grid
+        """
+        preview = self.rcanvas.preview
+        preview.set_data(data)
+        preview.transform.scale = (900. / data.shape[1],
+                                   900. / data.shape[0], 1)
+        preview.visible = True
+        self.rcanvas.update()
+
+    def hide_preview(self):
+        if self.rcanvas.preview.visible:
+            self.rcanvas.preview.visible = False
+            self.rcanvas.update()
+
+    def texture_nbytes(self):
+        return sum(canvas.image.nbytes
+                   for canvas in [self.rcanvas] + self.panels)
+
+    def set_contours(self, geometry=None, colors=None):
+        """ Show (pos, connect, level) isolines, None hides them
+        """
+        contours = self.rcanvas.contours
+        if geometry is None or not len(geometry[0]):
+            contours.visible = False
+        else:
+            pos, connect, level = geometry
+            contours.set_data(pos=pos, connect=connect, color=colors[level])
+            contours.visible = True
+        self.rcanvas.update()
+
+    def set_cells(self, tracks=None):
+        """ Show cells and track lines of cells.Tracks, None hides them
+        """
+        canvas = self.rcanvas
+        if tracks is None or not len(tracks.ids):
+            canvas.cells.visible = False
+            canvas.tracks.visible = False
+        else:
+            # marker size follows the cell diameter, in screen pixels
+            size = np.clip(2 * np.sqrt(tracks.cells.area / np.pi), 6, 30)
+            canvas.cells.set_data(pos=tracks.cells.centroid, size=size,
+                                  symbol='ring', edge_color='yellow',
+                                  face_color=(1, 1, 0, 0.25))
+            canvas.cells.visible = True
+            pos, connect = track_lines(tracks)
+            canvas.tracks.visible = len(connect) > 0
+            if len(connect):
+                canvas.tracks.set_data(pos=pos, connect=connect)
+        canvas.update()
+
+    def set_basemap(self, basemap):
+        self.basemap = basemap
+        for canvas in [self.rcanvas] + self.panels:
+            canvas.set_basemap(basemap)
+            canvas.update()
+
     def set_clim(self, clim):
-        self.canvas.image.clim = clim
+        if self.canvas is self.pcanvas:
+            self.pcanvas.set_clim(clim)
+        else:
+            self.canvas.image.clim = clim
+            self.rcanvas.preview.clim = clim
+        for canvas in self.panels:
+            canvas.image.clim = clim
+        self.cbar.cbar.clim = clim
+
+    def set_panels(self, names):
+        if names == self.panel_names:
+            return
+        for canvas in self.panels:
+            canvas.native.setParent(None)
+            canvas.close()
+        self.panels = []
+        self.panel_names = list(names)
+        for i, name in enumerate(names):
+            canvas = RadolanCanvas()
+            canvas.create_native()
+            canvas.native.setParent(self)
+            # pan and zoom together with the main canvas
+            canvas.cam.link(self.rcanvas.cam)
+            canvas.set_basemap(self.basemap)
+            Text(text=name, pos=(10, 15), color='white', font_size=10,
+                 anchor_x='left', parent=canvas.scene)
+            self.splitter.insertWidget(2 + i, canvas.native)
+            self.splitter.setStretchFactor(2 + i, 1)
+            self.panels.append(canvas)
+
+    def set_panel_data(self, frames):
+        """ Update all panels at once, `frames` holds (data, key) or None
+        """
+        for canvas, frame in zip(self.panels, frames):
+            if frame is None:
+                continue
+            canvas.image.set_data(frame[0], key=frame[1])
+            canvas.update()
+
+    def toggle_dx_mode(self):
+        mode = 'polar' if self.pcanvas.mode == 'cartesian' else 'cartesian'
+        self.pcanvas.set_mode(mode)
+        self.pcanvas.set_data(self.pcanvas.img_data)
+
+    def set_view(self, mode, threshold=None):
+        image = self.rcanvas.image
+        if threshold is not None:
+            image.threshold = threshold
+        image.mode = mode
+        clim = image.clim
+        if mode == 'difference':
+            clim = (clim[0] - clim[1], clim[1] - clim[0])
+        elif mode == 'exceedance':
+            clim = (0, 1)
         self.cbar.cbar.clim = clim
@@ -5,14 +5,32 @@
 # -----------------------------------------------------------------------------
 #!/usr/bin/env python
 
+import threading
+
 from PyQt4 import QtGui, QtCore
+import numpy as np
 import vispy
+from vispy.color import get_colormap
 
 # other wradvis imports
 from wradvis.glcanvas import RadolanWidget
 from wradvis.mplcanvas import MplWidget
-from wradvis.properties import Properties, MediaBox, SourceBox, MouseBox
+from wradvis.properties import Properties, MediaBox, SourceBox, MouseBox, \
+    DerivedBox, HistogramBox, MemoryBox, HovmoellerBox, AlertBox
 from wradvis import utils
+from wradvis.motion import FrameInterpolator
+from wradvis.cache import FrameCache, LRUCache
+from wradvis.resample import block_max
+from wradvis.stats import reduce_range, save_stats
+from wradvis.pipeline import create_pipeline
+from wradvis.contour import ContourCache
+from wradvis.cells import CellTracker
+from wradvis.section import LineSampler, Hovmoeller
+from wradvis.basemap import create_basemap
+from wradvis import alerts
+from wradvis import archive
+from wradvis import transport
+from wradvis import memory
 from wradvis.config import conf
 
 
@@ -26,17 +44,121 @@ class MainWindow(QtGui.QMainWindow):
         self.resize(825, 500)
         self.setWindowTitle('RADOLAN Viewer')
         self._need_canvas_refresh = False
+        self.range_stats = {}
+        # the array on the image canvas, a frame, an intermediate or
+        # range statistics, as probed under the cursor
+        self.shown = None
 
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.reload)
 
+        # optional decoder processes writing into shared memory slots,
+        # `slots` maps cached files to their slot
+        self.ring = None
+        self.decoders = None
+        self.slots = {}
+        self.gui_thread = threading.current_thread()
+        workers = conf.getint("transport", "workers")
+        if workers and transport.shared_memory is not None:
+            self.ring = transport.FrameRing(conf.getint("transport", "slots"))
+            self.decoders = transport.DecoderPool(
+                self.ring, workers, conf.getint("transport", "readahead"))
+
+        # decoded frames shared by all views, `held` maps each view to
+        # the frame it currently shows
+        self.frames = FrameCache(on_evict=self.evict_frame)
+        self.held = {}
+
+        # while the time slider is dragged only block-max thumbnails are
+        # shown, the full frame is loaded once the slider settles
+        self.thumbnails = LRUCache(conf.getint("vis", "thumbnails"))
+        self.settle = QtCore.QTimer()
+        self.settle.setSingleShot(True)
+        self.settle.setInterval(conf.getint("vis", "settle"))
+        self.settle.timeout.connect(self.settled)
+
+        # processing stages, results cached by content hash
+        self.pipeline = create_pipeline()
+
+        # isolines, computed ahead for the read-ahead window
+        opts = conf["contour"]
+        levels = [float(v) for v in opts.get("levels").split(",")
+                  if v.strip()]
+        self.contours = ContourCache(levels, opts.getfloat("tolerance"),
+                                     opts.getint("cache"))
+        self.contour_colors = np.asarray(get_colormap(opts.get("cmap")).map(
+            np.linspace(0, 1, max(len(levels), 1))))
+
+        # convective cells tracked across frames, cached per frame
+        opts = conf["cells"]
+        self.tracker = CellTracker(opts.getfloat("threshold"),
+                                   opts.getint("minarea"),
+                                   opts.getfloat("distance"),
+                                   opts.getint("history"),
+                                   opts.getint("cache"))
+
+        # distance-time diagram along a drawn line, sampled in batches
+        # whenever the GUI is idle, from position `section_pos` on
+        self.hovmoeller = None
+        self.section_rows = LRUCache(conf.getint("section", "rows"))
+        self.section_pos = 0
+        self.section_timer = QtCore.QTimer()
+        self.section_timer.setInterval(0)
+        self.section_timer.timeout.connect(self.sample_section)
+
+        # advected intermediate frames for smooth playback, computed in
+        # the background ahead of time
+        self.interpolator = FrameInterpolator()
+        self.substep = 0
+
         # initialize RadolanCanvas
         self.rwidget = RadolanWidget(self)
         self.iwidget = self.rwidget
 
+        # one memory budget for all caches
+        opts = conf["memory"]
+        self.memory = memory.MemoryBudget(opts.getint("budget") * 2 ** 20)
+        self.memory.register("frames", self.frames, opts.getfloat("frames"))
+        self.memory.register("derived", self.pipeline.cache,
+                             opts.getfloat("derived"))
+        self.memory.register("contours", self.contours,
+                             opts.getfloat("contours"))
+        self.memory.register("cells", self.tracker.cache,
+                             opts.getfloat("cells"))
+        self.memory.register("intermediates", self.interpolator,
+                             opts.getfloat("intermediates"))
+        self.memory.register("sections", self.section_rows,
+                             opts.getfloat("sections"))
+        self.memory.register("thumbnails", self.thumbnails,
+                             opts.getfloat("thumbnails"))
+        self.memory.register("archives", archive.ArchiveBuffers(),
+                             opts.getfloat("archives"))
+        self.memory.register("textures",
+                             memory.Fixed(self.rwidget.texture_nbytes))
+        self.memory.register("shared", memory.SharedArrays())
+
         # initialize MplWidget
         self.mwidget = MplWidget()
 
+        # vector basemap of the [layer:...] sections
+        self.basemap = create_basemap()
+        self.show_basemap(self.basemap is not None)
+
+        # rainfall alerts of the [alert:...] sections, new frames are
+        # evaluated in time order in batches whenever the GUI is idle
+        self.alerts = alerts.create_engine()
+        self.alert_product = None
+        self.alert_timer = QtCore.QTimer()
+        self.alert_timer.setInterval(0)
+        self.alert_timer.timeout.connect(self.evaluate_alerts)
+
+        # missing tracks are computed in idle steps, `cell_target` is the
+        # frame waiting for its tracks
+        self.cell_target = None
+        self.cell_timer = QtCore.QTimer()
+        self.cell_timer.setInterval(0)
+        self.cell_timer.timeout.connect(self.track_cells)
+
         # canvas swapper
         self.swapper = []
         self.swapper.append(self.rwidget)
@@ -44,6 +166,7 @@ class MainWindow(QtGui.QMainWindow):
 
         # need some tracer for the mouse position
         self.iwidget.canvas.key_pressed.connect(self.keyPressEvent)
+        self.rwidget.pcanvas.key_pressed.connect(self.keyPressEvent)
 
         # add PropertiesWidget
         self.props = Properties(self)
@@ -67,8 +190,13 @@ class MainWindow(QtGui.QMainWindow):
     def connect_signals(self):
         self.mediabox.signal_playpause_changed.connect(self.start_stop)
         self.mediabox.signal_time_slider_changed.connect(self.slider_changed)
+        self.mediabox.time_slider.sliderReleased.connect(self.settled)
         self.mediabox.signal_speed_changed.connect(self.speed)
         self.props.signal_props_changed.connect(self.slider_changed)
+        self.props.signal_props_changed.connect(self.update_alerts)
+        self.rwidget.rcanvas.line_drawn.connect(self.section_drawn)
+        self.mediabox.range.signal_range_moved.connect(
+            lambda low, high: self.update_section())
 
     def createActions(self):
         # Set  directory
@@ -87,6 +215,32 @@ class MainWindow(QtGui.QMainWindow):
                                       statusTip='Save project',
                                       triggered=self.props.save_conf)
 
+        # Statistics over the selected time range
+        self.computeStats = QtGui.QAction("Range &statistics", self,
+                                          statusTip='Statistics over range',
+                                          triggered=self.compute_range_stats)
+        self.exportStats = QtGui.QAction("&Export statistics", self,
+                                         statusTip='Export range statistics',
+                                         triggered=self.export_range_stats)
+        self.drawSection = QtGui.QAction("Cross &section", self,
+                                         checkable=True,
+                                         statusTip='Draw a line for a '
+                                                   'distance-time diagram',
+                                         toggled=self.draw_section)
+        self.showContours = QtGui.QAction("&Contours", self, checkable=True,
+                                          statusTip='Show isolines',
+                                          toggled=lambda on:
+                                          self.show_contours())
+        self.showCells = QtGui.QAction("C&ells", self, checkable=True,
+                                       statusTip='Show convective cells and '
+                                                 'their tracks',
+                                       toggled=lambda on: self.show_cells())
+        self.showBasemap = QtGui.QAction("&Basemap", self, checkable=True,
+                                         checked=self.basemap is not None,
+                                         enabled=self.basemap is not None,
+                                         statusTip='Show the basemap layers',
+                                         toggled=self.show_basemap)
+
     def createMenus(self):
         self.fileMenu = self.menuBar().addMenu("&File")
         self.fileMenu.addAction(self.setDataDir)
@@ -94,6 +248,20 @@ class MainWindow(QtGui.QMainWindow):
         self.fileMenu.addAction(self.saveConf)
 
         self.toolsMenu = self.menuBar().addMenu('&Tools')
+        self.toolsMenu.addAction(self.computeStats)
+        self.toolsMenu.addAction(self.exportStats)
+        self.toolsMenu.addAction(self.showContours)
+        self.toolsMenu.addAction(self.showCells)
+        self.toolsMenu.addAction(self.showBasemap)
+        self.toolsMenu.addAction(self.drawSection)
+        self.processMenu = self.toolsMenu.addMenu("&Processing")
+        for s in self.pipeline.stages:
+            action = QtGui.QAction(s.name, self, checkable=True,
+                                   checked=s.enabled)
+            action.toggled.connect(
+                lambda on, name=s.name: self.toggle_stage(name, on))
+            self.processMenu.addAction(action)
+        self.toolsMenu.addSeparator()
 
         self.helpMenu = self.menuBar().addMenu('&Help')
 
@@ -119,11 +287,88 @@ class MainWindow(QtGui.QMainWindow):
         self.addDockWidget(QtCore.Qt.RightDockWidgetArea, dock)
         self.toolsMenu.addAction(dock.toggleViewAction())
 
+        dock = QtGui.QDockWidget("Derived Views", self)
+        dock.setAllowedAreas(QtCore.Qt.RightDockWidgetArea)
+        self.derivedbox = DerivedBox(self)
+        dock.setWidget(self.derivedbox)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, dock)
+        self.toolsMenu.addAction(dock.toggleViewAction())
+
+        dock = QtGui.QDockWidget("Histogram", self)
+        dock.setAllowedAreas(QtCore.Qt.RightDockWidgetArea)
+        self.histbox = HistogramBox(self)
+        dock.setWidget(self.histbox)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, dock)
+        self.toolsMenu.addAction(dock.toggleViewAction())
+
+        dock = QtGui.QDockWidget("Hovmoeller", self)
+        dock.setAllowedAreas(QtCore.Qt.RightDockWidgetArea |
+                             QtCore.Qt.BottomDockWidgetArea)
+        self.hovbox = HovmoellerBox(self)
+        dock.setWidget(self.hovbox)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, dock)
+        self.toolsMenu.addAction(dock.toggleViewAction())
+        dock.hide()
+        self.hovdock = dock
+
+        dock = QtGui.QDockWidget("Memory", self)
+        dock.setAllowedAreas(QtCore.Qt.RightDockWidgetArea)
+        self.memorybox = MemoryBox(self)
+        dock.setWidget(self.memorybox)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, dock)
+        self.toolsMenu.addAction(dock.toggleViewAction())
+        dock.hide()
+
+        dock = QtGui.QDockWidget("Alerts", self)
+        dock.setAllowedAreas(QtCore.Qt.RightDockWidgetArea |
+                             QtCore.Qt.BottomDockWidgetArea)
+        self.alertbox = AlertBox(self)
+        dock.setWidget(self.alertbox)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, dock)
+        self.toolsMenu.addAction(dock.toggleViewAction())
+        if self.alerts is None:
+            dock.hide()
+
     def reload(self):
-        if self.mediabox.time_slider.value() >= self.mediabox.range.high():
+        pos = self.mediabox.time_slider.value()
+        substeps = conf.getint("vis", "substeps")
+        if (self.substep + 1 < substeps and self.props.product != 'DX' and
+                pos < self.mediabox.range.high()):
+            self.substep += 1
+            self.show_intermediate(pos, self.substep / float(substeps))
+        elif pos >= self.mediabox.range.high():
             self.mediabox.time_slider.setValue(self.mediabox.range.low())
         else:
-            self.mediabox.time_slider.setValue(self.mediabox.time_slider.value() + 1)
+            self.mediabox.time_slider.setValue(pos + 1)
+
+    def show_intermediate(self, pos, t):
+        # not ready yet, the current frame is held for this substep
+        files = self.props.dataset.files
+        if pos + 1 >= len(files):
+            return
+        data = self.interpolator.peek(files[pos], files[pos + 1], t)
+        if data is not None:
+            self.iwidget.set_intermediate(data, base=pos)
+            self.shown = data
+
+    def schedule_intermediates(self, pos):
+        """ Synthesise the intermediates after frame `pos` in the background
+        """
+        substeps = conf.getint("vis", "substeps")
+        if (substeps < 2 or self.props.product == 'DX' or
+                not self.timer.isActive() or
+                pos >= self.mediabox.range.high()):
+            return
+        ds = self.props.dataset
+        try:
+            curr = ds.frame(pos + 1)
+        except IndexError:
+            return
+        # the motion thread outlives the references of this frame
+        self.interpolator.schedule(
+            [(ds.files[pos], ds.files[pos + 1], self.detach(self.data),
+              self.detach(curr),
+              [i / float(substeps) for i in range(1, substeps)])])
 
     def start_stop(self):
         if self.timer.isActive():
@@ -134,24 +379,391 @@ class MainWindow(QtGui.QMainWindow):
     def speed(self):
         self.timer.setInterval(self.mediabox.speed.value())
 
+    def read_frame(self, fname, product=None):
+        product = product or self.props.product
+        # the decoder processes are only driven from the GUI thread,
+        # background threads decode themselves
+        if (self.decoders is not None and
+                threading.current_thread() is self.gui_thread):
+            decoded = self.decoders.get(fname, product)
+            # no free slot or too large for one, decode in process
+            if decoded is not None:
+                self.slots[(fname, product)] = decoded[0]
+                return decoded[1]
+        return utils.read_frame(fname, product)
+
+    def load_frame(self, i):
+        """ Decoded frame `i` of the dataset, before any processing
+
+        For analyses walking the frames in order: read through the frame
+        cache and the decoder processes, the next frames are prefetched.
+        """
+        self.prefetch(i)
+        return self.props.dataset.load(i)
+
+    def detach(self, data):
+        """ `data` safe to use after it left the frame cache
+
+        Decoder slots are reused once their frame is evicted, background
+        work gets a copy of frames living in a slot.
+        """
+        if (self.ring is not None and
+                np.may_share_memory(data, self.ring.frames)):
+            return data.copy()
+        return data
+
+    def load_detached(self, i):
+        """ Decoded frame `i` for background threads, see detach
+        """
+        ds = self.props.dataset
+        key = ds.key(i)
+        # held while copied, its slot can't be reused meanwhile
+        data = self.frames.acquire(key, lambda: ds.read(*key))
+        try:
+            return self.detach(data)
+        finally:
+            self.frames.release(key)
+
+    def evict_frame(self, key, data):
+        slot = self.slots.pop(key, None)
+        if slot is not None:
+            self.ring.release(slot)
+
+    def prefetch(self, pos):
+        if self.decoders is None:
+            return
+        ds = self.props.dataset
+        n = conf.getint("transport", "readahead")
+        for i in range(pos + 1, min(pos + 1 + n, len(ds))):
+            key = ds.key(i)
+            if key not in ds.frames:
+                self.decoders.prefetch(*key)
+
+    def hold(self, view, fname, product=None):
+        """ Return frame `fname` for `view`, releasing its previous frame
+        """
+        key = (fname, product or self.props.product)
+        data = self.frames.acquire(key,
+                                   lambda: self.read_frame(fname, product))
+        old = self.held.get(view)
+        if old is not None:
+            self.frames.release(old)
+        self.held[view] = key
+        return data
+
     def slider_changed(self, pos):
+        if self.mediabox.time_slider.isSliderDown():
+            self.show_preview(pos)
+            self.settle.start()
+        else:
+            self.show_frame(pos)
+
+    def settled(self):
+        # slider held still until the timeout, or released before it
+        if self.settle.isActive() or self.mediabox.time_slider.isSliderDown():
+            self.settle.stop()
+            self.show_frame(self.mediabox.time_slider.value())
+
+    def show_frame(self, pos):
+        self.substep = 0
+        ds = self.props.dataset
         try:
-            # Todo: switching happens here,
-            # but we should just use a common reading function, where the
-            # underlying wradlib function is exchanged on switching
-            # format
-            if self.props.product == 'DX':
-                self.data, _ = utils.read_dx(
-                    self.props.filelist[pos])
-
-            else:
-                self.data, _ = utils.read_radolan(self.props.filelist[pos])
-                if self.props.product == 'RX':
-                    self.data = (self.data / 2) - 32.5
+            fname = ds.files[pos]
+            self.data = ds.frame(pos, lambda: self.hold('main', fname))
         except IndexError:
             print("Could not read any data.")
         else:
-            self.iwidget.set_data(self.data)
+            self.iwidget.set_data(self.data, key=pos)
+            self.shown = self.data
+            self.show_contours(pos)
+            self.show_cells(pos)
+            self.update_panels(pos)
+            self.prefetch(pos)
+            self.schedule_intermediates(pos)
+            self.histbox.update_histogram()
+            key = (fname, self.props.product)
+            if key not in self.thumbnails and self.props.product != 'DX':
+                self.thumbnails.put(key, self.thumbnail(self.data))
+            self.memory.check()
+
+    def show_contours(self, pos=None):
+        if (not self.showContours.isChecked() or
+                self.iwidget is not self.rwidget or
+                self.props.product == 'DX' or
+                getattr(self, 'data', None) is None):
+            self.rwidget.set_contours(None)
+            return
+        if pos is None:
+            pos = self.mediabox.time_slider.value()
+        filelist = self.props.filelist
+        # contours of the frame as shown, after the processing stages
+        frame = (filelist[pos], self.pipeline.token)
+        self.rwidget.set_contours(self.contours.get(frame, self.data),
+                                  self.contour_colors)
+        if self.pipeline.active:
+            return
+        # decoded through the shared frame cache, the frames are shown
+        # next anyway
+        ds = self.props.dataset
+        n = conf.getint("transport", "readahead")
+        self.contours.schedule(
+            ((ds.files[i], ''), lambda i=i: self.load_detached(i))
+            for i in range(pos + 1, min(pos + 1 + n, len(ds))))
+
+    def show_cells(self, pos=None, cached=False):
+        """ Draw the tracked cells of frame `pos`
+
+        With `cached` only tracks computed before are shown, as while
+        scrubbing.
+        """
+        self.cell_timer.stop()
+        if (not self.showCells.isChecked() or
+                self.iwidget is not self.rwidget or
+                self.props.product == 'DX' or not self.props.filelist):
+            self.rwidget.set_cells(None)
+            return
+        if pos is None:
+            pos = self.mediabox.time_slider.value()
+        tracks = self.tracker.peek(self.props.filelist, pos)
+        self.rwidget.set_cells(tracks)
+        if tracks is None and not cached:
+            self.cell_target = pos
+            self.cell_timer.start()
+
+    def track_cells(self):
+        """ Track one batch of frames towards `cell_target`, then draw
+        """
+        if self.cell_target >= len(self.props.filelist):
+            # the file list changed meanwhile
+            self.cell_timer.stop()
+            return
+        # raw frames, the threshold is in the decoded unit
+        tracks = self.tracker.advance(self.props.filelist, self.cell_target,
+                                      self.load_frame,
+                                      conf.getint("cells", "batch"))
+        if tracks is not None:
+            self.cell_timer.stop()
+            self.rwidget.set_cells(tracks)
+            self.memory.check()
+
+    def show_basemap(self, on):
+        basemap = self.basemap if on else None
+        self.rwidget.set_basemap(basemap)
+        self.mwidget.set_basemap(basemap)
+
+    def draw_section(self, on):
+        self.rwidget.rcanvas.set_drawing(on)
+        if on:
+            self.hovdock.show()
+
+    def section_drawn(self, event):
+        self.drawSection.setChecked(False)
+        self.rwidget.rcanvas.polyline.visible = True
+        # vertices are in grid coordinates, whatever the frame shape (DX)
+        sampler = LineSampler(event.vertices,
+                              self.rwidget.rcanvas.image.shape,
+                              conf.getfloat("section", "spacing"))
+        self.section_rows.clear()
+        self.hovmoeller = Hovmoeller(sampler, rows=self.section_rows)
+        self.update_section()
+
+    def section_positions(self):
+        return range(self.mediabox.range.low(),
+                     min(self.mediabox.range.high() + 1,
+                         len(self.props.dataset)))
+
+    def section_keys(self, positions):
+        # frames as shown, after the processing stages
+        ds = self.props.dataset
+        return [ds.key(i) + (self.pipeline.token,) for i in positions]
+
+    def update_section(self):
+        if self.hovmoeller is not None:
+            self.section_pos = 0
+            self.section_timer.start()
+
+    def sample_section(self):
+        """ Sample the next batch of missing frames, then redraw
+        """
+        ds = self.props.dataset
+        positions = self.section_positions()
+        keys = self.section_keys(positions)
+        missing = set(self.hovmoeller.missing(keys))
+        batch = [(i, key) for i, key in zip(positions, keys)
+                 if key in missing and i >= self.section_pos]
+        batch = batch[:conf.getint("section", "batch")]
+        if batch:
+            frames = [ds.frame(i, lambda i=i: self.load_frame(i))
+                      for i, _ in batch]
+            self.hovmoeller.update([key for _, key in batch], frames)
+            # every frame is sampled once per pass, even if evicted since
+            self.section_pos = batch[-1][0] + 1
+        else:
+            self.section_timer.stop()
+        self.hovbox.set_image(self.hovmoeller.image(keys),
+                              self.rwidget.rcanvas.image.clim,
+                              get_colormap(conf.get("vis", "cmap")),
+                              len(keys) - len(missing) + len(batch),
+                              len(keys))
+        self.memory.check()
+
+    def update_alerts(self, *args):
+        """ Continue evaluating after the newest evaluated frame
+        """
+        engine = self.alerts
+        if engine is None:
+            return
+        times = self.props.dataset.times
+        # another product, or going back in time, starts over
+        if (self.props.product != self.alert_product or
+                (engine.last is not None and len(times) and
+                 times[-1] < engine.last)):
+            engine.reset()
+            self.alertbox.clear()
+            self.alert_product = self.props.product
+        if self.props.product != 'DX':
+            self.alert_timer.start()
+
+    def evaluate_alerts(self):
+        """ Evaluate one batch of new frames, in time order
+        """
+        engine = self.alerts
+        ds = self.props.dataset
+        if not len(ds) or self.props.product == 'DX':
+            self.alert_timer.stop()
+            return
+        # a fresh engine starts one accumulation window before the newest
+        # frame, no history is read again afterwards
+        if engine.last is None:
+            start = ds.times[-1] - engine.window
+        else:
+            start = engine.last + np.timedelta64(1, 's')
+        first = int(np.searchsorted(ds.times, start))
+        positions = range(first, min(first + conf.getint("alerts", "batch"),
+                                     len(ds)))
+        if not positions:
+            self.alert_timer.stop()
+            return
+        opts = conf["decode"]
+        product = self.props.product
+        raised = []
+        for i in positions:
+            data = self.load_frame(i)
+            interval = self.props.cube[i].get('intervalseconds') or None
+            convert = (lambda values, interval=interval: alerts.to_rate(
+                values, product, interval or 3600, opts.get("unit"),
+                opts.getfloat("a"), opts.getfloat("b")))
+            raised.extend(engine.update(ds.times[i], data, interval,
+                                        convert))
+        if raised:
+            self.alertbox.add_alerts(raised)
+        self.alertbox.set_status(engine.last, len(engine.active()))
+
+    def toggle_stage(self, name, on):
+        self.pipeline.stage(name).enabled = on
+        # resident textures and previews show the former processing
+        self.thumbnails.clear()
+        self.rwidget.clear_frames()
+        self.show_frame(self.mediabox.time_slider.value())
+        self.update_section()
+
+    def thumbnail(self, data):
+        factor = conf.getint("vis", "thumbfactor")
+        return block_max(data, factor).astype(np.float16)
+
+    def show_preview(self, pos):
+        # superseded reads would only delay the frame we settle on
+        if self.decoders is not None:
+            self.decoders.cancel_all()
+        if self.iwidget is not self.rwidget or self.props.product == 'DX':
+            return
+        try:
+            fname = self.props.filelist[pos]
+        except IndexError:
+            return
+        key = (fname, self.props.product)
+        thumb = self.thumbnails.get(key)
+        if thumb is None and key in self.frames:
+            thumb = self.thumbnail(self.frames.peek(key))
+            self.thumbnails.put(key, thumb)
+        if thumb is not None:
+            self.rwidget.set_preview(thumb)
+        else:
+            # no stale preview of another time over the held frame
+            self.rwidget.hide_preview()
+        self.show_cells(pos, cached=True)
+
+    def update_panels(self, pos):
+        if not self.props.panels:
+            return
+        # frames are held by file name, a file shown in several views
+        # is decoded once
+        bundle = self.props.stack.bundle(pos)
+        frames = []
+        for panel in self.props.panels:
+            found = bundle[panel.name]
+            if found is None:
+                frames.append(None)
+                continue
+            key, fname, product = found
+            frames.append((self.hold(panel.name, fname, product), key))
+        self.rwidget.set_panel_data(frames)
+
+    def compute_range_stats(self):
+        files = self.props.filelist[self.mediabox.range.low():
+                                    self.mediabox.range.high() + 1]
+        if not files:
+            return
+        shape = self.frames.get((files[0], self.props.product),
+                                lambda: self.read_frame(files[0])).shape
+        opts = conf["stats"]
+
+        progress = QtGui.QProgressDialog("Computing range statistics",
+                                         "", 0, 100, self)
+        progress.setCancelButton(None)
+        progress.show()
+
+        def update_progress(fraction):
+            progress.setValue(int(100 * fraction))
+            QtGui.QApplication.processEvents()
+
+        self.range_stats = reduce_range(files, self.props.product,
+                                        shape=shape,
+                                        bins=opts.getint("bins"),
+                                        lo=opts.get("lo") or None,
+                                        hi=opts.get("hi") or None,
+                                        threshold=opts.getfloat("threshold"),
+                                        memory=opts.getint("memory"),
+                                        workers=opts.getint("workers") or None,
+                                        callback=update_progress)
+        progress.close()
+        self.show_range_stats()
+
+    def show_range_stats(self):
+        if not self.range_stats:
+            return
+        names = sorted(self.range_stats.keys())
+        name, ok = QtGui.QInputDialog.getItem(self, "Range statistics",
+                                              "Show", names, 0, False)
+        if ok:
+            name = str(name)
+            self.shown = self.range_stats[name]
+            self.iwidget.set_data(self.shown, key=('stats', name))
+
+    def export_range_stats(self):
+        if not self.range_stats:
+            return
+        name = QtGui.QFileDialog.getSaveFileName(self, 'Export statistics',
+                                                 "", "NumPy (*.npz)")
+        if name:
+            save_stats(str(name), self.range_stats)
+
+    def closeEvent(self, event):
+        if self.decoders is not None:
+            self.decoders.close()
+            self.frames.clear()
+            self.ring.close()
+        super(MainWindow, self).closeEvent(event)
 
     def keyPressEvent(self, event):
         if isinstance(event, QtGui.QKeyEvent):
@@ -164,6 +776,8 @@ class MainWindow(QtGui.QMainWindow):
             self.swapper[0].show()
             self.swapper[0].setFocus()
             self.swapper[1].hide()
+        elif text == 'p':
+            self.rwidget.toggle_dx_mode()
 
 
 def start(arg):
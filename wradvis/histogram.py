@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Per-frame value histograms and automatic colour limits
+"""
+
+import numpy as np
+
+
+# value range of the histogram bins per product, reflectivities in dBZ,
+# everything else as precipitation depth
+PRODUCT_RANGES = {'RX': (-32.5, 95.), 'EX': (-32.5, 95.), 'DX': (-32.5, 95.)}
+DEFAULT_RANGE = (0., 100.)
+
+
+def product_edges(product, bins=512, unit="native"):
+    lo, hi = PRODUCT_RANGES.get(product, DEFAULT_RANGE)
+    if unit == "rate" and product != 'DX':
+        lo, hi = DEFAULT_RANGE
+    return np.linspace(lo, hi, bins + 1)
+
+
+class FrameHistograms(object):
+    """
+    Histograms of all frames of a file list on common bin edges
+
+    Every frame is binned once. Prefix sums over the frames make the
+    histogram of any frame range a single subtraction, O(bins).
+    Values outside the edges count into the first/last bin.
+    """
+    def __init__(self, edges, nframes):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.nbins = len(self.edges) - 1
+        self.counts = np.zeros((nframes, self.nbins), dtype=np.int32)
+        self._scale = self.nbins / (self.edges[-1] - self.edges[0])
+        self._prefix = None
+
+    def histogram(self, data):
+        values = np.asarray(data).ravel()
+        values = values[np.isfinite(values)]
+        idx = ((values - self.edges[0]) * self._scale).astype(np.intp)
+        np.clip(idx, 0, self.nbins - 1, out=idx)
+        return np.bincount(idx, minlength=self.nbins)
+
+    def set(self, i, data):
+        self.counts[i] = self.histogram(data)
+        self._prefix = None
+
+    def frame(self, i):
+        return self.counts[i].astype(np.int64)
+
+    def range(self, start, stop):
+        """ Merged histogram of frames start..stop (inclusive)
+        """
+        if self._prefix is None:
+            self._prefix = np.zeros((len(self.counts) + 1, self.nbins),
+                                    dtype=np.int64)
+            np.cumsum(self.counts, axis=0, out=self._prefix[1:])
+        return self._prefix[stop + 1] - self._prefix[start]
+
+    def total(self):
+        return self.range(0, len(self.counts) - 1)
+
+
+def percentile(counts, edges, q):
+    """ Value below which `q` percent of the counts fall
+    """
+    cum = np.cumsum(counts)
+    if not cum[-1]:
+        return np.nan
+    target = q / 100. * cum[-1]
+    b = int(np.searchsorted(cum, target))
+    below = cum[b - 1] if b else 0
+    frac = (target - below) / max(counts[b], 1)
+    return edges[b] + frac * (edges[b + 1] - edges[b])
+
+
+def auto_clim(counts, edges, qlo=1., qhi=99.):
+    """ Robust colour limits from a histogram
+
+    The first bin holds no-rain/no-echo values and would dominate any
+    percentile, so only the remaining bins are used. Returns None if
+    there is no signal at all.
+    """
+    signal = np.array(counts, dtype=np.int64)
+    signal[0] = 0
+    if not signal.any():
+        return None
+    lo = percentile(signal, edges, qlo)
+    hi = percentile(signal, edges, qhi)
+    if hi <= lo:
+        hi = lo + (edges[1] - edges[0])
+    return lo, hi
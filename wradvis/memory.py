@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Memory accounting across all caches
+
+Caches register with a MemoryBudget and report their size. Once the sum
+exceeds the budget, entries are evicted globally: the entry with the
+lowest weight / age goes first, weight being the cost of recreating a
+byte of the cache relative to the others.
+
+A registered cache provides `nbytes()` and `__len__`, evictable caches
+also `lru()`, returning (key, nbytes, tick) of their least recently used
+evictable entry or None, and `evict(key)`.
+"""
+
+import itertools
+
+import numpy as np
+
+
+_clock = itertools.count()
+
+
+def tick():
+    """ Global use counter, ordering accesses across caches
+    """
+    return next(_clock)
+
+
+def sizeof(value):
+    """ Approximate size of a cached value in bytes
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(v) for v in value)
+    return 0
+
+
+# read-only arrays shared by everyone who asks for them
+_shared = {}
+
+
+def shared(key, create):
+    """ Return the single read-only instance of the array `key`
+
+    `create` is called without arguments on first use.
+    """
+    if key not in _shared:
+        data = np.asarray(create())
+        data.flags.writeable = False
+        _shared[key] = data
+    return _shared[key]
+
+
+class SharedArrays(object):
+    """ Accounts the arrays returned by `shared`, never evicted
+    """
+    def __len__(self):
+        return len(_shared)
+
+    def nbytes(self):
+        return sum(a.nbytes for a in _shared.values())
+
+
+class Fixed(object):
+    """ Accounts an allocation outside any cache, eg. textures
+
+    `size` returns the current size in bytes.
+    """
+    def __init__(self, size):
+        self.size = size
+
+    def __len__(self):
+        return 1
+
+    def nbytes(self):
+        return self.size()
+
+
+class MemoryBudget(object):
+    """
+    One memory budget of `limit` bytes for all registered caches
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.caches = []
+        self.evictions = {}
+
+    def register(self, name, cache, weight=1.):
+        self.caches.append((name, cache, weight))
+        self.evictions[name] = 0
+
+    def nbytes(self):
+        return sum(cache.nbytes() for _, cache, _ in self.caches)
+
+    def check(self):
+        """ Evict until the total is within the budget
+
+        Returns the number of evicted entries.
+        """
+        total = self.nbytes()
+        count = 0
+        now = tick()
+        while total > self.limit:
+            victim = None
+            for name, cache, weight in self.caches:
+                lru = getattr(cache, 'lru', None)
+                entry = lru() if lru is not None else None
+                if entry is None:
+                    continue
+                key, nbytes, last = entry
+                score = weight / float(now - last + 1)
+                if victim is None or score < victim[0]:
+                    victim = (score, name, cache, key, nbytes)
+            if victim is None:
+                # only fixed or held memory left
+                break
+            _, name, cache, key, nbytes = victim
+            cache.evict(key)
+            self.evictions[name] += 1
+            total -= nbytes
+            count += 1
+        return count
+
+    def usage(self):
+        """ (name, entries, bytes, evictions) of every cache
+        """
+        return [(name, len(cache), cache.nbytes(), self.evictions[name])
+                for name, cache, _ in self.caches]
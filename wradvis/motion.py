@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Motion field estimation and temporal interpolation of radar frames
+"""
+
+import threading
+from collections import OrderedDict, deque
+from itertools import product
+
+import numpy as np
+
+from wradvis.cache import LRUCache
+
+
+def bilinear(img, y, x):
+    """ Sample `img` at fractional pixel positions (y, x)
+
+    y and x are broadcast against each other, positions outside the
+    image are clamped to the border.
+    """
+    h, w = img.shape
+    y = np.clip(y, 0, h - 1)
+    x = np.clip(x, 0, w - 1)
+    y0 = np.floor(y).astype(np.intp)
+    x0 = np.floor(x).astype(np.intp)
+    y1 = np.minimum(y0 + 1, h - 1)
+    x1 = np.minimum(x0 + 1, w - 1)
+    fy = y - y0
+    fx = x - x0
+    return ((img[y0, x0] * (1 - fx) + img[y0, x1] * fx) * (1 - fy) +
+            (img[y1, x0] * (1 - fx) + img[y1, x1] * fx) * fy)
+
+
+def _smooth(field):
+    # 3x3 box filter with edge padding
+    p = np.pad(field, 1, mode='edge')
+    h, w = field.shape
+    return sum(p[i:i + h, j:j + w]
+               for i in range(3) for j in range(3)) / 9.
+
+
+def shift(img, dy, dx):
+    """ Move `img` by dy rows and dx columns, NaN where nothing moved in
+    """
+    h, w = img.shape
+    out = np.full(img.shape, np.nan, dtype=img.dtype)
+    out[max(dy, 0):h + min(dy, 0), max(dx, 0):w + min(dx, 0)] = \
+        img[max(-dy, 0):h + min(-dy, 0), max(-dx, 0):w + min(-dx, 0)]
+    return out
+
+
+def block_motion(prev, curr, block=25, search=5, tol=1e-3):
+    """ Estimate the motion from `prev` to `curr` by block matching
+
+    For every displacement within +-`search` pixels the mean absolute
+    difference of all blocks is computed at once, each block keeps the
+    best one. Pixels moved in from outside the frame are left out. A
+    larger displacement has to lower the mean absolute difference by
+    more than `tol`, so empty blocks do not move.
+
+    Returns
+    -------
+    u, v : per block displacement in pixels along columns and rows
+    """
+    by, bx = prev.shape[0] // block, prev.shape[1] // block
+    prev = np.nan_to_num(prev[:by * block, :bx * block]).astype(np.float32)
+    curr = np.nan_to_num(curr[:by * block, :bx * block]).astype(np.float32)
+
+    best = np.full((by, bx), np.inf, dtype=np.float32)
+    u = np.zeros((by, bx), dtype=np.float32)
+    v = np.zeros((by, bx), dtype=np.float32)
+    shifts = sorted(product(range(-search, search + 1), repeat=2),
+                    key=lambda s: s[0] ** 2 + s[1] ** 2)
+    rows = np.arange(by * block)
+    cols = np.arange(bx * block)
+    for dy, dx in shifts:
+        diff = np.abs(curr - shift(prev, dy, dx))
+        valid = ~np.isnan(diff)
+        diff[~valid] = 0.
+        sad = diff.reshape(by, block, bx, block).sum(axis=(1, 3))
+        # pixels per block within the frame after the shift
+        n = np.outer(((rows >= dy) & (rows < by * block + dy))
+                     .reshape(by, block).sum(axis=1),
+                     ((cols >= dx) & (cols < bx * block + dx))
+                     .reshape(bx, block).sum(axis=1))
+        mad = np.where(n > 0, sad / np.maximum(n, 1), np.inf)
+        better = mad < best - tol
+        best[better] = mad[better]
+        v[better] = dy
+        u[better] = dx
+    return _smooth(u), _smooth(v)
+
+
+def upsample(field, block, shape):
+    """ Bilinearly expand a per block field to pixel resolution
+    """
+    y = (np.arange(shape[0]) + 0.5) / block - 0.5
+    x = (np.arange(shape[1]) + 0.5) / block - 0.5
+    return bilinear(field, y[:, np.newaxis], x[np.newaxis, :])
+
+
+def advect(frame, u, v, t):
+    """ Move `frame` by the fraction `t` of the motion field (u, v)
+    """
+    y, x = np.indices(frame.shape, dtype=np.float32)
+    return bilinear(frame, y - t * v, x - t * u)
+
+
+def interpolate(prev, curr, u, v, t):
+    """ Synthesise the frame at fraction `t` between `prev` and `curr`
+
+    Both frames are advected towards `t` and blended by distance.
+    """
+    return ((1 - t) * advect(prev, u, v, t) +
+            t * advect(curr, u, v, t - 1))
+
+
+class FrameInterpolator(object):
+    """
+    Intermediate frames between consecutive frames of a file list
+
+    Motion fields are cached per pair of files at block resolution, so
+    looping over a range estimates every field only once. `schedule`
+    hands pairs of frames to a background thread, which estimates the
+    motion and synthesises the intermediate frames; `peek` returns them
+    once ready, playback never waits for them.
+    """
+    def __init__(self, block=25, search=5, maxsize=64, maxframes=16):
+        self.block = block
+        self.search = search
+        self.maxsize = maxsize
+        self._flows = OrderedDict()
+        self._frames = LRUCache(maxframes)
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+
+    def __len__(self):
+        return len(self._frames)
+
+    # memory accounting, the background thread shares the cache
+
+    def nbytes(self):
+        with self._lock:
+            return self._frames.nbytes()
+
+    def lru(self):
+        with self._lock:
+            return self._frames.lru()
+
+    def evict(self, key):
+        with self._lock:
+            if key in self._frames:
+                self._frames.evict(key)
+
+    def flow(self, first, second, prev, curr):
+        key = (first, second)
+        with self._lock:
+            flow = self._flows.pop(key, None)
+        if flow is None:
+            flow = block_motion(prev, curr, self.block, self.search)
+        with self._lock:
+            while len(self._flows) >= self.maxsize:
+                self._flows.popitem(last=False)
+            self._flows[key] = flow
+        return flow
+
+    def frame(self, first, second, t, prev, curr):
+        """ Intermediate at fraction `t` from `prev` (first) to `curr`
+        """
+        u, v = [upsample(f, self.block, prev.shape)
+                for f in self.flow(first, second, prev, curr)]
+        return interpolate(prev, curr, u, v, t)
+
+    def peek(self, first, second, t):
+        """ The intermediate at `t` if already computed, else None
+        """
+        with self._lock:
+            return self._frames.get((first, second, t))
+
+    def schedule(self, jobs):
+        """ Compute (first, second, prev, curr, fractions) in the background
+
+        Jobs still waiting from an earlier call are dropped.
+        """
+        with self._lock:
+            self._pending.clear()
+            for first, second, prev, curr, fractions in jobs:
+                for t in fractions:
+                    key = (first, second, t)
+                    if key not in self._frames:
+                        self._pending.append((key, prev, curr))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                key, prev, curr = self._pending.popleft()
+                if key in self._frames:
+                    continue
+            try:
+                data = self.frame(key[0], key[1], key[2], prev, curr)
+            except Exception as e:
+                print("Interpolation of {0} failed: {1}".format(key[0], e))
+                continue
+            with self._lock:
+                self._frames.put(key, data.astype(np.float32))
@@ -14,6 +14,8 @@ matplotlib.use('Qt4Agg')
 from PyQt4 import QtGui, QtCore
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib.colors import colorConverter
 from matplotlib.cm import get_cmap
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
@@ -56,6 +58,11 @@ class MplCanvas(FigureCanvas):
         self.ax.set_ylim([grid[..., 1].min(), grid[..., 1].max()])
         self._mouse_position = None
 
+        # basemap, one line collection per simplification level
+        self.basemap = None
+        self.basemap_lines = []
+        self.ax.callbacks.connect('xlim_changed', self.update_basemap)
+
         self.create_cities()
 
     def create_cities(self):
@@ -78,6 +85,38 @@ class MplCanvas(FigureCanvas):
         self.mpl_connect('pick_event', self.onpick_cities)
         self.mpl_connect('motion_notify_event', self.on_move)
 
+    def set_basemap(self, basemap):
+        """ Show the levels of `basemap`, None removes it
+        """
+        for lines in self.basemap_lines:
+            lines.remove()
+        self.basemap = basemap
+        self.basemap_lines = []
+        if basemap is not None:
+            # basemap vertices are relative to the grid origin
+            origin = utils.get_radolan_origin()
+            colors = np.array([colorConverter.to_rgba(c)
+                               for c in basemap.colors])
+            for pos, connect, layer in basemap.levels:
+                lines = LineCollection(pos[connect] + origin,
+                                       colors=colors[layer[connect[:, 0]]],
+                                       linewidths=1, zorder=3)
+                lines.set_visible(False)
+                self.ax.add_collection(lines, autolim=False)
+                self.basemap_lines.append(lines)
+        self.update_basemap()
+        self.draw_idle()
+
+    def update_basemap(self, ax=None):
+        if self.basemap is None:
+            return
+        # screen pixels per grid pixel
+        x0, x1 = self.ax.get_xlim()
+        scale = self.ax.bbox.width / abs(x1 - x0)
+        level = self.basemap.level_for(scale)
+        for i, lines in enumerate(self.basemap_lines):
+            lines.set_visible(i == level)
+
     def onpick_cities(self, event):
         artist = event.artist
         cid = event.ind[0]
@@ -100,8 +139,6 @@ class MplCanvas(FigureCanvas):
 
     def on_move(self, event):
         if event.inaxes:
-            ax = event.inaxes  # the axes instance
-            print('data coords %f %f' % (event.xdata, event.ydata))
             self._mouse_position = np.array([event.xdata, event.ydata])
             self.mouse_moved.emit(event)
 
@@ -138,6 +175,12 @@ class MplWidget(QtGui.QWidget):
         #self.vbl.addWidget(self.canvas)
         #self.setLayout(self.vbl)
 
-    def set_data(self, data):
+    def set_basemap(self, basemap):
+        self.rcanvas.set_basemap(basemap)
+
+    def set_data(self, data, key=None):
         self.canvas.pm.set_array(data[:-1, :-1].ravel())
         self.canvas.fig.canvas.draw()
+
+    def set_intermediate(self, data, base=None):
+        self.set_data(data)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Processing stages applied to frames before display
+
+Every stage output is cached under a hash of the input file identity,
+the chain of enabled stages up to it and their parameters. Revisiting a
+frame or toggling a stage off and on again is a cache hit, after a change
+only the stages behind the longest cached prefix are computed.
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from wradvis import archive
+from wradvis import decode
+from wradvis.cache import DerivedCache
+from wradvis.config import conf
+
+
+# stage name -> (function, default parameters)
+STAGES = OrderedDict()
+
+
+def stage(name, **defaults):
+    """ Register `func(data, product, **params)` as processing stage
+    """
+    def register(func):
+        STAGES[name] = (func, defaults)
+        return func
+    return register
+
+
+@stage("clutter", wsize=5, thrsnorain=0.)
+def remove_clutter(data, product, wsize=5, thrsnorain=0.):
+    """ Gabella clutter filter, clutter pixels become NaN
+    """
+    import wradlib as wrl
+    clutter = wrl.clutter.filter_gabella(np.nan_to_num(data),
+                                         wsize=int(wsize),
+                                         thrsnorain=thrsnorain,
+                                         cartesian=product != 'DX')
+    out = np.array(data, dtype=np.float32)
+    out[clutter] = np.nan
+    return out
+
+
+@stage("attenuation", a=1.67e-4, b=0.7, thrs=59.)
+def correct_attenuation(data, product, a=1.67e-4, b=0.7, thrs=59.):
+    """ Hitschfeld-Bordan attenuation correction, polar data only
+    """
+    import wradlib as wrl
+    if product != 'DX':
+        return data
+    pia = wrl.atten.correctAttenuationHB(data, coefficients=dict(a=a, b=b,
+                                                                 l=1.),
+                                         mode='warn', thrs=thrs)
+    return (data + pia).astype(np.float32)
+
+
+@stage("zr", a=200., b=1.6)
+def z_to_r(data, product, a=200., b=1.6):
+    """ Rain rate in mm/h from reflectivity in dBZ
+    """
+    import wradlib as wrl
+    if product != 'DX' and product not in decode.REFLECTIVITY:
+        return data
+    if product != 'DX' and conf.get("decode", "unit") == "rate":
+        # already decoded to rain rate
+        return data
+    z = wrl.trafo.idecibel(data)
+    return wrl.zr.z2r(z, a=a, b=b).astype(np.float32)
+
+
+def file_identity(fname):
+    """ Path, size and modification time of `fname`
+
+    Archive members are identified by the archive and the member name.
+    """
+    path, member = archive.split_member(fname)
+    st = os.stat(path)
+    return "{0}:{1}:{2}:{3}".format(os.path.abspath(path), member,
+                                    st.st_size, int(st.st_mtime))
+
+
+class Stage(object):
+    def __init__(self, name, enabled=True, **params):
+        self.name = name
+        self.func, defaults = STAGES[name]
+        self.params = dict(defaults)
+        self.params.update(params)
+        self.enabled = enabled
+
+    @property
+    def token(self):
+        params = ",".join("{0}={1!r}".format(k, self.params[k])
+                          for k in sorted(self.params))
+        return "{0}({1})".format(self.name, params)
+
+    def __call__(self, data, product):
+        return self.func(data, product, **self.params)
+
+
+class Pipeline(object):
+    """
+    Chain of stages with cached intermediate results
+
+    `cache` is a DerivedCache, stage outputs are stored under chained
+    sha1 keys, key(n) = sha1(key(n - 1) + stage token).
+    """
+    def __init__(self, stages=(), cache=None):
+        self.stages = list(stages)
+        self.cache = cache if cache is not None else DerivedCache()
+
+    @property
+    def active(self):
+        return [s for s in self.stages if s.enabled]
+
+    @property
+    def token(self):
+        """ Identifies the enabled stages and their parameters
+        """
+        return "|".join(s.token for s in self.active)
+
+    def stage(self, name):
+        for s in self.stages:
+            if s.name == name:
+                return s
+        raise KeyError(name)
+
+    def keys(self, fname, product):
+        # the decoded input depends on the decoding options
+        key = hashlib.sha1("{0}|{1}|{2}".format(
+            file_identity(fname), product,
+            sorted(conf["decode"].items())).encode("utf-8"))
+        keys = []
+        for s in self.active:
+            key = key.copy()
+            key.update(("|" + s.token).encode("utf-8"))
+            keys.append(key.hexdigest())
+        return keys
+
+    def run(self, fname, product, load):
+        """ Processed frame of `fname`, `load()` returns the decoded frame
+        """
+        stages = self.active
+        if not stages:
+            return load()
+        keys = self.keys(fname, product)
+        data = None
+        start = len(stages)
+        while start:
+            data = self.cache.get(keys[start - 1])
+            if data is not None:
+                break
+            start -= 1
+        if not start:
+            data = load()
+        for s, key in zip(stages[start:], keys[start:]):
+            data = s(data, product)
+            self.cache.put(key, data)
+        return data
+
+
+def create_pipeline():
+    """ Pipeline of conf["pipeline"]["stages"]
+
+    Stage parameters are read from optional [stage:<name>] sections.
+    """
+    opts = conf["pipeline"]
+    cache = DerivedCache(memory=opts.getint("memory") * 2 ** 20,
+                         cachedir=opts.get("cache", ""),
+                         disk=opts.getint("disk") * 2 ** 20)
+    names = [n.strip() for n in opts.get("stages", "").split(",")
+             if n.strip()]
+    stages = []
+    for name in STAGES:
+        params = {}
+        section = "stage:" + name
+        if conf.has_section(section):
+            params = dict((k, conf.getfloat(section, k))
+                          for k in conf.options(section))
+        stages.append(Stage(name, enabled=name in names, **params))
+    return Pipeline(stages, cache)
@@ -10,12 +10,16 @@
 
 import os
 import glob
-from datetime import datetime as dt
+from datetime import datetime as dt, date
 
+import numpy as np
 from PyQt4 import QtGui, QtCore
 from PyQt4.QtGui import QLabel, QFontMetrics, QPainter
 
 from wradvis import utils
+from wradvis import archive
+from wradvis import histogram
+from wradvis import dataset
 from wradvis.config import conf
 
 
@@ -242,6 +246,77 @@ class LongLabel(QLabel):
         painter.drawText(self.rect(), self.alignment(), elided)
 
 
+class TimeListModel(QtCore.QAbstractListModel):
+    """
+    List model on top of a datetime64 array
+
+    One model is shared by all time combo boxes. Labels are only formatted
+    when a view asks for a visible row, so populating a view is O(1)
+    regardless of the number of frames.
+    """
+    def __init__(self, times=None, fmt="%H:%M", parent=None):
+        super(TimeListModel, self).__init__(parent)
+        self.fmt = fmt
+        self.times = np.array([], dtype='datetime64[s]')
+        if times is not None:
+            self.set_times(times)
+
+    def set_times(self, times):
+        self.beginResetModel()
+        self.times = np.asarray(times, dtype='datetime64[s]')
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.times)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        return self.label(index.row())
+
+    def datetime(self, row):
+        return self.times[row].astype(dt)
+
+    def label(self, row, fmt=None):
+        return self.datetime(row).strftime(fmt or self.fmt)
+
+    def index_of(self, time):
+        """ Return row of the last frame not later than `time`
+        """
+        if not len(self.times):
+            return -1
+        row = np.searchsorted(self.times, np.datetime64(time, 's'),
+                              side='right') - 1
+        return int(np.clip(row, 0, len(self.times) - 1))
+
+    def parse(self, text, row=0):
+        """ Parse user input into datetime64
+
+        Accepts full ISO-like timestamps ('2016-05-29 12:50') and bare
+        times ('12:50'), the latter are taken on the date of `row`.
+        """
+        text = str(text).strip()
+        try:
+            return np.datetime64(text, 's')
+        except ValueError:
+            day = self.times[row].astype('datetime64[D]')
+            return np.datetime64("{0}T{1}".format(day, text), 's')
+
+
+def create_time_combo(model):
+    combo = QtGui.QComboBox()
+    # uniform item sizes and a fixed contents length keep the combo from
+    # touching every row of the model to compute its size hint
+    combo.setView(QtGui.QListView())
+    combo.view().setUniformItemSizes(True)
+    combo.setSizeAdjustPolicy(QtGui.QComboBox.AdjustToMinimumContentsLength)
+    combo.setMinimumContentsLength(5)
+    combo.setModel(model)
+    return combo
+
+
 class DockBox(QtGui.QWidget):
     def __init__(self, parent=None):
         super(DockBox, self).__init__(parent)
@@ -253,6 +328,40 @@ class DockBox(QtGui.QWidget):
         self.props = parent.props
 
 
+class Sparkline(QtGui.QWidget):
+    def __init__(self, parent=None):
+        super(Sparkline, self).__init__(parent)
+        self.setMinimumSize(120, 30)
+        self.values = None
+
+    def set_values(self, values):
+        self.values = values
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QtCore.Qt.black)
+        if self.values is None or len(self.values) < 2:
+            return
+        valid = np.isfinite(self.values)
+        if not valid.any():
+            return
+        w, h = self.width() - 1, self.height() - 1
+        lo = self.values[valid].min()
+        span = max(self.values[valid].max() - lo, 1e-6)
+        xs = np.linspace(0, w, len(self.values))
+        ys = h - (self.values - lo) / span * h
+        painter.setPen(QtCore.Qt.lightGray)
+        # frames not resident in the cache leave gaps
+        for i in range(len(self.values) - 1):
+            if valid[i] and valid[i + 1]:
+                painter.drawLine(int(xs[i]), int(ys[i]),
+                                 int(xs[i + 1]), int(ys[i + 1]))
+        if valid[-1]:
+            painter.setPen(QtCore.Qt.red)
+            painter.drawEllipse(int(xs[-1]) - 2, int(ys[-1]) - 2, 4, 4)
+
+
 class MouseBox(DockBox):
     def __init__(self, parent=None):
         super(MouseBox, self).__init__(parent)
@@ -264,6 +373,9 @@ class MouseBox(DockBox):
         self.mousePointLLLabel = QtGui.QLabel("LL", self)
         self.mousePointXY = QtGui.QLabel("", self)
         self.mousePointLL = QtGui.QLabel("", self)
+        self.mouseValueLabel = QtGui.QLabel("Value", self)
+        self.mouseValue = QtGui.QLabel("", self)
+        self.sparkline = Sparkline(self)
         self.hline2 = QtGui.QFrame()
         self.hline2.setFrameShape(QtGui.QFrame.HLine)
         self.hline2.setFrameShadow(QtGui.QFrame.Sunken)
@@ -272,7 +384,17 @@ class MouseBox(DockBox):
         self.layout.addWidget(self.mousePointXY, 0, 2)
         self.layout.addWidget(self.mousePointLLLabel, 1, 1)
         self.layout.addWidget(self.mousePointLL, 1, 2)
-        self.layout.addWidget(self.hline2, 2, 0, 1, 3)
+        self.layout.addWidget(self.mouseValueLabel, 2, 1)
+        self.layout.addWidget(self.mouseValue, 2, 2)
+        self.layout.addWidget(self.sparkline, 3, 0, 1, 3)
+        self.layout.addWidget(self.hline2, 4, 0, 1, 3)
+
+        # pointer events arrive far more often than the screen refreshes,
+        # the probe runs at most once per interval on the latest position
+        self.probe_timer = QtCore.QTimer()
+        self.probe_timer.setSingleShot(True)
+        self.probe_timer.setInterval(conf.getint("vis", "probe"))
+        self.probe_timer.timeout.connect(self.probe)
 
         # connect to signal
         self.parent.rwidget.rcanvas.mouse_moved.connect(self.mouse_moved)
@@ -280,20 +402,315 @@ class MouseBox(DockBox):
         self.parent.mwidget.rcanvas.mouse_moved.connect(self.mouse_moved)
 
     def mouse_moved(self, event):
-        # todo: check if originating from mpl and adapt self.r0 correctly
+        if not self.probe_timer.isActive():
+            self.probe_timer.start()
+
+    def cell(self, point, shape):
+        """ Return the (row, col) index of `point` into a frame or None
+        """
+        if self.parent.props.product == 'DX':
+            # (azimuth in degrees, range bin)
+            row = int(np.floor(point[0])) % shape[0]
+            col = int(np.floor(point[1]))
+        else:
+            col, row = int(np.floor(point[0])), int(np.floor(point[1]))
+        if 0 <= row < shape[0] and 0 <= col < shape[1]:
+            return row, col
+        return None
+
+    def series(self, cell, shape):
+        """ Values at `cell` of the frames up to the current one
+
+        Only frames already resident in the frame cache are read, the
+        others are NaN.
+        """
+        n = conf.getint("vis", "sparkline")
+        pos = self.parent.mediabox.time_slider.value()
+        files = self.parent.props.filelist[max(pos - n + 1, 0):pos + 1]
+        values = np.full(len(files), np.nan)
+        product = self.parent.props.product
+        for i, fname in enumerate(files):
+            data = self.parent.frames.peek((fname, product))
+            if data is not None and data.shape[:2] == shape:
+                values[i] = data[cell]
+        return values
+
+    def probe(self):
         point = self.parent.iwidget.canvas._mouse_position
-        self.mousePointXY.setText(
-            "({0:d}, {1:d})".format(int(point[0]), int(point[1])))
+        if point is None:
+            return
+        product = self.parent.props.product
+        # matplotlib works in absolute RADOLAN coordinates
+        if self.parent.iwidget is self.parent.mwidget:
+            point = point - self.r0
 
         # Todo: move this all to utils and use a generalized
         # ll-retrieving function
-        if self.parent.props.product != 'DX':
+        if product != 'DX':
             ll = utils.radolan_to_wgs84(point + self.r0)
         else:
             ll = utils.dx_to_wgs84(point)
 
+        value = ""
+        values = None
+        data = self.parent.shown
+        if data is not None:
+            cell = self.cell(point, data.shape[:2])
+            if cell is not None:
+                value = "{0:.2f}".format(float(data[cell]))
+                # range statistics have no time series
+                if not any(data is stats for stats in
+                           self.parent.range_stats.values()):
+                    values = self.series(cell, data.shape[:2])
+
+        # one repaint for all labels
+        self.setUpdatesEnabled(False)
+        self.mousePointXY.setText(
+            "({0:d}, {1:d})".format(int(point[0]), int(point[1])))
         self.mousePointLL.setText(
             "({0:.2f}, {1:.2f})".format(ll[0], ll[1]))
+        self.mouseValue.setText(value)
+        self.sparkline.set_values(values)
+        self.setUpdatesEnabled(True)
+
+
+class DerivedBox(DockBox):
+    def __init__(self, parent=None):
+        super(DerivedBox, self).__init__(parent)
+
+        self.parent = parent
+        self.mode = QtGui.QComboBox()
+        self.mode.addItems(["raw", "difference", "maximum", "exceedance"])
+        self.mode.currentIndexChanged.connect(self.view_changed)
+        self.threshold = QtGui.QDoubleSpinBox()
+        self.threshold.setRange(-100, 1000)
+        self.threshold.setValue(1.)
+        self.threshold.valueChanged.connect(self.view_changed)
+
+        self.layout.addWidget(QtGui.QLabel("View"), 0, 0)
+        self.layout.addWidget(self.mode, 0, 1)
+        self.layout.addWidget(QtGui.QLabel("Threshold"), 1, 0)
+        self.layout.addWidget(self.threshold, 1, 1)
+
+    def view_changed(self):
+        self.parent.rwidget.set_view(str(self.mode.currentText()),
+                                     self.threshold.value())
+
+
+class HistogramPlot(QtGui.QWidget):
+    def __init__(self, parent=None):
+        super(HistogramPlot, self).__init__(parent)
+        self.setMinimumSize(220, 100)
+        self.counts = None
+        self.edges = None
+        self.clim = None
+
+    def set_histogram(self, counts, edges, clim=None):
+        self.counts = counts
+        self.edges = edges
+        self.clim = clim
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QtCore.Qt.black)
+        if self.counts is None or not self.counts.any():
+            return
+        w, h = self.width(), self.height()
+        # log scale, the no-rain bin would flatten everything else
+        heights = np.log1p(self.counts.astype(np.float64))
+        heights = heights / heights.max() * (h - 1)
+        xs = np.linspace(0, w, len(heights) + 1)
+        painter.setPen(QtCore.Qt.lightGray)
+        for x0, x1, bar in zip(xs[:-1], xs[1:], heights):
+            painter.drawLine(int(x0), h, int(x0), h - int(bar))
+        if self.clim is not None:
+            span = self.edges[-1] - self.edges[0]
+            painter.setPen(QtCore.Qt.red)
+            for value in self.clim:
+                x = int((float(value) - self.edges[0]) / span * w)
+                painter.drawLine(x, 0, x, h)
+
+
+class HistogramBox(DockBox):
+    def __init__(self, parent=None):
+        super(HistogramBox, self).__init__(parent)
+
+        self.parent = parent
+        self.autoclim = QtGui.QComboBox()
+        self.autoclim.addItems(["off", "frame", "range", "global"])
+        index = self.autoclim.findText(conf.get("hist", "autoclim"))
+        self.autoclim.setCurrentIndex(max(index, 0))
+        self.autoclim.currentIndexChanged.connect(self.update_histogram)
+        self.plot = HistogramPlot()
+        self.climLabel = QtGui.QLabel("")
+
+        self.layout.addWidget(QtGui.QLabel("Auto Limits"), 0, 0)
+        self.layout.addWidget(self.autoclim, 0, 1)
+        self.layout.addWidget(self.plot, 1, 0, 1, 2)
+        self.layout.addWidget(self.climLabel, 2, 0, 1, 2)
+
+        self.parent.mediabox.range.signal_range_moved.connect(
+            self.update_histogram)
+
+    def update_histogram(self, *args):
+        hists = self.props.hists
+        pos = self.props.actualFrame
+        if not len(hists.counts) or pos < 0:
+            return
+        mode = str(self.autoclim.currentText())
+        if mode == 'frame':
+            counts = hists.frame(pos)
+        elif mode == 'global':
+            counts = hists.total()
+        else:
+            mediabox = self.parent.mediabox
+            counts = hists.range(mediabox.range.low(),
+                                 min(mediabox.range.high(),
+                                     len(hists.counts) - 1))
+        clim = self.props.clim
+        if mode != 'off':
+            auto = histogram.auto_clim(counts, hists.edges,
+                                       conf.getfloat("hist", "qlo"),
+                                       conf.getfloat("hist", "qhi"))
+            if auto is not None:
+                clim = auto
+        # only uniforms and the colorbar change, no pixel data, 'off'
+        # restores the configured limits
+        self.parent.iwidget.set_clim(clim)
+        self.climLabel.setText("Limits ({0:.1f}, {1:.1f})".format(
+            float(clim[0]), float(clim[1])))
+        self.plot.set_histogram(counts, hists.edges, clim)
+
+
+class HovmoellerPlot(QtGui.QWidget):
+    def __init__(self, parent=None):
+        super(HovmoellerPlot, self).__init__(parent)
+        self.setMinimumSize(220, 160)
+        self.image = None
+
+    def set_image(self, rgba):
+        """ (time, distance, 4) uint8 colours, time running downwards
+        """
+        h, w = rgba.shape[:2]
+        # QImage.Format_ARGB32 is BGRA in memory
+        self.buffer = np.ascontiguousarray(rgba[..., [2, 1, 0, 3]])
+        self.image = QtGui.QImage(self.buffer.data, w, h, w * 4,
+                                  QtGui.QImage.Format_ARGB32)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QtCore.Qt.black)
+        if self.image is not None:
+            painter.drawImage(self.rect(), self.image)
+
+
+class HovmoellerBox(DockBox):
+    def __init__(self, parent=None):
+        super(HovmoellerBox, self).__init__(parent)
+
+        self.parent = parent
+        self.plot = HovmoellerPlot(self)
+        self.info = QtGui.QLabel("Draw a line, right click to finish", self)
+        self.layout.addWidget(self.plot, 0, 0)
+        self.layout.addWidget(self.info, 1, 0)
+        self.setSizePolicy(QtGui.QSizePolicy.Expanding,
+                           QtGui.QSizePolicy.Expanding)
+
+    def set_image(self, image, clim, cmap, done, total):
+        lo, hi = clim
+        norm = np.clip((image - lo) / (hi - lo), 0, 1)
+        lut = (np.asarray(cmap.map(np.linspace(0, 1, 256))) * 255).astype(
+            np.uint8)
+        rgba = lut[np.nan_to_num(norm * 255).astype(np.uint8)]
+        rgba[~np.isfinite(image)] = 0
+        self.plot.set_image(rgba)
+        self.info.setText("{0:d} km x {1:d} frames ({2:d} sampled)".format(
+            image.shape[1], total, done))
+
+
+class MemoryBox(DockBox):
+    def __init__(self, parent=None):
+        super(MemoryBox, self).__init__(parent)
+
+        self.parent = parent
+        self.table = QtGui.QTableWidget(0, 4, self)
+        self.table.setHorizontalHeaderLabels(["Cache", "Entries", "MB",
+                                              "Evicted"])
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        self.total = QtGui.QLabel("", self)
+        self.layout.addWidget(self.table, 0, 0)
+        self.layout.addWidget(self.total, 1, 0)
+
+        # live usage while shown
+        self.timer = QtCore.QTimer()
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.update_usage)
+
+    def showEvent(self, event):
+        self.update_usage()
+        self.timer.start()
+        super(MemoryBox, self).showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super(MemoryBox, self).hideEvent(event)
+
+    def update_usage(self):
+        budget = self.parent.memory
+        usage = budget.usage()
+        self.table.setRowCount(len(usage))
+        for row, (name, entries, nbytes, evictions) in enumerate(usage):
+            for col, text in enumerate([name, str(entries),
+                                        "{0:.1f}".format(nbytes / 2. ** 20),
+                                        str(evictions)]):
+                self.table.setItem(row, col, QtGui.QTableWidgetItem(text))
+        self.total.setText("{0:.1f} of {1:.0f} MB".format(
+            budget.nbytes() / 2. ** 20, budget.limit / 2. ** 20))
+
+
+class AlertBox(DockBox):
+    def __init__(self, parent=None):
+        super(AlertBox, self).__init__(parent)
+
+        self.parent = parent
+        self.table = QtGui.QTableWidget(0, 5, self)
+        self.table.setHorizontalHeaderLabels(["Time", "Rule", "Region",
+                                              "Value", "State"])
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        self.info = QtGui.QLabel("No alert rules configured", self)
+        self.layout.addWidget(self.table, 0, 0)
+        self.layout.addWidget(self.info, 1, 0)
+        self.setSizePolicy(QtGui.QSizePolicy.Expanding,
+                           QtGui.QSizePolicy.Expanding)
+
+    def clear(self):
+        self.table.setRowCount(0)
+
+    def add_alerts(self, alerts):
+        """ Append `alerts`, raised ones highlighted
+        """
+        self.table.setUpdatesEnabled(False)
+        for alert in alerts:
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            texts = [str(alert.time).replace("T", " ")[:16], alert.rule,
+                     alert.region, "{0:.1f}".format(alert.value),
+                     alert.state]
+            for col, text in enumerate(texts):
+                item = QtGui.QTableWidgetItem(text)
+                if alert.state == "raised":
+                    item.setForeground(QtCore.Qt.red)
+                self.table.setItem(row, col, item)
+        self.table.setUpdatesEnabled(True)
+        self.table.scrollToBottom()
+
+    def set_status(self, time, active):
+        self.info.setText("{0} active, evaluated up to {1}".format(
+            active, str(time).replace("T", " ")[:16]))
 
 
 class SourceBox(DockBox):
@@ -318,11 +735,29 @@ class SourceBox(DockBox):
         palette.setColor(QtGui.QPalette.Foreground, QtCore.Qt.darkGreen)
         self.dirLabel.setPalette(palette)
 
+        # product of the main view, the other stack members go to panels
+        self.viewCombo = QtGui.QComboBox()
+        self.layout.addWidget(LongLabel("Main view"), 2, 0, 1, 2)
+        self.layout.addWidget(self.viewCombo, 2, 2, 1, 5)
+        self.viewCombo.activated.connect(self.view_selected)
+
         self.props.props_changed.connect(self.update_label)
 
     def update_label(self):
         self.dirLabel.setText(self.props.dir)
         self.dirname = str(self.props.dir)
+        members = self.props.stack.members
+        self.views = list(members)
+        self.viewCombo.clear()
+        for name in self.views:
+            self.viewCombo.addItem("{0} ({1})".format(name,
+                                                      members[name].product))
+        self.viewCombo.setCurrentIndex(self.views.index(self.props.reference))
+
+    def view_selected(self, index):
+        name = self.views[index]
+        if name != self.props.reference:
+            self.props.set_reference(name)
 
 
 class MediaBox(DockBox):
@@ -341,13 +776,28 @@ class MediaBox(DockBox):
         self.time_slider.setSingleStep(1)
         self.time_slider.valueChanged.connect(self.time_slider_moved)
         self.current_date = QtGui.QLabel("1900-01-01")
-        self.current_time = QtGui.QComboBox()
+
+        # coarse navigation (year -> day) within archive sources
+        self.days = []
+        self.year_select = QtGui.QComboBox()
+        self.year_select.activated.connect(self.year_changed)
+        self.day_select = QtGui.QComboBox()
+        self.day_select.activated.connect(self.day_changed)
+
+        # one time model shared by all time combo boxes
+        self.time_model = TimeListModel(parent=self)
+        self.current_time = create_time_combo(self.time_model)
         self.current_time.currentIndexChanged.connect(self.current_time_changed)
 
+        # type-ahead jump to datetime
+        self.jump_time = QtGui.QLineEdit()
+        self.jump_time.setPlaceholderText("YYYY-MM-DD HH:MM")
+        self.jump_time.returnPressed.connect(self.jump_to_time)
+
         # Range Slider
         self.range = TimeSlider(QtCore.Qt.Horizontal)
-        self.range_start = QtGui.QComboBox()
-        self.range_end = QtGui.QComboBox()
+        self.range_start = create_time_combo(self.time_model)
+        self.range_end = create_time_combo(self.time_model)
         self.range.signal_range_moved.connect(self.range_update)
         self.range_start.currentIndexChanged.connect(self.range_changed)
         self.range_end.currentIndexChanged.connect(self.range_changed)
@@ -372,6 +822,8 @@ class MediaBox(DockBox):
         self.layout.addWidget(self.hline0, 0, 0, 1, 5)
         self.layout.addWidget(QtGui.QLabel("Date"), 1, 0, 1, 1)
         self.layout.addWidget(self.current_date, 1, 1, 1, 2)
+        self.layout.addWidget(self.year_select, 1, 3, 1, 1)
+        self.layout.addWidget(self.day_select, 1, 4, 1, 1)
         self.layout.addWidget(self.playPauseButton, 2, 1)
         self.layout.addWidget(self.rewButton, 2, 2)
         self.layout.addWidget(self.fwdButton, 2, 3)
@@ -383,6 +835,8 @@ class MediaBox(DockBox):
         self.layout.addWidget(self.range_start, 4, 1, 1, 1)
         self.layout.addWidget(self.current_time, 4, 2, 1, 1)
         self.layout.addWidget(self.range_end, 4, 3, 1, 1)
+        self.layout.addWidget(QtGui.QLabel("Jump"), 4, 0, 1, 1)
+        self.layout.addWidget(self.jump_time, 4, 4, 1, 1)
 
         self.layout.addWidget(QtGui.QLabel("Time"), 5, 0, 1, 1)
         self.layout.addWidget(self.time_slider, 5, 1, 1, 4)
@@ -424,9 +878,28 @@ class MediaBox(DockBox):
 
     def time_slider_moved(self, position):
         self.props.actualFrame = position
+        self.current_time.blockSignals(True)
         self.current_time.setCurrentIndex(position)
+        self.current_time.blockSignals(False)
+        self.update_date(position)
         self.signal_time_slider_changed.emit(position)
 
+    def update_date(self, position):
+        if 0 <= position < self.time_model.rowCount():
+            self.current_date.setText(
+                self.time_model.label(position, "%Y-%m-%d"))
+
+    def jump_to_time(self):
+        if not self.time_model.rowCount():
+            return
+        try:
+            time = self.time_model.parse(self.jump_time.text(),
+                                         self.time_slider.value())
+        except ValueError:
+            print("Could not parse time: {0}".format(self.jump_time.text()))
+            return
+        self.time_slider.setValue(self.time_model.index_of(time))
+
     def seekforward(self):
         if self.time_slider.value() >= self.range.high():
             self.time_slider.setValue(self.range.low())
@@ -451,24 +924,52 @@ class MediaBox(DockBox):
         self.signal_playpause_changed.emit()
 
     def update_props(self):
-        self.range_start.clear()
-        self.range_start.addItems(
-            [item['datetime'].strftime("%H:%M") for item in self.props.cube])
-        self.range_end.clear()
-        self.range_end.addItems(
-            [item['datetime'].strftime("%H:%M") for item in self.props.cube])
-        self.current_time.clear()
-        self.current_time.addItems(
-            [item['datetime'].strftime("%H:%M") for item in self.props.cube])
+        combos = [self.range_start, self.range_end, self.current_time]
+        for combo in combos:
+            combo.blockSignals(True)
+        self.time_model.set_times(self.props.times)
+        for combo in combos:
+            combo.blockSignals(False)
+        self.current_time.setCurrentIndex(0)
         self.time_slider.setMaximum(self.props.frames)
         self.time_slider.setValue(0)
-        self.current_date.setText(self.props.cube[0]['datetime'].strftime("%Y-%M-%d"))
+        self.update_date(0)
+        self.update_navigator()
         self.range.setMinimum(0)
         self.range.setMaximum(self.props.frames)
         self.range.setLow(0)
         self.range.setHigh(self.props.frames)
         self.range_update(self.range.low(), self.range.high())
 
+    def update_navigator(self):
+        source = self.props.source
+        visible = isinstance(source, archive.ArchiveSource)
+        self.year_select.setVisible(visible)
+        self.day_select.setVisible(visible)
+        if not visible or self.props.window[0] is None:
+            return
+        day = np.datetime64(self.props.window[0], 'D').astype(date)
+        years = source.years()
+        self.year_select.clear()
+        self.year_select.addItems([str(year) for year in years])
+        if day.year in years:
+            self.year_select.setCurrentIndex(years.index(day.year))
+        self.fill_days(day.year)
+        if day in self.days:
+            self.day_select.setCurrentIndex(self.days.index(day))
+
+    def fill_days(self, year):
+        self.days = self.props.source.days(year)
+        self.day_select.clear()
+        self.day_select.addItems([day.strftime("%m-%d") for day in self.days])
+
+    def year_changed(self, index):
+        self.fill_days(int(self.year_select.itemText(index)))
+
+    def day_changed(self, index):
+        day = np.datetime64(self.days[index], 'D')
+        self.props.set_window(day, day + 1)
+
     def range_update(self, low, high):
         self.range_start.setCurrentIndex(low)
         self.range_end.setCurrentIndex(high)
@@ -482,6 +983,7 @@ class MediaBox(DockBox):
         self.time_slider.setValue(value)
         self.time_slider.blockSignals(False)
         self.props.actualFrame = value
+        self.update_date(value)
         self.signal_time_slider_changed.emit(value)
 
 
@@ -496,6 +998,11 @@ class Properties(QtCore.QObject):
         super(Properties, self).__init__(parent)
 
         self.parent = parent
+        self.window = (None, None)
+        self.update_props()
+
+    def set_window(self, start, end):
+        self.window = (start, end)
         self.update_props()
 
     def set_datadir(self):
@@ -527,27 +1034,88 @@ class Properties(QtCore.QObject):
     def update_props(self):
         self.dir = conf["dirs"]["data"]
         self.product = conf["source"]["product"]
-        self.parent.iwidget.set_canvas(self.product)
         self.clim = (conf.get("vis", "cmin"), conf.get("vis", "cmax"))
         self.parent.iwidget.set_clim(self.clim)
         self.loc = conf.get("source", "loc")
-        self.filelist = glob.glob(os.path.join(self.dir, "raa0*{0}*".format(self.loc)))
+        self.source = self.create_source()
+        self.stack = self.create_stack()
+        self.stack.index(*self.window)
+        self.set_reference("main")
+
+    def set_reference(self, name):
+        """ Show stack member `name` in the main view, the others in panels
+
+        Switching products reuses the index of the stack.
+        """
+        self.stack.set_reference(name)
+        self.reference = name
+        self.product = self.stack.members[name].product
+        self.parent.iwidget.set_canvas(self.product)
+        member = self.stack.members[name]
+        self.dataset = dataset.Dataset(member.files, member.times,
+                                       self.product,
+                                       frames=self.parent.frames,
+                                       pipeline=self.parent.pipeline,
+                                       read=self.parent.read_frame)
+        self.filelist, self.times = self.dataset.files, self.stack.times
         self.frames = len(self.filelist) - 1
         self.actualFrame = 0
         self.cube = self.create_data_cube()
+        self.panels = [m for n, m in self.stack.members.items() if n != name]
+        self.parent.rwidget.set_panels([p.name for p in self.panels])
         self.signal_props_changed.emit(0)
 
+    def create_stack(self):
+        """ The main source and one member per [panel...] config section
+
+        Panel options are `product`, `dir` (defaults to the data
+        directory), `offset` and `tolerance` in minutes and `join`
+        (previous, nearest or exact).
+        """
+        members = [archive.PanelSource("main", self.source, self.product)]
+        for section in conf.sections():
+            if not section.startswith("panel"):
+                continue
+            opts = conf[section]
+            product = opts.get("product", self.product)
+            if product == 'DX' or self.product == 'DX':
+                continue
+            path = opts.get("dir", "")
+            if not path and product == self.product:
+                source = self.source
+            else:
+                # other products of the archive hierarchy by file pattern
+                source = dataset.create_source(
+                    path or self.dir, "raa0*-{0}_*".format(product.lower()),
+                    "" if path else conf["dirs"].get("archive", ""))
+            tolerance = opts.get("tolerance", "")
+            members.append(archive.PanelSource(
+                section, source, product, opts.getint("offset", 0),
+                opts.get("join", "previous"),
+                int(tolerance) if tolerance else None))
+        return archive.ProductStack(members)
+
+    def create_source(self):
+        source = dataset.create_source(self.dir,
+                                       "raa0*{0}*".format(self.loc),
+                                       conf["dirs"].get("archive", ""),
+                                       getattr(self, 'source', None))
+        # only index a single day of archives, the most recent one, by
+        # default
+        if self.window[0] is None:
+            self.window = dataset.default_window(source)
+        return source
+
     def create_data_cube(self):
         '''
             First attempt to create some time_slider layer
 
             Here we just add the metadata dictionaries
         '''
-        cube = []
-        for name in self.filelist:
-            if self.product == 'DX':
-                _, meta = utils.read_dx(name)
-            else:
-                _, meta = utils.read_radolan(name)
-            cube.append(meta)
-        return cube
+        # the data is read anyway, bin it while we are at it
+        self.hists = histogram.FrameHistograms(
+            histogram.product_edges(self.product,
+                                    conf.getint("hist", "bins"),
+                                    conf.get("decode", "unit")),
+            len(self.filelist))
+        return self.dataset.cube(self.hists.set)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Reprojection of RADOLAN frames onto WGS84 or Web-Mercator rasters
+
+The source indices and weights of every target pixel are computed once
+per target (CRS, resolution, extent, method) and stored on disk,
+reprojecting a frame is a gather and a weighted sum.
+
+    target = get_reprojection("mercator", res=1000.)
+    raster = target.reproject(frame)
+
+Target rasters are north up, row 0 is the northern edge.
+"""
+
+import os
+import hashlib
+import threading
+
+import numpy as np
+
+from wradvis import utils
+from wradvis import archive
+from wradvis.config import conf
+
+
+# WGS84 ellipsoid radius used by Web-Mercator (EPSG:3857)
+EARTH_RADIUS = 6378137.
+
+CRS = ("wgs84", "mercator")
+METHODS = ("nearest", "bilinear")
+
+
+def lonlat_to_mercator(lon, lat):
+    x = EARTH_RADIUS * np.radians(lon)
+    y = EARTH_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, y
+
+
+def mercator_to_lonlat(x, y):
+    lon = np.degrees(x / EARTH_RADIUS)
+    lat = np.degrees(2 * np.arctan(np.exp(y / EARTH_RADIUS)) - np.pi / 2)
+    return lon, lat
+
+
+def tile_extent(zoom, x, y):
+    """ Web-Mercator extent (xmin, ymin, xmax, ymax) of XYZ tile x, y
+    """
+    half = np.pi * EARTH_RADIUS
+    size = 2 * half / 2 ** zoom
+    xmin, ymax = x * size - half, half - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def grid_extent(crs, shape=(900, 900)):
+    """ Bounding box (xmin, ymin, xmax, ymax) of the RADOLAN grid in `crs`
+    """
+    grid = utils.get_radolan_grid()
+    h, w = shape
+    # pixel corners along the outline of the grid
+    x0, y0 = grid[0, 0]
+    xs = x0 + np.arange(w + 1)
+    ys = y0 + np.arange(h + 1)
+    outline = np.concatenate((
+        np.column_stack((xs, np.full(w + 1, ys[0]))),
+        np.column_stack((xs, np.full(w + 1, ys[-1]))),
+        np.column_stack((np.full(h + 1, xs[0]), ys)),
+        np.column_stack((np.full(h + 1, xs[-1]), ys))))
+    ll = utils.radolan_to_wgs84(outline)
+    x, y = ll[:, 0], ll[:, 1]
+    if crs == "mercator":
+        x, y = lonlat_to_mercator(x, y)
+    return x.min(), y.min(), x.max(), y.max()
+
+
+class Reprojection(object):
+    """
+    Gather indices and weights from the RADOLAN grid onto a target raster
+
+    Parameters
+    ----------
+    crs : "wgs84" (lon/lat degrees) or "mercator" (EPSG:3857, metres)
+    res : target pixel size in units of the crs
+    extent : (xmin, ymin, xmax, ymax), defaults to the whole grid
+    method : "nearest" or "bilinear"
+    cachedir : directory of the stored tables, "" keeps them in memory
+    """
+    def __init__(self, crs="mercator", res=1000., extent=None,
+                 method="bilinear", shape=(900, 900), cachedir=""):
+        if crs not in CRS:
+            raise ValueError("unknown crs {0!r}".format(crs))
+        if method not in METHODS:
+            raise ValueError("unknown method {0!r}".format(method))
+        self.crs = crs
+        self.res = float(res)
+        self.method = method
+        self.grid_shape = shape
+        if extent is None:
+            extent = grid_extent(crs, shape)
+        xmin, ymin, xmax, ymax = [float(v) for v in extent]
+        # rounded, extents of whole pixels must not gain one more
+        self.shape = (int(np.ceil(round((ymax - ymin) / self.res, 6))),
+                      int(np.ceil(round((xmax - xmin) / self.res, 6))))
+        self.extent = (xmin, ymax - self.shape[0] * self.res,
+                       xmin + self.shape[1] * self.res, ymax)
+
+        path = None
+        if cachedir:
+            path = os.path.join(cachedir,
+                                "reproject-{0}.npz".format(self.key))
+        tables = self._load(path) if path is not None else None
+        if tables is None:
+            tables = self._compute()
+            if path is not None:
+                self._store(path, tables)
+        target, index, self.weight = tables
+        # stored compact, np.take would convert int32 indices on every call
+        self.target = target.astype(np.intp)
+        self.index = index.astype(np.intp)
+        # gather buffer, one per thread as the tile server shares targets
+        self._local = threading.local()
+
+    @property
+    def key(self):
+        """ Identifies the tables, target and source grid
+        """
+        origin = utils.get_radolan_origin()
+        text = "{0}|{1!r}|{2!r}|{3}|{4}|{5!r}".format(
+            self.crs, self.res, self.extent, self.method, self.grid_shape,
+            tuple(float(v) for v in origin))
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    @property
+    def transform(self):
+        """ GDAL style geotransform of the target raster
+        """
+        xmin, _, _, ymax = self.extent
+        return (xmin, self.res, 0., ymax, 0., -self.res)
+
+    def lonlat(self):
+        """ lon, lat of the target pixel centers, (rows, cols) each
+        """
+        xmin, _, _, ymax = self.extent
+        x = xmin + (np.arange(self.shape[1]) + 0.5) * self.res
+        y = ymax - (np.arange(self.shape[0]) + 0.5) * self.res
+        x, y = np.meshgrid(x, y)
+        if self.crs == "mercator":
+            return mercator_to_lonlat(x, y)
+        return x, y
+
+    def _compute(self):
+        lon, lat = self.lonlat()
+        xy = utils.wgs84_to_radolan(np.dstack((lon, lat)))
+        origin = utils.get_radolan_origin()
+        h, w = self.grid_shape
+        # fractional grid position of the target pixel centers, pixel
+        # (row, col) covers [col, col + 1) x [row, row + 1)
+        x = (xy[..., 0] - origin[0]).ravel()
+        y = (xy[..., 1] - origin[1]).ravel()
+        valid = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+        target = np.flatnonzero(valid).astype(np.int32)
+        x, y = x[valid], y[valid]
+        if self.method == "nearest":
+            col = np.floor(x).astype(np.intp)
+            row = np.floor(y).astype(np.intp)
+            index = (row * w + col).astype(np.int32)[:, None]
+            weight = np.ones(index.shape, dtype=np.float32)
+            return target, index, weight
+        # bilinear between the surrounding pixel centers, clamped to the
+        # outer centers as the edge pixels extend half a pixel beyond them
+        x = np.clip(x - 0.5, 0, w - 1)
+        y = np.clip(y - 0.5, 0, h - 1)
+        x0 = np.minimum(np.floor(x).astype(np.intp), w - 2)
+        y0 = np.minimum(np.floor(y).astype(np.intp), h - 2)
+        fx, fy = x - x0, y - y0
+        base = y0 * w + x0
+        index = np.column_stack((base, base + 1,
+                                 base + w, base + w + 1)).astype(np.int32)
+        weight = np.column_stack(((1 - fx) * (1 - fy), fx * (1 - fy),
+                                  (1 - fx) * fy, fx * fy)).astype(np.float32)
+        return target, index, weight
+
+    def _load(self, path):
+        try:
+            with np.load(path) as tables:
+                return tables["target"], tables["index"], tables["weight"]
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+
+    def _store(self, path, tables):
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                pass
+        target, index, weight = tables
+        tmp = "{0}.{1}.tmp".format(path, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, target=target, index=index, weight=weight)
+            os.rename(tmp, path)
+        except (IOError, OSError) as e:
+            print("Could not store reprojection tables: {0}".format(e))
+
+    def nbytes(self):
+        return self.target.nbytes + self.index.nbytes + self.weight.nbytes
+
+    def reproject(self, data, out=None):
+        """ `data` on the target raster, NaN outside the grid
+
+        `out` is an optional float32 buffer of `shape`.
+        """
+        if out is None:
+            out = np.empty(self.shape, dtype=np.float32)
+        gather = getattr(self._local, "gather", None)
+        if gather is None:
+            gather = self._local.gather = np.empty(self.index.shape,
+                                                   dtype=np.float32)
+        np.take(np.asarray(data).reshape(-1), self.index, out=gather,
+                mode='clip')
+        out.fill(np.nan)
+        if self.method == "nearest":
+            values = gather[:, 0]
+        else:
+            values = np.einsum('tk,tk->t', gather, self.weight)
+        out.reshape(-1)[self.target] = values
+        return out
+
+    def world_file(self):
+        """ ESRI world file contents of the target raster
+        """
+        xmin, _, _, ymax = self.extent
+        return "\n".join("{0!r}".format(v) for v in (
+            self.res, 0., 0., -self.res,
+            xmin + self.res / 2, ymax - self.res / 2)) + "\n"
+
+
+_reprojections = {}
+
+
+def get_reprojection(crs="mercator", res=1000., extent=None, method=None):
+    """ Return the (cached) Reprojection, tables stored in conf["reproject"]
+    """
+    opts = conf["reproject"]
+    method = method or opts.get("method")
+    key = (crs, float(res), None if extent is None else tuple(extent),
+           method)
+    if key not in _reprojections:
+        _reprojections[key] = Reprojection(crs, res, extent, method,
+                                           cachedir=opts.get("cache", ""))
+    return _reprojections[key]
+
+
+def export(files, product, target, outdir):
+    """ Reproject `files` into `outdir` as .npy rasters and a world file
+    """
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    with open(os.path.join(outdir, "{0}.wld".format(target.crs)), "w") as f:
+        f.write(target.world_file())
+    out = np.empty(target.shape, dtype=np.float32)
+    names = []
+    for fname in files:
+        data = utils.read_frame(fname, product)
+        name = os.path.basename(archive.split_member(fname)[-1] or fname)
+        name = os.path.join(outdir, name.split(".")[0] + ".npy")
+        np.save(name, target.reproject(data, out))
+        names.append(name)
+    return names
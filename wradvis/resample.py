@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Precomputed gather indices for resampling radar arrays
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from wradvis import reproject
+
+
+def block_max(data, factor):
+    """ Downsample `data` by the maximum of `factor` x `factor` blocks
+
+    NaN is ignored, edges not filling a whole block are cropped.
+    """
+    h, w = data.shape[0] // factor, data.shape[1] // factor
+    blocks = np.asarray(data)[:h * factor, :w * factor]
+    blocks = blocks.reshape(h, factor, w, factor)
+    return np.fmax.reduce(np.fmax.reduce(blocks, axis=3), axis=1)
+
+
+class PolarLookup(object):
+    """
+    Gather index from a polar (ray, bin) array onto a Cartesian raster
+
+    The raster is centered on the radar and covers the full range, raster
+    row 0 is the southern edge. Azimuths count clockwise from north.
+
+    Parameters
+    ----------
+    nrays : number of rays, starting at north
+    nbins : number of range bins per ray
+    res : raster pixel size in units of range bins
+    """
+    def __init__(self, nrays=360, nbins=128, res=1.):
+        self.nrays = nrays
+        self.nbins = nbins
+        self.res = res
+        n = int(np.ceil(2 * nbins / res))
+        self.shape = (n, n)
+
+        c = (np.arange(n) + 0.5) * res - nbins
+        x, y = np.meshgrid(c, c)
+        az = np.degrees(np.arctan2(x, y)) % 360
+        ray = (az * nrays / 360.).astype(np.intp) % nrays
+        rbin = np.hypot(x, y).astype(np.intp)
+        self.valid = rbin < nbins
+        self.index = np.where(self.valid, ray * nbins + rbin, 0)
+
+    def resample(self, data, out=None):
+        """ Gather `data` (nrays, nbins) onto the raster
+        """
+        data = np.asarray(data)
+        if out is None:
+            out = np.empty(self.shape, dtype=np.result_type(data, np.float32))
+        np.take(data.ravel(), self.index, out=out)
+        out[~self.valid] = np.nan
+        return out
+
+    def pick(self, col, row):
+        """ Return (ray, bin) of raster pixel (col, row) or None
+        """
+        col, row = int(np.floor(col)), int(np.floor(row))
+        if not (0 <= row < self.shape[0] and 0 <= col < self.shape[1]):
+            return None
+        if not self.valid[row, col]:
+            return None
+        return divmod(int(self.index[row, col]), self.nbins)
+
+
+_polar_lookups = {}
+
+
+def get_polar_lookup(nrays=360, nbins=128, res=1.):
+    """ Return the (cached) PolarLookup of this geometry and resolution
+    """
+    key = (nrays, nbins, float(res))
+    if key not in _polar_lookups:
+        _polar_lookups[key] = PolarLookup(*key)
+    return _polar_lookups[key]
+
+
+class TileLookup(object):
+    """
+    Nearest neighbour Reprojections of the RADOLAN grid into XYZ tiles
+
+    One lookup serves one zoom level. Every tile is a Web-Mercator
+    Reprojection, computed on first use, the most recent `maxtiles` of
+    them are kept. Lookups are shared by the threads of the tile server,
+    the tile cache is guarded by a lock.
+    """
+    def __init__(self, zoom, size=256, shape=(900, 900), maxtiles=512):
+        self.zoom = zoom
+        self.size = size
+        self.shape = shape
+        self.maxtiles = maxtiles
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tile_index(self, x, y):
+        """ Return the Reprojection of tile x, y, None outside the grid
+        """
+        key = (x, y)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles[key] = self._tiles.pop(key)
+                return self._tiles[key]
+        extent = reproject.tile_extent(self.zoom, x, y)
+        entry = reproject.Reprojection(
+            "mercator", (extent[2] - extent[0]) / self.size, extent,
+            "nearest", self.shape)
+        if not len(entry.target):
+            entry = None
+        with self._lock:
+            self._tiles.pop(key, None)
+            while len(self._tiles) >= self.maxtiles:
+                self._tiles.popitem(last=False)
+            self._tiles[key] = entry
+        return entry
+
+    def resample(self, data, x, y):
+        """ Gather `data` into tile x, y, NaN outside the grid
+        """
+        return self.gather(data, self.tile_index(x, y))
+
+    def gather(self, data, entry):
+        """ Gather `data` through a tile_index `entry`
+        """
+        if entry is None:
+            return np.full((self.size, self.size), np.nan, dtype=np.float32)
+        return entry.reproject(data)
+
+
+_tile_lookups = {}
+
+
+def get_tile_lookup(zoom, size=256):
+    key = (zoom, size)
+    if key not in _tile_lookups:
+        _tile_lookups[key] = TileLookup(zoom, size)
+    return _tile_lookups[key]
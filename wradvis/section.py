@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Cross sections along a polyline and their distance-time (Hovmoeller)
+diagram
+"""
+
+import numpy as np
+
+from wradvis.cache import LRUCache
+
+
+class LineSampler(object):
+    """
+    Bilinear samples along a polyline, indices and weights precomputed
+
+    `vertices` are (x, y) grid coordinates as shown on the canvas, pixel
+    (row, col) covers [col, col + 1) x [row, row + 1). Samples are
+    `spacing` pixels apart, samples outside the grid are NaN.
+    """
+    def __init__(self, vertices, shape=(900, 900), spacing=1.):
+        vertices = np.asarray(vertices, dtype=np.float64)
+        self.shape = shape
+        seglen = np.hypot(*np.diff(vertices, axis=0).T)
+        along = np.concatenate(([0.], np.cumsum(seglen)))
+        self.distance = np.arange(0., along[-1] + 1e-9, spacing)
+        x = np.interp(self.distance, along, vertices[:, 0]) - 0.5
+        y = np.interp(self.distance, along, vertices[:, 1]) - 0.5
+
+        h, w = shape
+        self.inside = (x >= -0.5) & (x < w - 0.5) & (y >= -0.5) & (y < h - 0.5)
+        # clamp to the outer pixel centers, the edge pixels extend half
+        # a pixel beyond them
+        x = np.clip(x, 0, w - 1)
+        y = np.clip(y, 0, h - 1)
+        x0 = np.minimum(np.floor(x).astype(np.intp), w - 2)
+        y0 = np.minimum(np.floor(y).astype(np.intp), h - 2)
+        fx, fy = x - x0, y - y0
+        base = y0 * w + x0
+        self.index = np.column_stack((base, base + 1,
+                                      base + w, base + w + 1)).astype(np.int32)
+        self.weight = np.column_stack(((1 - fx) * (1 - fy), fx * (1 - fy),
+                                       (1 - fx) * fy, fx * fy)
+                                      ).astype(np.float32)
+        self._gather = None
+
+    def __len__(self):
+        return len(self.distance)
+
+    def sample(self, frames):
+        """ Values along the line of a sequence of frames, (frames, samples)
+        """
+        n = len(frames)
+        if self._gather is None or len(self._gather) < n:
+            self._gather = np.empty((n,) + self.index.shape, dtype=np.float32)
+        gather = self._gather[:n]
+        for i, frame in enumerate(frames):
+            np.take(np.asarray(frame).reshape(-1), self.index, out=gather[i],
+                    mode='clip')
+        values = np.einsum('fsk,sk->fs', gather, self.weight)
+        values[:, ~self.inside] = np.nan
+        return values
+
+
+class Hovmoeller(object):
+    """
+    Distance-time diagram of a LineSampler, one row per frame key
+
+    Keys identify a frame as sampled, eg. file, product and processing.
+    Rows are kept in the LRUCache `rows`, at most `maxrows` if not
+    given, moving the time range only samples the frames not seen
+    before.
+    """
+    def __init__(self, sampler, rows=None, maxrows=4096):
+        self.sampler = sampler
+        self.rows = rows if rows is not None else LRUCache(maxrows)
+
+    def missing(self, keys):
+        return [k for k in keys if k not in self.rows]
+
+    def update(self, keys, frames):
+        """ Store the rows of `keys`, their data are `frames`
+        """
+        for key, row in zip(keys, self.sampler.sample(frames)):
+            self.rows.put(key, row)
+
+    def image(self, keys):
+        """ (len(keys), samples) array, NaN rows for frames not sampled
+        """
+        out = np.full((len(keys), len(self.sampler)), np.nan,
+                      dtype=np.float32)
+        for i, key in enumerate(keys):
+            row = self.rows.get(key)
+            if row is not None:
+                out[i] = row
+        return out
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Per-pixel statistics over long time ranges
+
+Frames are streamed in row bands and chunks of time, each (band, chunk)
+is reduced by a worker process into a mergeable PixelStats. Percentiles
+come from per-pixel histograms, so partial results merge exactly and
+memory only depends on the band size, never on the number of frames.
+
+Every file is decoded once. When the accumulators of a whole frame do
+not fit the budget, the decoded frames are spooled to a temporary file
+first and the bands read their rows from there.
+"""
+
+import os
+import shutil
+import tempfile
+import multiprocessing
+from functools import partial
+
+import numpy as np
+
+from wradvis import utils
+from wradvis.histogram import product_edges
+
+
+class PixelStats(object):
+    """
+    Mergeable per-pixel moments, exceedance counts and histograms
+
+    Values outside [lo, hi) are counted in the first/last histogram bin.
+    Percentiles are resolved to one bin width, within a bin values are
+    assumed to be evenly spread.
+    """
+    def __init__(self, shape, bins=256, lo=0., hi=100., threshold=1.):
+        self.shape = shape
+        self.bins = bins
+        self.lo = float(lo)
+        self.hi = float(hi)
+        self.threshold = float(threshold)
+        self.count = np.zeros(shape, dtype=np.uint32)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.exceed = np.zeros(shape, dtype=np.uint32)
+        self.hist = np.zeros(shape + (bins,), dtype=np.uint32)
+        self._pixel = np.arange(self.count.size) * bins
+
+    @staticmethod
+    def nbytes_per_pixel(bins):
+        return 4 + 8 + 8 + 4 + 4 * bins
+
+    def update(self, frame):
+        valid = np.isfinite(frame)
+        frame = np.where(valid, frame, 0.)
+        # Welford's online mean and sum of squared deviations
+        self.count += valid
+        delta = frame - self.mean
+        self.mean += np.where(valid, delta / np.maximum(self.count, 1), 0.)
+        self.m2 += np.where(valid, delta * (frame - self.mean), 0.)
+        self.exceed += valid & (frame > self.threshold)
+        # every pixel falls into exactly one bin, no duplicate indices
+        b = ((frame - self.lo) * (self.bins / (self.hi - self.lo)))
+        b = np.clip(b, 0, self.bins - 1).astype(np.intp)
+        idx = (self._pixel + b.ravel())[valid.ravel()]
+        self.hist.reshape(-1)[idx] += 1
+
+    def merge(self, other):
+        """ Combine with the statistics of another set of frames
+        """
+        n = self.count.astype(np.float64) + other.count
+        n1 = np.maximum(n, 1)
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n1
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / n1
+        self.count += other.count
+        self.exceed += other.exceed
+        self.hist += other.hist
+        return self
+
+    def percentile(self, q):
+        cum = np.cumsum(self.hist, axis=-1)
+        # rank of the percentile, as numpy's linear method
+        target = 1 + (q / 100.) * (self.count.astype(np.float64) - 1)
+        b = np.argmax(cum >= target[..., np.newaxis], axis=-1)
+        below = np.where(b > 0,
+                         np.take_along_axis(
+                             cum, np.maximum(b - 1, 0)[..., np.newaxis],
+                             axis=-1)[..., 0],
+                         0)
+        inbin = np.take_along_axis(self.hist, b[..., np.newaxis],
+                                   axis=-1)[..., 0]
+        frac = (target - below) / np.maximum(inbin, 1)
+        width = (self.hi - self.lo) / self.bins
+        return self.lo + (b + frac) * width
+
+    def result(self, percentiles=(95, 99)):
+        empty = self.count == 0
+        count = np.maximum(self.count, 1)
+        res = {'count': self.count,
+               'mean': self.mean,
+               'std': np.sqrt(self.m2 / count),
+               'exceedance': self.exceed / count.astype(np.float64)}
+        for q in percentiles:
+            res['p{0}'.format(q)] = self.percentile(q)
+        for key, value in res.items():
+            if key != 'count':
+                value[empty] = np.nan
+        return res
+
+
+def _read_rows(fname, rows, read):
+    return read(fname)[rows[0]:rows[1]]
+
+
+def _read_spooled(index, rows, path, shape):
+    spool = np.memmap(path, dtype=np.float32, mode='r', shape=shape)
+    return spool[index, rows[0]:rows[1]]
+
+
+def _spool(task, read, path, shape):
+    index, fname = task
+    spool = np.memmap(path, dtype=np.float32, mode='r+', shape=shape)
+    spool[index] = read(fname)
+    spool.flush()
+    return index
+
+
+def _reduce(task, reader, params):
+    rows, items = task
+    stats = None
+    for item in items:
+        data = np.asarray(reader(item, rows), dtype=np.float64)
+        if stats is None:
+            stats = PixelStats(data.shape, **params)
+        stats.update(data)
+    return rows, stats
+
+
+def reduce_range(files, product, shape=(900, 900), bins=256, lo=None,
+                 hi=None, threshold=1., percentiles=(95, 99), memory=256,
+                 workers=None, callback=None, tmpdir=None):
+    """ Compute per-pixel statistics over `files` in bounded memory
+
+    Parameters
+    ----------
+    files : file names of the time range
+    product : product name, selects the reader
+    shape : frame shape
+    bins, lo, hi : histogram used for the percentiles, lo and hi default
+        to the value range of the product
+    threshold : exceedance threshold
+    memory : approximate budget for all accumulators in MB
+    workers : number of processes, defaults to the number of cores
+    callback : called with the fraction done after every task
+    tmpdir : directory of the spooled frames, the system default if None
+
+    Returns
+    -------
+    dict of arrays, keys count, mean, std, exceedance, p<q>
+    """
+    if not len(files):
+        return {}
+    if lo is None or hi is None:
+        edges = product_edges(product, bins)
+        lo = edges[0] if lo is None else lo
+        hi = edges[-1] if hi is None else hi
+    workers = workers or multiprocessing.cpu_count()
+    # rows per band so that all workers' accumulators fit into the budget
+    per_row = shape[1] * PixelStats.nbytes_per_pixel(bins)
+    band = int(np.clip(memory * 2 ** 20 // (per_row * workers), 1, shape[0]))
+    bands = [(r, min(r + band, shape[0])) for r in range(0, shape[0], band)]
+    read = partial(utils.read_frame, product=product)
+    spool = None
+    if len(bands) > 1:
+        spool = tempfile.mkdtemp(prefix="wradvis-stats-", dir=tmpdir)
+        path = os.path.join(spool, "frames.dat")
+        size = (len(files),) + tuple(shape)
+        np.memmap(path, dtype=np.float32, mode='w+', shape=size).flush()
+        items = list(range(len(files)))
+        reader = partial(_read_spooled, path=path, shape=size)
+    else:
+        items = list(files)
+        reader = partial(_read_rows, read=read)
+    # split time as well, when there are fewer bands than workers
+    nchunks = max(1, min(len(files), workers // len(bands)))
+    chunks = [list(c) for c in np.array_split(items, nchunks)]
+    tasks = [(rows, chunk) for rows in bands for chunk in chunks]
+    ntasks = len(tasks) + (len(files) if spool else 0)
+
+    params = dict(bins=bins, lo=lo, hi=hi, threshold=threshold)
+    func = partial(_reduce, reader=reader, params=params)
+    out = {}
+    partial_stats = {}
+    pending = dict((rows, nchunks) for rows in bands)
+    done = 0
+    pool = multiprocessing.Pool(workers)
+    try:
+        if spool is not None:
+            # decode every file once, the bands read from the spool
+            func_spool = partial(_spool, read=read, path=path, shape=size)
+            for _ in pool.imap_unordered(func_spool, enumerate(files)):
+                done += 1
+                if callback is not None:
+                    callback(float(done) / ntasks)
+        for rows, stats in pool.imap_unordered(func, tasks):
+            if rows in partial_stats:
+                partial_stats[rows].merge(stats)
+            else:
+                partial_stats[rows] = stats
+            pending[rows] -= 1
+            if not pending[rows]:
+                # band complete, keep only its results
+                res = partial_stats.pop(rows).result(percentiles)
+                for key, value in res.items():
+                    if key not in out:
+                        out[key] = np.empty(shape, dtype=value.dtype)
+                    out[key][rows[0]:rows[1]] = value
+            done += 1
+            if callback is not None:
+                callback(float(done) / ntasks)
+    finally:
+        pool.close()
+        pool.join()
+        if spool is not None:
+            shutil.rmtree(spool, ignore_errors=True)
+    return out
+
+
+def save_stats(fname, stats):
+    np.savez_compressed(fname, **stats)
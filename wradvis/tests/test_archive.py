@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+import os
+import io
+import gzip
+import random
+import shutil
+import tarfile
+import hashlib
+import tempfile
+import unittest
+import multiprocessing
+
+import numpy as np
+
+from wradvis import archive
+from wradvis import utils
+
+# DWD sample data of wradlib, https://github.com/wradlib/wradlib-data
+WRADLIB_DATA = os.environ.get("WRADLIB_DATA", "")
+DX_SAMPLE = os.path.join(WRADLIB_DATA, "dx",
+                         "raa00-dx_10908-0806021655-fbg---bin.gz")
+
+
+def read_digest(fname):
+    path, member = archive.split_member(fname)
+    return hashlib.md5(archive.get_archive(path).read(member)).hexdigest()
+
+
+def make_tar(path, members):
+    mode = "w:bz2" if path.endswith(".bz2") else "w:gz"
+    with tarfile.open(path, mode) as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+class TarArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(42)
+        # incompressible members spanning several inflater blocks
+        self.members = {}
+        for i in range(12):
+            name = "raa01-rw_10000-16052900{0:02d}-dwd---bin".format(i)
+            size = int(rng.randint(1, 2 ** 20))
+            self.members[name] = rng.bytes(size)
+
+    def tearDown(self):
+        archive._archives.clear()
+        shutil.rmtree(self.dir)
+
+    def check_random_order(self, suffix):
+        path = os.path.join(self.dir, "rw" + suffix)
+        make_tar(path, self.members)
+        names = sorted(self.members) * 2
+        random.Random(1).shuffle(names)
+        for indexed in (False, True):
+            # first without, then with the stored index
+            self.assertEqual(os.path.exists(path + ".index"), indexed)
+            tar = archive.TarArchive(path)
+            self.assertEqual(sorted(tar.members), sorted(self.members))
+            for name in names:
+                self.assertEqual(tar.read(name), self.members[name])
+            tar._stream.close()
+
+    def test_gzip(self):
+        self.check_random_order(".tar.gz")
+
+    def test_bzip2(self):
+        self.check_random_order(".tar.bz2")
+
+    def test_inflater_small_blocks(self):
+        path = os.path.join(self.dir, "data.gz")
+        data = b"".join(self.members[name] for name in sorted(self.members))
+        with gzip.open(path, "wb") as f:
+            f.write(data)
+        stream = archive._Inflater(path, block=2 ** 16, maxblocks=2,
+                                   every=2, maxcheckpoints=4)
+        rng = random.Random(2)
+        for _ in range(50):
+            pos = rng.randrange(len(data))
+            size = rng.randrange(1, 2 ** 17)
+            stream.seek(pos)
+            self.assertEqual(stream.read(size), data[pos:pos + size])
+        self.assertTrue(stream.count() > 0)
+        stream.close()
+
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_forked_readers(self):
+        path = os.path.join(self.dir, "rw.tar.gz")
+        make_tar(path, self.members)
+        # opened and positioned before the workers fork, nothing cached
+        names = sorted(self.members)
+        stream = archive.get_archive(path)._stream
+        stream.read()
+        while stream.lru() is not None:
+            stream.evict(stream.lru()[0])
+        fnames = [path + archive.MEMBER_SEP + name for name in names] * 4
+        random.Random(3).shuffle(fnames)
+        pool = multiprocessing.Pool(4)
+        try:
+            digests = pool.map(read_digest, fnames, chunksize=1)
+        finally:
+            pool.terminate()
+        for fname, digest in zip(fnames, digests):
+            name = archive.split_member(fname)[1]
+            self.assertEqual(digest,
+                             hashlib.md5(self.members[name]).hexdigest())
+
+    def test_member_file(self):
+        path = os.path.join(self.dir, "rw.tar.gz")
+        make_tar(path, self.members)
+        name = sorted(self.members)[3]
+        with archive.member_file(path + archive.MEMBER_SEP + name) as fname:
+            with open(fname, "rb") as f:
+                self.assertEqual(f.read(), self.members[name])
+        self.assertFalse(os.path.exists(fname))
+        with archive.member_file(path) as fname:
+            self.assertEqual(fname, path)
+
+
+@unittest.skipUnless(os.path.exists(DX_SAMPLE), "needs wradlib-data")
+class DXMemberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        archive._archives.clear()
+        shutil.rmtree(self.dir)
+
+    def test_read_dx(self):
+        path = os.path.join(self.dir, "dx.tar")
+        with tarfile.open(path, "w") as tar:
+            tar.add(DX_SAMPLE, os.path.basename(DX_SAMPLE))
+        member = path + archive.MEMBER_SEP + os.path.basename(DX_SAMPLE)
+        data, attrs = utils.read_dx(member)
+        expected, _ = utils.read_dx(DX_SAMPLE)
+        self.assertEqual(data.shape, (360, 128))
+        np.testing.assert_array_equal(data, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
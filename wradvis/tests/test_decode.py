@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+
+from wradvis import decode
+
+
+class ProductLUTTest(unittest.TestCase):
+
+    def test_one_byte_products(self):
+        codes = np.array([[0, 65, 249, 250]], dtype=np.uint8)
+        for product in ('RX', 'EX', 'WX'):
+            lut = decode.ProductLUT(product)
+            np.testing.assert_allclose(lut.decode(codes),
+                                       [[-32.5, 0., 92., -32.5]])
+            np.testing.assert_array_equal(
+                lut.flags_of(codes), [[0, 0, decode.CLUTTER, decode.NODATA]])
+
+    def test_sign_bit(self):
+        codes = np.array([[12, 0x4000 | 12, 0x2000, 0x8000 | 12]],
+                         dtype=np.uint16)
+        rd = decode.ProductLUT('RD')
+        np.testing.assert_allclose(rd.decode(codes), [[1.2, -1.2, 0., 1.2]])
+        # other products mask the bit off
+        rw = decode.ProductLUT('RW')
+        np.testing.assert_allclose(rw.decode(codes), [[1.2, 1.2, 0., 1.2]])
+        np.testing.assert_array_equal(
+            rw.flags_of(codes), [[0, 0, decode.NODATA, decode.CLUTTER]])
+
+
+if __name__ == '__main__':
+    unittest.main()
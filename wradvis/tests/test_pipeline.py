@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+
+from wradvis import pipeline
+
+try:
+    import wradlib.clutter
+except ImportError:
+    wradlib = None
+
+SHAPES = {'RX': (900, 900), 'RW': (900, 900), 'DX': (360, 128)}
+
+
+def synthetic_frame(shape):
+    """ Smooth rain field with a few clutter spikes and NaN
+    """
+    rng = np.random.RandomState(0)
+    y, x = np.indices(shape)
+    data = 30 * np.exp(-((x - shape[1] / 2.) ** 2 +
+                         (y - shape[0] / 2.) ** 2) / (shape[1] / 4.) ** 2)
+    data[rng.randint(0, shape[0], 20), rng.randint(0, shape[1], 20)] = 60.
+    data[:5, :5] = np.nan
+    return data.astype(np.float32)
+
+
+@unittest.skipIf(wradlib is None, "needs wradlib")
+class StagesTest(unittest.TestCase):
+
+    def test_every_stage(self):
+        for name in pipeline.STAGES:
+            stage = pipeline.Stage(name)
+            for product, shape in SHAPES.items():
+                out = stage(synthetic_frame(shape), product)
+                self.assertEqual(out.shape, shape, (name, product))
+                self.assertEqual(out.dtype, np.float32, (name, product))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Headless XYZ tile server for RADOLAN frames
+
+Serves Web-Mercator tiles without the Qt GUI,
+
+    /<product>/<time>/<z>/<x>/<y>.png  rendered with conf["vis"]
+    /<product>/<time>/<z>/<x>/<y>.npy  raw float32 values, NaN outside
+
+eg. /RW/2016-05-29T12:50/7/66/42.png
+"""
+
+import os
+import re
+import io
+import time as _time
+import zlib
+import struct
+import threading
+from collections import OrderedDict
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+import numpy as np
+from vispy.color import get_colormap
+
+from wradvis import utils
+from wradvis import archive
+from wradvis.cache import FrameCache
+from wradvis.resample import get_tile_lookup
+from wradvis.config import conf
+
+
+TILE_PATH = re.compile(r"^/(\w+)/([^/]+)/(\d+)/(\d+)/(\d+)\.(png|npy)$")
+
+
+class NotOnGrid(Exception):
+    """ Frames of the product are not on the RADOLAN grid, eg. DX
+    """
+
+
+def encode_png(rgba):
+    """ Encode a (h, w, 4) uint8 array as PNG
+    """
+    h, w = rgba.shape[:2]
+    raw = np.zeros((h, w * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(h, -1)
+
+    def chunk(tag, data):
+        return (struct.pack(">I", len(data)) + tag + data +
+                struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) +
+            chunk(b"IEND", b""))
+
+
+class TileRenderer(object):
+    """
+    Renders and caches tiles of the frames of one or more sources
+
+    Rendered tiles are kept in memory (LRU, `maxtiles`) and, if `cachedir`
+    is given, on disk. Decoded frames are shared through a FrameCache.
+    Files are looked up in per day listings of the sources, refreshed
+    after `refresh` seconds.
+    """
+    MAXDAYS = 64
+
+    def __init__(self, sources, cmap=None, clim=None, cachedir="",
+                 maxtiles=1024, size=256, refresh=60.):
+        self.sources = sources
+        cmap = cmap or conf.get("vis", "cmap")
+        self.clim = clim or (conf.getfloat("vis", "cmin"),
+                             conf.getfloat("vis", "cmax"))
+        lut = get_colormap(cmap).map(np.linspace(0, 1, 256))
+        self.lut = (np.asarray(lut) * 255).round().astype(np.uint8)
+        self.cachedir = cachedir
+        self.maxtiles = maxtiles
+        self.size = size
+        self.refresh = refresh
+        self.frames = FrameCache(maxsize=8)
+        self._tiles = OrderedDict()
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+        self._empty = encode_png(np.zeros((size, size, 4), dtype=np.uint8))
+
+    def find(self, product, time):
+        """ Return the file of `product` at `time`, KeyError if missing
+        """
+        time = np.datetime64(time, 's')
+        files, times = self.listing(product, time.astype('datetime64[D]'))
+        i = int(np.searchsorted(times, time))
+        if i == len(files) or times[i] >= time + np.timedelta64(1, 'm'):
+            raise KeyError(time)
+        return files[i]
+
+    def listing(self, product, day):
+        """ (files, times) of `product` on `day`, listed once per refresh
+        """
+        source = self.sources[product]
+        key = (product, day)
+        now = _time.time()
+        with self._lock:
+            entry = self._days.get(key)
+        if entry is None or now - entry[2] > self.refresh:
+            files, times = source.select(day, day + np.timedelta64(1, 'D'))
+            entry = (files, times, now)
+            with self._lock:
+                self._days.pop(key, None)
+                while len(self._days) >= self.MAXDAYS:
+                    self._days.popitem(last=False)
+                self._days[key] = entry
+        return entry[0], entry[1]
+
+    def frame(self, fname, product):
+        """ Decoded frame `fname`, shared by all request threads
+
+        The lock only guards the cache, decoding runs outside of it.
+        """
+        key = (fname, product)
+        with self._lock:
+            data = self.frames.peek(key)
+        if data is None:
+            data = utils.read_frame(fname, product)
+            with self._lock:
+                # another thread may have been faster, keep one copy
+                data = self.frames.get(key, lambda: data)
+        return data
+
+    def values(self, product, time, z, x, y):
+        if product == 'DX':
+            # polar scans, gathering them as grid would render garbage
+            raise NotOnGrid(product)
+        fname = self.find(product, time)
+        data = self.frame(fname, product)
+        lookup = get_tile_lookup(z, self.size)
+        if data.shape != lookup.shape:
+            raise NotOnGrid(product)
+        # keep the entry, the lookup may drop it for concurrent requests
+        return lookup.gather(data, lookup.tile_index(x, y))
+
+    def colorize(self, values):
+        lo, hi = self.clim
+        norm = np.clip((values - lo) / (hi - lo), 0, 1)
+        rgba = self.lut[np.nan_to_num(norm * 255).astype(np.uint8)]
+        rgba[..., 3] = np.where(np.isfinite(values), rgba[..., 3], 0)
+        return rgba
+
+    def render(self, values, fmt):
+        if fmt == 'npy':
+            buf = io.BytesIO()
+            np.save(buf, values.astype(np.float32))
+            return buf.getvalue()
+        if not np.isfinite(values).any():
+            return self._empty
+        return encode_png(self.colorize(values))
+
+    def tile(self, product, time, z, x, y, fmt='png'):
+        key = (product, str(np.datetime64(time, 'm')), z, x, y, fmt)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles[key] = self._tiles.pop(key)
+                return self._tiles[key]
+        path = None
+        if self.cachedir:
+            # no colons in file names
+            parts = [str(k).replace(":", "") for k in key[:-1]]
+            path = os.path.join(self.cachedir, *parts)
+            path = "{0}.{1}".format(path, fmt)
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                body = f.read()
+        else:
+            body = self.render(self.values(product, time, z, x, y), fmt)
+            if path is not None:
+                self._store(path, body)
+        with self._lock:
+            self._tiles[key] = body
+            while len(self._tiles) > self.maxtiles:
+                self._tiles.popitem(last=False)
+        return body
+
+    def _store(self, path, body):
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created concurrently
+                pass
+        # write to a temporary name, other threads never see partial tiles
+        tmp = "{0}.{1}".format(path, threading.current_thread().ident)
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.rename(tmp, path)
+
+
+class TileHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        match = TILE_PATH.match(self.path.split("?")[0])
+        if match is None:
+            self.send_error(404, "Unknown path")
+            return
+        product, time, z, x, y, fmt = match.groups()
+        try:
+            time = np.datetime64(time, 's')
+            if np.isnat(time):
+                raise ValueError(time)
+        except ValueError:
+            self.send_error(400, "Invalid time")
+            return
+        try:
+            body = self.server.renderer.tile(product, time,
+                                             int(z), int(x), int(y), fmt)
+        except KeyError:
+            self.send_error(404, "No such frame")
+            return
+        except NotOnGrid:
+            self.send_error(404, "Product not on the RADOLAN grid")
+            return
+        except Exception as e:
+            self.send_error(500, "Rendering failed: {0}".format(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png" if fmt == 'png'
+                         else "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=3600")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TileServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server, one thread per request
+    """
+    daemon_threads = True
+
+    def __init__(self, renderer, host="127.0.0.1", port=8080):
+        HTTPServer.__init__(self, (host, port), TileHandler)
+        self.renderer = renderer
+
+
+def create_sources():
+    """ Source of the configured product, as used by the GUI
+    """
+    product = conf["source"]["product"]
+    pattern = "raa0*{0}*".format(conf.get("source", "loc"))
+    root = conf["dirs"].get("archive", "")
+    data = conf["dirs"]["data"]
+    if root:
+        source = archive.ArchiveSource(root, pattern)
+    elif archive.tar_files(data):
+        source = archive.TarSource(data, pattern)
+    else:
+        source = archive.DirectorySource(data, pattern)
+    return {product: source}
+
+
+def serve(sources=None):
+    opts = conf["server"]
+    renderer = TileRenderer(sources or create_sources(),
+                            cachedir=opts.get("cache", ""),
+                            maxtiles=opts.getint("memtiles"),
+                            refresh=opts.getfloat("refresh"))
+    server = TileServer(renderer, opts.get("host"), opts.getint("port"))
+    print("wradvis: serving tiles on http://{0}:{1}".format(
+        *server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
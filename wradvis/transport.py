@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, wradlib Development Team. All Rights Reserved.
+# Distributed under the MIT License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+#!/usr/bin/env python
+
+"""
+Decoding in worker processes into shared memory
+
+Workers write decoded frames straight into slots of a FrameRing and only
+hand back the frame shape, the GUI wraps the slot as numpy view without
+copying. Needs Python >= 3.8 (multiprocessing.shared_memory).
+"""
+
+import threading
+import multiprocessing
+from collections import deque, OrderedDict
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+from wradvis import utils
+
+
+class SlotTooSmall(ValueError):
+    """ A decoded frame does not fit into a slot, eg. EX on a RADOLAN
+    sized ring
+    """
+
+
+class FrameRing(object):
+    """
+    Preallocated shared memory slots for decoded frames
+
+    Slots are reference counted: `acquire` hands out a free slot with one
+    reference, `retain`/`release` add and drop references, a slot
+    without references is free again. Frames evicted by background
+    threads release their slot from there, the counts are locked.
+    """
+    def __init__(self, nslots=48, shape=(900, 900), dtype=np.float32):
+        self.nslots = nslots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(create=True,
+                                              size=nslots * nbytes)
+        self.frames = np.ndarray((nslots,) + self.shape, dtype=self.dtype,
+                                 buffer=self.shm.buf)
+        self._refs = [0] * nslots
+        self._free = deque(range(nslots))
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def nfree(self):
+        return len(self._free)
+
+    def acquire(self):
+        """ Return a free slot or None if all slots are in use
+        """
+        with self._lock:
+            if not self._free:
+                return None
+            slot = self._free.popleft()
+            self._refs[slot] = 1
+            return slot
+
+    def retain(self, slot):
+        with self._lock:
+            self._refs[slot] += 1
+
+    def release(self, slot):
+        with self._lock:
+            self._refs[slot] -= 1
+            if not self._refs[slot]:
+                self._free.append(slot)
+
+    def view(self, slot, shape=None):
+        """ Return the frame in `slot` as view, `shape` for smaller frames
+        """
+        if shape is None or tuple(shape) == self.shape:
+            return self.frames[slot]
+        flat = self.frames[slot].reshape(-1)
+        return flat[:int(np.prod(shape))].reshape(shape)
+
+    def close(self):
+        self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # views are still alive, the segment goes with the process
+            pass
+        self.shm.unlink()
+
+
+# worker side view of the ring, set by _attach
+_worker = {}
+
+
+def _attach(name, nslots, shape, dtype, generation):
+    shm = shared_memory.SharedMemory(name=name)
+    _worker['shm'] = shm
+    _worker['generation'] = generation
+    _worker['frames'] = np.ndarray((nslots,) + tuple(shape), dtype=dtype,
+                                   buffer=shm.buf)
+
+
+def _decode(slot, generation, fname, product):
+    # skip queued requests which were cancelled meanwhile
+    if _worker['generation'][slot] != generation:
+        return None
+    frame = _worker['frames'][slot]
+
+    def buffer(shape):
+        # composites are decoded straight into the slot
+        if int(np.prod(shape)) > frame.size:
+            raise SlotTooSmall(shape)
+        return frame.reshape(-1)[:int(np.prod(shape))].reshape(shape)
+
+    data = np.asarray(utils.read_frame(fname, product, out=buffer))
+    if not np.may_share_memory(data, frame):
+        buffer(data.shape)[:] = data
+    return data.shape
+
+
+class DecoderPool(object):
+    """
+    Worker processes decoding files into the slots of a FrameRing
+
+    `prefetch` starts decoding in the background, `get` returns the slot
+    of a file, waiting for a running decode. The slot reference returned
+    by `get` belongs to the caller. At most `maxpending` prefetched files
+    wait for pickup, older ones are cancelled. Products whose frames
+    don't fit into a slot are left to in-process decoding.
+    """
+    def __init__(self, ring, workers=2, maxpending=8):
+        self.ring = ring
+        self.maxpending = maxpending
+        # bumped on cancel, workers skip requests of an old generation
+        self._generation = multiprocessing.RawArray('l', ring.nslots)
+        self.pool = multiprocessing.Pool(
+            workers, initializer=_attach,
+            initargs=(ring.name, ring.nslots, ring.shape, ring.dtype.str,
+                      self._generation))
+        self._pending = OrderedDict()
+        self._cancelled = []
+        self._oversized = set()
+
+    def prefetch(self, fname, product):
+        self._reap()
+        key = (fname, product)
+        if key in self._pending:
+            return True
+        if product in self._oversized:
+            return False
+        while len(self._pending) >= self.maxpending:
+            self.cancel(next(iter(self._pending)))
+        slot = self.ring.acquire()
+        if slot is None:
+            return False
+        result = self.pool.apply_async(
+            _decode, (slot, self._generation[slot], fname, product))
+        self._pending[key] = (slot, result)
+        return True
+
+    def get(self, fname, product):
+        """ Return (slot, view) of `fname`, None if no slot is free or
+        the frame doesn't fit
+        """
+        if not self.prefetch(fname, product):
+            return None
+        slot, result = self._pending.pop((fname, product))
+        try:
+            shape = result.get()
+        except SlotTooSmall:
+            self.ring.release(slot)
+            self._oversized.add(product)
+            return None
+        except Exception:
+            self.ring.release(slot)
+            raise
+        return slot, self.ring.view(slot, shape)
+
+    def cancel(self, key):
+        """ Drop a pending (file, product), its slot is freed once the
+        worker is done
+        """
+        slot, result = self._pending.pop(key)
+        self._generation[slot] += 1
+        self._cancelled.append((slot, result))
+        self._reap()
+
+    def cancel_all(self):
+        for key in list(self._pending):
+            self.cancel(key)
+
+    def _reap(self):
+        # the worker may still write into the slot of a cancelled file
+        running = []
+        for slot, result in self._cancelled:
+            if result.ready():
+                self.ring.release(slot)
+            else:
+                running.append((slot, result))
+        self._cancelled = running
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        for slot, _ in list(self._pending.values()) + self._cancelled:
+            self.ring.release(slot)
+        self._pending.clear()
+        self._cancelled = []
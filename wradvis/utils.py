@@ -8,13 +8,18 @@
 """
 """
 
-import wradlib as wrl
+# wradlib pulls in matplotlib, it is imported by the functions using it
+# so that the core stays free of GUI libraries
 import numpy as np
 from wradvis.config import conf
+from wradvis import memory
+from wradvis import decode
+from wradvis import archive
 
 
 def wgs84_to_radolan(coords):
 
+    import wradlib as wrl
     proj_wgs = wrl.georef.epsg_to_osr(4326)
     proj_stereo = wrl.georef.create_osr("dwd-radolan")
     xy = wrl.georef.reproject(coords,
@@ -25,6 +30,7 @@ def wgs84_to_radolan(coords):
 
 def radolan_to_wgs84(coords):
 
+    import wradlib as wrl
     proj_wgs = wrl.georef.epsg_to_osr(4326)
     proj_stereo = wrl.georef.create_osr("dwd-radolan")
     ll = wrl.georef.reproject(coords,
@@ -34,6 +40,7 @@ def radolan_to_wgs84(coords):
 
 def dx_to_wgs84(coords):
 
+    import wradlib as wrl
     # currently works only with radar feldberg
     #Todo: make this work with all DWD-radars and also with other radars
     radar = {'name': 'Feldberg', 'wmo': 10908, 'lon': 8.00361,
@@ -59,17 +66,41 @@ def dx_to_wgs84(coords):
 
 
 def get_radolan_grid():
-    return wrl.georef.get_radolan_grid()
+    import wradlib as wrl
+    # one read-only instance for all views
+    return memory.shared("radolan_grid", wrl.georef.get_radolan_grid)
 
 def get_radolan_origin():
-    return wrl.georef.get_radolan_grid()[0, 0]
+    return get_radolan_grid()[0, 0]
 
 
 def read_radolan(f, missing=0, loaddata=True):
+    import wradlib as wrl
     return wrl.io.read_RADOLAN_composite(f, missing=missing, loaddata=loaddata)
 
 def read_dx(f, missing=0, loaddata=True):
-    return wrl.io.readDX(f)
+    import wradlib as wrl
+    # readDX opens file names only, archive members are copied out
+    with archive.member_file(f) as fname:
+        return wrl.io.readDX(fname)
+
+
+def read_product(f, product, out=None):
+    """ Read data in physical units and metadata of one file of `product`
+
+    Composites are decoded by lookup table into `out`, a float32 buffer
+    or a function returning one for a shape, see decode.read_decoded.
+    """
+    if product == 'DX':
+        return read_dx(f)
+    opts = conf["decode"]
+    return decode.read_decoded(f, product, unit=opts.get("unit"),
+                               a=opts.getfloat("a"), b=opts.getfloat("b"),
+                               out=out)
+
+
+def read_frame(f, product, out=None):
+    return read_product(f, product, out)[0]
 
 
 def get_cities_coords():